@@ -0,0 +1,505 @@
+import argparse
+import json
+import logging                                                       # logger
+import os
+import random
+import time
+import tracemalloc                                                   # Peak memory per stage
+from InsertionTool import VerilogParser, VerilogGenerator            # Insertion pipeline under benchmark
+from pyverilog.vparser.parser import VerilogParser as PyVerilogParser  # PyVerilog Parser
+from ASAPBitstream import SmuConfigLayout, verifyCompressed          # SMU configuration bitstreams
+
+
+# ****************************** <SYNTHETIC DESIGN BENCHMARK FOR THE INSERTION PIPELINE> **********************
+# The benchmark generates synthetic designs of configurable size and measures how each stage of the
+# insertion pipeline scales -
+#   parse          --> VerilogParser (pragma extraction, file/module ASTs, instantiation tree)
+#   pragmaBinding  --> VerilogParser.fileToModuleToSignalToPragma
+#   stageOne       --> VerilogGenerator.stageOneModifier     (Intra module insertion)
+#   stageTwo       --> VerilogGenerator.stageTwoFileModifier (Inter module insertion)
+#   signalMap      --> VerilogGenerator.generateSignalMap
+#   codegen        --> VerilogGenerator.genModifiedVerilogFile
+# Time is the best of <repeat> untraced runs after an untimed warm-up run. Peak memory is measured on a
+# further run under tracemalloc. The shared pyverilog parser (LALR tables) is built before the first run, so
+# parse measures parsing only.
+# Results are compared against a baseline (benchmark_baseline.json) to flag regressions. Timings depend on
+# the machine, so baselines are local (not checked in) - create one with --update-baseline on the machine
+# that runs the comparison.
+#
+# With --bitstream, random patches are compiled against the observe signal index of a synthetic design
+# and the cfg_clk cycles of full vs zero-run compressed SMU bitstream loads are reported instead
+# (BitstreamBenchmark). Compressed loads are checked against the decompressor reference model.
+#
+# With --scanner, the tokens/s of the master regex ASAP-SMU scanner (ASAPSmuScanner) are measured against
+# the PLY lexer (ASAPSmuLexer) on a generated patch (ScannerBenchmark). The PLY side includes the second
+# regex pass that decodes VARIABLE/CONST tokens (extractVariableInfo/extractConstInfo).
+# With --ast-memory, the memory retained by the patch AST of a generated patch is reported per pattern.
+# *************************************************************************************************************
+
+STAGES = ("parse", "pragmaBinding", "stageOne", "stageTwo", "signalMap", "codegen")
+
+# Absolute slack on top of the relative tolerance - keeps sub-millisecond stages from flagging noise
+SLACK = {"time": 0.002, "peak": 64 * 1024}
+
+# Benchmark design sizes
+SIZES = {
+    "small"  : dict(depth = 2, fanout = 2, moduleTypesPerLevel = 2, fileCount = 2, pragmaDensity = 0.5),
+    "medium" : dict(depth = 3, fanout = 3, moduleTypesPerLevel = 3, fileCount = 4, pragmaDensity = 0.5),
+    "large"  : dict(depth = 4, fanout = 4, moduleTypesPerLevel = 4, fileCount = 8, pragmaDensity = 0.5),
+}
+
+
+# SMU configurations of the bitstream benchmark - (N, M, SMU_SEGMENT_SIZE)
+SMU_CONFIGS = ((2, 6, 64), (4, 16, 64), (8, 32, 32))
+
+
+# Generates a synthetic design hierarchy with pragma annotated declarations
+# -- depth               : # of hierarchy levels below the top module
+# -- fanout              : # of child instances in every non-leaf module
+# -- moduleTypesPerLevel : # of distinct module types per level (controls module reuse)
+# -- fileCount           : # of source files the modules are spread over
+# -- pragmaDensity       : Fraction of declarations that carry an observe/control pragma
+# -- signalsPerModule    : # of internal wire/reg declarations per module
+# Pragmas are mixed across input/output ports, wires and regs (like Sample.v)
+class SyntheticDesignGenerator:
+    def __init__(self, depth = 3, fanout = 2, moduleTypesPerLevel = 2, fileCount = 2, pragmaDensity = 0.5, \
+                       signalsPerModule = 4, width = 4, seed = 0) -> None:
+        self.depth               = depth
+        self.fanout              = fanout
+        self.moduleTypesPerLevel = moduleTypesPerLevel
+        self.fileCount           = fileCount
+        self.pragmaDensity       = pragmaDensity
+        self.signalsPerModule    = signalsPerModule
+        self.width               = width
+        self.random              = random.Random(seed)
+        self.topModule           = "synth_top"
+
+    # Returns the module names at a hierarchy level
+    def levelModules(self, level):
+        if level == 0:
+            return [self.topModule]
+        return ["synth_l%d_m%d"%(level, index) for index in range(min(self.moduleTypesPerLevel, self.fanout ** level))]
+
+    # Returns a pragma comment (or an empty string) for a declaration
+    def pragma(self, controllable = True):
+        if self.random.random() >= self.pragmaDensity:
+            return ""
+        msb = self.random.randrange(self.width)
+        lsb = self.random.randrange(msb + 1)
+        kind = self.random.choice(("observe", "control", "both") if controllable else ("observe",))
+        if kind == "observe":
+            return " // #pragma observe %d:%d"%(msb, lsb)
+        if kind == "control":
+            return " // #pragma control signal %d:%d"%(msb, lsb)
+        return " // #pragma observe %d:%d control signal %d:%d"%(msb, lsb, self.width - 1, 0)
+
+    def moduleCode(self, moduleName, level, index):
+        vector = "[%d:0]"%(self.width - 1)
+        ports = ["    input  wire        clk",
+                 "    input  wire %s in_a,%s"%(vector, self.pragma()),
+                 "    input  wire %s in_b,%s"%(vector, self.pragma()),
+                 "    output wire %s out_w,%s"%(vector, self.pragma()),
+                 "    output reg  %s out_r %s"%(vector, self.pragma())]
+        lines = ["module %s ("%(moduleName), ports[0] + ",", *ports[1:], ");"]
+        wires = ["w%d"%(signal) for signal in range(0, self.signalsPerModule, 2)]
+        regs  = ["r%d"%(signal) for signal in range(1, self.signalsPerModule, 2)]
+        for wire in wires:
+            lines.append("    wire %s %s;%s"%(vector, wire, self.pragma()))
+        for reg in regs:
+            lines.append("    reg  %s %s;%s"%(vector, reg, self.pragma()))
+        previous = "in_a"
+        for wire in wires:
+            lines.append("    assign %s = %s ^ in_b;"%(wire, previous))
+            previous = wire
+        childOutputs = []
+        if level < self.depth:
+            children = self.levelModules(level + 1)
+            for instance in range(self.fanout):
+                child = children[(index + instance) % len(children)]
+                lines.append("    wire %s c%d_w;"%(vector, instance))
+                lines.append("    wire %s c%d_r;"%(vector, instance))
+                lines.append("    %s u%d (.clk(clk), .in_a(%s), .in_b(in_b), .out_w(c%d_w), .out_r(c%d_r));"%(child, instance, \
+                                                                                                           previous, instance, instance))
+                childOutputs.extend(["c%d_w"%(instance), "c%d_r"%(instance)])
+        lines.append("    assign out_w = %s;"%(" ^ ".join([previous] + childOutputs)))
+        lines.append("    always @(posedge clk) begin")
+        for reg in regs:
+            lines.append("        %s <= %s;"%(reg, previous))
+        lines.append("        out_r <= %s;"%(regs[-1] if regs else previous))
+        lines.append("    end")
+        lines.append("endmodule")
+        return "\n".join(lines) + "\n"
+
+    # Writes the design and its filelist to outputDir. Returns (filelist, top module)
+    def generate(self, outputDir):
+        os.makedirs(outputDir, exist_ok = True)
+        fileToCode = {index: [] for index in range(self.fileCount)}
+        moduleCount = 0
+        for level in range(self.depth + 1):
+            for index, moduleName in enumerate(self.levelModules(level)):
+                fileToCode[moduleCount % self.fileCount].append(self.moduleCode(moduleName, level, index))
+                moduleCount += 1
+        files = []
+        for index, code in fileToCode.items():
+            if code:
+                file = os.path.join(outputDir, "synth_%d.v"%(index))
+                with open(file, "w") as f:
+                    f.write("\n".join(code))
+                files.append(file)
+        filelist = os.path.join(outputDir, "filelist.f")
+        with open(filelist, "w") as f:
+            f.write("\n".join(files))
+        return filelist, self.topModule
+
+
+# Measures time and peak memory for every stage of the insertion pipeline
+class InsertionBenchmark:
+    def __init__(self, workdir, baselineFile, tolerance = 0.25, repeat = 5) -> None:
+        self.workdir      = workdir
+        self.baselineFile = baselineFile
+        self.tolerance    = tolerance
+        self.repeat       = repeat
+
+    # Runs the insertion pipeline once and returns {<STAGE>:<SECONDS or PEAK_BYTES>}
+    def runPipeline(self, filelist, topModule, traceMemory):
+        results = {}
+        state = {}
+
+        def measure(stage, function):
+            if traceMemory:
+                tracemalloc.reset_peak()
+                baseMemory = tracemalloc.get_traced_memory()[0]
+                function()
+                results[stage] = tracemalloc.get_traced_memory()[1] - baseMemory
+            else:
+                startTime = time.perf_counter()
+                function()
+                results[stage] = time.perf_counter() - startTime
+
+        def parse():
+            state["parser"] = VerilogParser(filelist, topModule)
+
+        def pragmaBinding():
+            state["signalToPragma"] = state["parser"].fileToModuleToSignalToPragma()
+            fileToModuleToSignalToObserve, fileToModuleToSignalToControl = state["signalToPragma"]
+            state["generator"] = VerilogGenerator(state["parser"].fileToAst,          \
+                                                  state["parser"].tree,               \
+                                                  topModule,                          \
+                                                  fileToModuleToSignalToObserve,      \
+                                                  fileToModuleToSignalToControl,      \
+                                                  "observe_port",                     \
+                                                  "control_port_in",                  \
+                                                  "control_port_out")
+
+        def stageOne():
+            state["widths"] = state["generator"].stageOneModifier()
+
+        def stageTwo():
+            state["generator"].stageTwoFileModifier(*state["widths"])
+
+        def signalMap():
+            state["generator"].generateSignalMap()
+
+        def codegen():
+            for file in state["generator"].filewiseAst:
+                state["generator"].genModifiedVerilogFile(file)
+
+        if traceMemory:
+            tracemalloc.start()
+        try:
+            for stage, function in zip(STAGES, (parse, pragmaBinding, stageOne, stageTwo, signalMap, codegen)):
+                measure(stage, function)
+        finally:
+            if traceMemory:
+                tracemalloc.stop()
+        return results
+
+    # Runs all requested sizes. Returns {<SIZE>:{<STAGE>:{"time": <SECONDS>, "peak": <BYTES>}}}
+    def run(self, sizes):
+        results = {}
+        cwd = os.getcwd()
+        for size in sizes:
+            designDir = os.path.abspath(os.path.join(self.workdir, size))
+            filelist, topModule = SyntheticDesignGenerator(**SIZES[size]).generate(designDir)
+            # pyverilog writes its parser tables in the working directory
+            os.chdir(designDir)
+            try:
+                if VerilogParser.codeParser is None:
+                    VerilogParser.codeParser = PyVerilogParser(outputdir = ".", debug = False)
+                self.runPipeline(filelist, topModule, traceMemory = False)
+                runs  = [self.runPipeline(filelist, topModule, traceMemory = False) for _ in range(self.repeat)]
+                times = {stage: min(run[stage] for run in runs) for stage in STAGES}
+                peaks = self.runPipeline(filelist, topModule, traceMemory = True)
+            finally:
+                os.chdir(cwd)
+            results[size] = {stage: {"time": times[stage], "peak": peaks[stage]} for stage in STAGES}
+        return results
+
+    # Returns a list of (size, stage, metric, baseline, measured) tuples that regressed beyond tolerance
+    def compare(self, results):
+        if not os.path.exists(self.baselineFile):
+            return []
+        with open(self.baselineFile, "r") as f:
+            baseline = json.load(f)
+        regressions = []
+        for size, stages in results.items():
+            for stage, metrics in stages.items():
+                for metric, value in metrics.items():
+                    reference = baseline.get(size, {}).get(stage, {}).get(metric)
+                    if reference and value > reference * (1 + self.tolerance) + SLACK[metric]:
+                        regressions.append((size, stage, metric, reference, value))
+        return regressions
+
+    def saveBaseline(self, results):
+        with open(self.baselineFile, "w") as f:
+            json.dump(results, f, indent = 2, sort_keys = True)
+
+    @staticmethod
+    def report(results):
+        lines = ["%-8s %-14s %12s %14s"%("size", "stage", "time (ms)", "peak (KiB)")]
+        for size, stages in results.items():
+            for stage, metrics in stages.items():
+                lines.append("%-8s %-14s %12.2f %14.1f"%(size, stage, metrics["time"] * 1e3, metrics["peak"] / 1024))
+        return "\n".join(lines)
+
+
+# Measures full vs compressed SMU bitstream load cycles on compiled random patches
+class BitstreamBenchmark:
+    def __init__(self, workdir, size = "medium", patchCount = 20, runBits = 6, seed = 0) -> None:
+        self.workdir    = workdir
+        self.size       = size
+        self.patchCount = patchCount
+        self.runBits    = runBits
+        self.random     = random.Random(seed)
+
+    # Runs insertion on the synthetic design and returns its observe SignalIndex
+    def observeSignalIndex(self):
+        designDir = os.path.abspath(os.path.join(self.workdir, self.size))
+        filelist, topModule = SyntheticDesignGenerator(**SIZES[self.size]).generate(designDir)
+        cwd = os.getcwd()
+        os.chdir(designDir)
+        try:
+            parser = VerilogParser(filelist, topModule)
+            fileToModuleToSignalToObserve, fileToModuleToSignalToControl = parser.fileToModuleToSignalToPragma()
+            generator = VerilogGenerator(parser.fileToAst, parser.tree, topModule, fileToModuleToSignalToObserve, \
+                                         fileToModuleToSignalToControl, "observe_port", "control_port_in", "control_port_out")
+            generator.astModifier()
+        finally:
+            os.chdir(cwd)
+        return generator.observeSignalIndex
+
+    # Returns the text of a random patch that fits <layout> (sequences of up to N patterns on up to M units)
+    def patchCode(self, signalIndex, layout):
+        entries = list(signalIndex.signals.items())
+        lines = []
+        for sequence in range(self.random.randint(1, layout.M)):
+            lines.append("s%d {"%(sequence))
+            for _ in range(self.random.randint(1, layout.N)):
+                while True:
+                    path, entry = self.random.choice(entries)
+                    lsb = self.random.randrange(entry.width)
+                    msb = self.random.randrange(lsb, entry.width)
+                    portLsb = entry.offset + lsb
+                    if portLsb // layout.segmentSize == (entry.offset + msb) // layout.segmentSize:
+                        break
+                width = msb - lsb + 1
+                value = self.random.getrandbits(width)
+                lines.append("  (%s[%d:%d] %s %d'b%s)"%(path, entry.lsb + msb, entry.lsb + lsb, self.random.choice(("==", "<", ">")), \
+                                                          width, format(value, "0%db"%(width))))
+            lines.append("}")
+        return "\n".join(lines) + "\n"
+
+    # Returns {<CONFIG>:{"size": <BITS>, "full": <CYCLES>, "compressed": [<CYCLES>]}}
+    def run(self):
+        from ASAPCompiler import ASAPSmuParser            # Deferred - configures compiler logging on import
+        signalIndex = self.observeSignalIndex()
+        patchFile = os.path.join(self.workdir, "benchmark.asap.smu")
+        results = {}
+        for N, M, segmentSize in SMU_CONFIGS:
+            layout = SmuConfigLayout(N, signalIndex.width, M, segmentSize)
+            compressed = []
+            for _ in range(self.patchCount):
+                with open(patchFile, "w") as f:
+                    f.write(self.patchCode(signalIndex, layout))
+                smuParser = ASAPSmuParser(patchFile)
+                smuParser.resolveSignals(signalIndex)
+                image = smuParser.generateImage(layout)
+                matches, _, cycles = verifyCompressed(image, layout, self.runBits)
+                if not matches:
+                    raise AssertionError("Decompressor reference model mismatch (N = %d, M = %d, SMU_SEGMENT_SIZE = %d)"%(N, M, segmentSize))
+                compressed.append(cycles)
+            results["N=%d,M=%d,SEG=%d"%(N, M, segmentSize)] = {"size": layout.size, "full": layout.size, "compressed": compressed}
+        return results
+
+    @staticmethod
+    def report(results):
+        lines = ["%-18s %10s %12s %16s %10s"%("config", "cfg bits", "full (cyc)", "compressed (cyc)", "reduction")]
+        for config, result in results.items():
+            mean = sum(result["compressed"]) / len(result["compressed"])
+            lines.append("%-18s %10d %12d %16.1f %9.1fx"%(config, result["size"], result["full"], mean, result["full"] / mean))
+        return "\n".join(lines)
+
+
+# Measures ASAP-SMU tokenization throughput - master regex scanner vs PLY lexer (+ token payload decoding)
+class ScannerBenchmark:
+    def __init__(self, sequenceCount = 20000, patternsPerSequence = 4, repeat = 3, seed = 0) -> None:
+        self.sequenceCount       = sequenceCount
+        self.patternsPerSequence = patternsPerSequence
+        self.repeat              = repeat
+        self.random              = random.Random(seed)
+
+    def patchCode(self):
+        lines = []
+        for sequence in range(self.sequenceCount):
+            lines.append("seq_%d {"%(sequence))
+            for _ in range(self.patternsPerSequence):
+                lsb = self.random.randrange(32)
+                msb = self.random.randrange(lsb, 32)
+                width = msb - lsb + 1
+                lines.append("    (TOP.u_core%d.stage_%d.sig_%d[%d:%d] %s %d'b%s)"%(self.random.randrange(8), self.random.randrange(8), \
+                                                                            self.random.randrange(64), msb, lsb,                           \
+                                                                            self.random.choice(("==", "<", ">", "<=", ">=")), width,    \
+                                                                            format(self.random.getrandbits(width), "0%db"%(width))))
+            lines.append("}")
+        return "\n".join(lines) + "\n"
+
+    # Returns {"tokens": <COUNT>, "ply": <TOKENS/S>, "regex": <TOKENS/S>}
+    def run(self):
+        from ASAPCompiler import ASAPSmuLexer, ASAPSmuScanner, ASAPSmuParser   # Deferred - configures compiler logging on import
+        code = self.patchCode()
+        smuParser = ASAPSmuParser.__new__(ASAPSmuParser)    # Token payload decoders only
+
+        def plyTokens():
+            lexer = ASAPSmuLexer().lexer
+            lexer.input(code)
+            count = 0
+            token = lexer.token()
+            while token:
+                if token.type == "VARIABLE":
+                    smuParser.extractVariableInfo(token.value)
+                elif token.type == "CONST":
+                    smuParser.extractConstInfo(token.value)
+                count += 1
+                token = lexer.token()
+            return count
+
+        def regexTokens():
+            scanner = ASAPSmuScanner()
+            scanner.input(code)
+            count = 0
+            token = scanner.token()
+            while token:
+                count += 1
+                token = scanner.token()
+            return count
+
+        results = {}
+        for name, function in (("ply", plyTokens), ("regex", regexTokens)):
+            best = None
+            for _ in range(self.repeat):
+                startTime = time.perf_counter()
+                count = function()
+                elapsed = time.perf_counter() - startTime
+                best = elapsed if best is None else min(best, elapsed)
+            results["tokens"] = count
+            results[name] = count / best
+        return results
+
+    @staticmethod
+    def report(results):
+        return "\n".join(["%-8s %14s"%("scanner", "tokens/s"),
+                          "%-8s %14.0f"%("ply", results["ply"]),
+                          "%-8s %14.0f"%("regex", results["regex"]),
+                          "%d tokens - %.1fx speedup"%(results["tokens"], results["regex"] / results["ply"])])
+
+
+# Measures the memory retained by a parsed patch AST (incl. interned signal paths) per pattern
+class AstMemoryBenchmark:
+    def __init__(self, workdir, sequenceCount = 25000, patternsPerSequence = 4, seed = 0) -> None:
+        self.workdir = workdir
+        self.patchGenerator = ScannerBenchmark(sequenceCount, patternsPerSequence, seed = seed)
+
+    # Returns {"patterns": <COUNT>, "bytes": <RETAINED BYTES>, "bytesPerPattern": <BYTES>}
+    def run(self):
+        import gc
+        from ASAPCompiler import ASAPSmuParser            # Deferred - configures compiler logging on import
+        os.makedirs(self.workdir, exist_ok = True)
+        patchFile = os.path.join(self.workdir, "ast_memory.asap.smu")
+        with open(patchFile, "w") as f:
+            f.write(self.patchGenerator.patchCode())
+        gc.collect()
+        tracemalloc.start()
+        try:
+            sequenceList = ASAPSmuParser(patchFile).sequenceList
+            gc.collect()
+            retained = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+        patterns = sum(len(sequence.patterns) for sequence in sequenceList.sequences)
+        return {"patterns": patterns, "bytes": retained, "bytesPerPattern": retained / patterns}
+
+    @staticmethod
+    def report(results):
+        return "%d patterns - %.1f KiB retained, %.1f bytes/pattern"%(results["patterns"], results["bytes"] / 1024, \
+                                                                       results["bytesPerPattern"])
+
+
+if __name__ == '__main__':
+    argParser = argparse.ArgumentParser(description = "Benchmark the ASAP insertion pipeline on synthetic designs")
+    argParser.add_argument("--sizes", nargs = "+", choices = list(SIZES), default = list(SIZES))
+    argParser.add_argument("--workdir", default = "benchmark_designs")
+    argParser.add_argument("--baseline", default = "benchmark_baseline.json")
+    argParser.add_argument("--tolerance", type = float, default = 0.25, help = "Allowed slowdown/growth over baseline")
+    argParser.add_argument("--repeat", type = int, default = 5, help = "# of timed runs per size (the best one is reported)")
+    argParser.add_argument("--update-baseline", action = "store_true")
+    argParser.add_argument("--json", help = "Write the results to a JSON file")
+    argParser.add_argument("--log", action = "store_true", help = "Keep INFO level pipeline logging")
+    argParser.add_argument("--bitstream", action = "store_true", help = "Benchmark full vs compressed SMU bitstream loads")
+    argParser.add_argument("--patches", type = int, default = 20, help = "# of random patches per SMU configuration (--bitstream)")
+    argParser.add_argument("--scanner", action = "store_true", help = "Benchmark ASAP-SMU scanner vs PLY lexer tokens/s")
+    argParser.add_argument("--ast-memory", action = "store_true", help = "Measure patch AST memory per pattern")
+    args = argParser.parse_args()
+
+    if not args.log:
+        logging.getLogger().setLevel(logging.WARNING)
+    if args.scanner:
+        scannerBenchmark = ScannerBenchmark()
+        scannerResults = scannerBenchmark.run()
+        print(scannerBenchmark.report(scannerResults))
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(scannerResults, f, indent = 2, sort_keys = True)
+        exit(0)
+    if args.ast_memory:
+        astMemoryBenchmark = AstMemoryBenchmark(args.workdir)
+        astMemoryResults = astMemoryBenchmark.run()
+        print(astMemoryBenchmark.report(astMemoryResults))
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(astMemoryResults, f, indent = 2, sort_keys = True)
+        exit(0)
+    if args.bitstream:
+        bitstreamBenchmark = BitstreamBenchmark(args.workdir, args.sizes[-1], args.patches)
+        bitstreamResults = bitstreamBenchmark.run()
+        print(bitstreamBenchmark.report(bitstreamResults))
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(bitstreamResults, f, indent = 2, sort_keys = True)
+        exit(0)
+    benchmark = InsertionBenchmark(args.workdir, args.baseline, args.tolerance, args.repeat)
+    results = benchmark.run(args.sizes)
+    print(benchmark.report(results))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent = 2, sort_keys = True)
+    if args.update_baseline:
+        benchmark.saveBaseline(results)
+        print("Baseline updated - %s"%(args.baseline))
+    elif not os.path.exists(args.baseline):
+        print("No baseline - %s. Run with --update-baseline to create one on this machine"%(args.baseline))
+    else:
+        regressions = benchmark.compare(results)
+        for size, stage, metric, reference, value in regressions:
+            print("REGRESSION: %s/%s %s - baseline %.6g, measured %.6g"%(size, stage, metric, reference, value))
+        if regressions:
+            exit(1)
@@ -0,0 +1,442 @@
+import argparse
+import json
+import logging                                                       # logger
+
+
+# ************************************** <ASAP SMU CONFIGURATION BITSTREAM> **********************************
+# Packs a resolved ASAP-SMU patch into the SMU configuration image (CfgRegSmu in smu.sv) and produces the
+# bitstreams that program it through bitstream_deserializer.
+#
+# Image layout (CfgRegSmu is [N][M][CFG_SMU_UNIT_SIZE], bit 0 is the LSB of unit 0, state 0) -
+#   UNIT(state, unit) = CfgRegSmu[(state*M + unit)*CFG_SMU_UNIT_SIZE +: CFG_SMU_UNIT_SIZE]
+#   Fields of a unit from the MSB -
+#     RegInpSel (clog2(#SEGMENTS)) | RegCmp (SEGMENT_SIZE) | RegCmpMask (SEGMENT_SIZE) | RegFsmCmp (clog2(N)) | RegCmpSel (2)
+# RegCmpMask selects the variable bits of the segment, except the don't-care (x/?) bits of the constant.
+# Every sequence is mapped to one smu_unit. Pattern <i> of the sequence is the unit configuration of FSM
+# state <i> and RegFsmCmp is (#patterns - 1) in every state, so the trigger fires on the final pattern.
+# The image is encrypted with DECRYPT_KEY replicated from the LSB over all CFG_SIZE bits (ceil(CFG_SIZE/KEY_WIDTH)
+# copies, the last one truncated). This model is the reference - the field offsets of smu.sv and the key
+# replication of cfg_decrypt.sv follow it.
+#
+# Bitstreams (MSB first, one bit per cfg_clk cycle) -
+#   Full  : The CFG_SIZE bit encrypted image                             --> CFG_SIZE cycles
+#   Delta : {Address, Data} frame records for the frames that differ     --> #CHANGED_FRAMES x (ADDR_BITS + FRAME_SIZE) cycles
+#           from the deployed image (frame write mode of the deserializer)
+#   Compressed : Zero-run compressed full image (bitstream_decompressor). The image is split into key sized
+#           chunks aligned from the LSB. The CFG_SIZE % KEY_WIDTH bits above the last whole chunk are sent raw,
+#           followed by one token per chunk run (MSB chunk first) -
+#             {1'b1, CHUNK}            --> Literal chunk                                   (1 + KEY_WIDTH bits)
+#             {1'b0, RUN_LENGTH - 1}   --> RUN_LENGTH chunks that are zero before encryption  (1 + RUN_BITS bits)
+#           A plain zero chunk is a DECRYPT_KEY chunk in the encrypted image, which the decompressor emits.
+#           The decompressor hands one chunk per cycle to the deserializer and holds the stream (StreamReady)
+#           while a run is being expanded.
+# Encryption is a positional XOR, so the changed frames of the encrypted images are the changed frames
+# of the plain images and delta records carry encrypted data.
+# *************************************************************************************************************
+
+# SMU image/bitstream records of the compiler (asap.compiler subsystem)
+bitstreamLog = logging.getLogger("asap.compiler.bitstream")
+
+# RegCmpSel encoding of smu_unit (2'b11 also selects ==)
+CMP_SELECT = {"==": 0b00, "<": 0b01, ">": 0b10}
+
+
+# Exception class for patches that don't fit the SMU and for incompatible images
+class BitstreamError(Exception):
+    pass
+
+
+# $clog2
+def clog2(value):
+    return (value - 1).bit_length() if value > 1 else 0
+
+
+# Field widths and offsets of the SMU configuration image for a set of SMU parameters
+class SmuConfigLayout:
+    def __init__(self, N, K, M, segmentSize, decryptKey = 0xDEADBEEF, keyWidth = 32) -> None:
+        self.N           = N
+        self.K           = K
+        self.M           = M
+        self.segmentSize = segmentSize
+        self.decryptKey  = decryptKey
+        self.keyWidth    = keyWidth
+        self.numSegments = (K + segmentSize - 1) // segmentSize
+        self.inpSelBits  = clog2(self.numSegments)
+        self.fsmCmpBits  = clog2(N)
+        self.cmpSelBits  = 2
+        # Field offsets within a unit configuration (from the LSB)
+        self.fsmCmpOffset = self.cmpSelBits
+        self.maskOffset   = self.fsmCmpOffset + self.fsmCmpBits
+        self.cmpOffset    = self.maskOffset + segmentSize
+        self.inpSelOffset = self.cmpOffset + segmentSize
+        self.unitSize     = self.inpSelOffset + self.inpSelBits
+        self.size         = N * M * self.unitSize
+
+    def params(self):
+        return {"N": self.N, "K": self.K, "M": self.M, "segmentSize": self.segmentSize}
+
+    def unitOffset(self, state, unit):
+        return (state * self.M + unit) * self.unitSize
+
+    def packUnit(self, inpSel, cmp, mask, fsmCmp, cmpSel):
+        return (inpSel << self.inpSelOffset) | (cmp << self.cmpOffset) | (mask << self.maskOffset) | \
+               (fsmCmp << self.fsmCmpOffset) | cmpSel
+
+    # DECRYPT_KEY replicated over the whole image from the LSB (cfg_decrypt KeyMask)
+    def keyMask(self):
+        repeats = (self.size + self.keyWidth - 1) // self.keyWidth
+        return int(("%0*x"%(self.keyWidth // 4, self.decryptKey)) * repeats, 16) & ((1 << self.size) - 1) if self.size else 0
+
+    # Encryption and decryption are the same XOR
+    def encrypt(self, image):
+        return image ^ self.keyMask()
+
+
+# Compiles resolved sequences (ASAPSmuParser.resolveSignals) into a plain SMU configuration image
+class SmuImageCompiler:
+    def __init__(self, layout) -> None:
+        self.layout = layout
+
+    # Returns (RegInpSel, RegCmp, RegCmpMask, RegCmpSel) of a pattern
+    def patternConfig(self, sequence, pattern):
+        layout = self.layout
+        msb, lsb = pattern.lhs.portRange
+        if msb >= layout.K:
+            raise BitstreamError("Sequence '%s' - %s is on observe_port[%d:%d], beyond K = %d"%(sequence.name, pattern.lhs, msb, lsb, layout.K))
+        segment = lsb // layout.segmentSize
+        if msb // layout.segmentSize != segment:
+            raise BitstreamError("Sequence '%s' - %s (observe_port[%d:%d]) straddles SMU segments of %d bits"%(sequence.name, \
+                                 pattern.lhs, msb, lsb, layout.segmentSize))
+        operator = pattern.opType.operator
+        if operator not in CMP_SELECT:
+            raise BitstreamError("Sequence '%s' - comparison '%s' is not supported by the SMU"%(sequence.name, operator))
+        width = msb - lsb + 1
+        value = pattern.rhs.value
+        if value >> width:
+            raise BitstreamError("Sequence '%s' - constant %s doesn't fit %s"%(sequence.name, pattern.rhs, pattern.lhs))
+        # Don't-care bits of the constant are masked out of the comparison
+        mask  = ((1 << width) - 1) & ~pattern.rhs.dontCare
+        shift = lsb - segment * layout.segmentSize
+        return segment, value << shift, mask << shift, CMP_SELECT[operator]
+
+    # Returns the plain image. Sequences are assigned to smu_units in patch order (empty sequences are skipped)
+    # Sequences sharing a trigger (ASAPSmuParser.deduplicateSequences) share the unit of the first one
+    def compile(self, sequenceList):
+        layout = self.layout
+        image = 0
+        unit = 0
+        triggerToUnit = {}
+        for sequence in sequenceList.sequences:
+            if not sequence.patterns:
+                bitstreamLog.warning("Sequence '%s' has no patterns - no SMU unit assigned"%(sequence.name))
+                continue
+            if sequence.trigger in triggerToUnit:
+                bitstreamLog.info("-- Sequence '%s' shares SMU unit %d"%(sequence.name, triggerToUnit[sequence.trigger]))
+                continue
+            if unit >= layout.M:
+                raise BitstreamError("Patch needs more than M = %d SMU units"%(layout.M))
+            if len(sequence.patterns) > layout.N:
+                raise BitstreamError("Sequence '%s' has %d patterns - the SMU matches at most N = %d"%(sequence.name, \
+                                     len(sequence.patterns), layout.N))
+            fsmCmp = len(sequence.patterns) - 1
+            for state, pattern in enumerate(sequence.patterns):
+                inpSel, cmp, mask, cmpSel = self.patternConfig(sequence, pattern)
+                image |= layout.packUnit(inpSel, cmp, mask, fsmCmp, cmpSel) << layout.unitOffset(state, unit)
+            bitstreamLog.info("-- Sequence '%s' mapped to SMU unit %d (%d state(s))"%(sequence.name, unit, len(sequence.patterns)))
+            if sequence.trigger is not None:
+                triggerToUnit[sequence.trigger] = unit
+            unit += 1
+        return image
+
+
+# Splits an image into FRAME_SIZE bit frames (frame <a> is image[a*FRAME_SIZE +: FRAME_SIZE])
+def imageFrames(image, size, frameSize):
+    frameMask = (1 << frameSize) - 1
+    return [(image >> (address * frameSize)) & frameMask for address in range((size + frameSize - 1) // frameSize)]
+
+
+# Returns the [(ADDRESS, DATA)] frames of <image> that differ from <deployedImage>
+def deltaFrames(deployedImage, image, size, frameSize):
+    changed = deployedImage ^ image
+    frameMask = (1 << frameSize) - 1
+    frames = []
+    address = 0
+    while changed:
+        # Skip unchanged frames in bulk
+        if not changed & frameMask:
+            skip = ((changed & -changed).bit_length() - 1) // frameSize
+            changed >>= skip * frameSize
+            address += skip
+            continue
+        frames.append((address, (image >> (address * frameSize)) & frameMask))
+        changed >>= frameSize
+        address += 1
+    return frames
+
+
+# Address width of a frame record
+def frameAddressBits(size, frameSize):
+    return max(1, clog2((size + frameSize - 1) // frameSize))
+
+
+# Full load bitstream - [BIT] (MSB first)
+def fullBitstream(image, size):
+    return [(image >> bit) & 1 for bit in range(size - 1, -1, -1)]
+
+
+# Delta load bitstream - {Address, Data} records (MSB first)
+def deltaBitstream(frames, size, frameSize):
+    addressBits = frameAddressBits(size, frameSize)
+    bits = []
+    for address, data in frames:
+        record = (address << frameSize) | data
+        bits.extend((record >> bit) & 1 for bit in range(addressBits + frameSize - 1, -1, -1))
+    return bits
+
+
+# Cycle counts (one bit per cfg_clk) - (FULL, DELTA)
+def loadCycles(frames, size, frameSize):
+    return size, len(frames) * (frameAddressBits(size, frameSize) + frameSize)
+
+
+# Zero-run compressed bitstream of an encrypted image - [BIT] (MSB first)
+def compressedBitstream(image, layout, runBits = 6):
+    chunkSize = layout.keyWidth
+    chunkMask = (1 << chunkSize) - 1
+    chunks    = layout.size // chunkSize
+    leadBits  = layout.size % chunkSize
+    bits = [(image >> bit) & 1 for bit in range(layout.size - 1, chunks * chunkSize - 1, -1)]
+    maxRun = 1 << runBits
+    run = 0
+
+    def flushRun():
+        bits.append(0)
+        bits.extend(((run - 1) >> bit) & 1 for bit in range(runBits - 1, -1, -1))
+
+    for index in range(chunks - 1, -1, -1):
+        chunk = (image >> (index * chunkSize)) & chunkMask
+        if chunk == layout.decryptKey:
+            run += 1
+            if run == maxRun:
+                flushRun()
+                run = 0
+            continue
+        if run:
+            flushRun()
+            run = 0
+        bits.append(1)
+        bits.extend((chunk >> bit) & 1 for bit in range(chunkSize - 1, -1, -1))
+    if run:
+        flushRun()
+    return bits
+
+
+# Cycle level reference model of bitstream_deserializer
+class BitstreamDeserializerModel:
+    def __init__(self, cfgSize, frameSize = 32) -> None:
+        self.cfgSize     = cfgSize
+        self.frameSize   = frameSize
+        self.addressBits = frameAddressBits(cfgSize, frameSize)
+        self.frameBits   = self.addressBits + frameSize
+        self.reset()
+
+    def reset(self):
+        self.parallelOut    = 0
+        self.streamBitCount = 0
+        self.frameBitCount  = 0
+        self.frameShift     = 0
+        self.cycles         = 0
+
+    def cfgDone(self, frameMode):
+        return self.frameBitCount == 0 if frameMode else self.streamBitCount == self.cfgSize
+
+    # One cfg_clk edge
+    def clock(self, serialIn, streamValid, frameMode):
+        self.cycles += 1
+        if not streamValid:
+            return
+        if frameMode:
+            self.frameShift = ((self.frameShift << 1) | serialIn) & ((1 << self.frameBits) - 1)
+            if self.frameBitCount == self.frameBits - 1:
+                address = self.frameShift >> self.frameSize
+                data    = self.frameShift & ((1 << self.frameSize) - 1)
+                shift   = address * self.frameSize
+                padded  = self.parallelOut & ~(((1 << self.frameSize) - 1) << shift) | (data << shift)
+                self.parallelOut   = padded & ((1 << self.cfgSize) - 1)
+                self.frameBitCount = 0
+            else:
+                self.frameBitCount += 1
+        else:
+            self.shiftBit(serialIn)
+
+    # Full load shift (StreamValid)
+    def shiftBit(self, serialIn):
+        self.parallelOut    = ((self.parallelOut << 1) | serialIn) & ((1 << self.cfgSize) - 1)
+        self.streamBitCount += 1
+
+    # Shifts in a decompressed chunk (ChunkValid) - part of a cfg_clk edge driven by the decompressor
+    def shiftChunk(self, chunk, chunkSize):
+        self.parallelOut    = ((self.parallelOut << chunkSize) | chunk) & ((1 << self.cfgSize) - 1)
+        self.streamBitCount += chunkSize
+
+    # Streams a bitstream with StreamValid held high. Returns the # of cycles taken
+    def load(self, bits, frameMode):
+        startCycles = self.cycles
+        for bit in bits:
+            self.clock(bit, True, frameMode)
+        return self.cycles - startCycles
+
+
+# Cycle level reference model of bitstream_decompressor in front of bitstream_deserializer
+class BitstreamDecompressorModel:
+    def __init__(self, cfgSize, decryptKey = 0xDEADBEEF, chunkSize = 32, runBits = 6) -> None:
+        self.chunkSize    = chunkSize
+        self.runBits      = runBits
+        self.decryptKey   = decryptKey
+        self.leadBits     = cfgSize % chunkSize
+        self.deserializer = BitstreamDeserializerModel(cfgSize)
+        self.reset()
+
+    def reset(self):
+        self.deserializer.reset()
+        self.leadCount     = 0
+        self.tokenShift    = 0
+        self.tokenBitCount = 0
+        self.tokenIsRun    = False
+        self.tokenDone     = False
+        self.expandChunk   = 0
+        self.expandCount   = 0
+        self.cycles        = 0
+
+    def streamReady(self):
+        return self.leadCount < self.leadBits or not self.tokenDone or self.expandCount == 0
+
+    # One cfg_clk edge. Returns True if the stream bit was accepted
+    def clock(self, serialIn, streamValid):
+        self.cycles += 1
+        accepted = streamValid and self.streamReady()
+        # Chunk expander (state before the edge)
+        expandLoad = self.tokenDone and self.expandCount == 0
+        if self.expandCount:
+            self.deserializer.shiftChunk(self.expandChunk, self.chunkSize)
+            self.expandCount -= 1
+        elif expandLoad:
+            chunk = self.decryptKey if self.tokenIsRun else self.tokenShift
+            self.deserializer.shiftChunk(chunk, self.chunkSize)
+            self.expandChunk = chunk
+            self.expandCount = self.tokenShift & ((1 << self.runBits) - 1) if self.tokenIsRun else 0
+            self.tokenDone   = False
+        if not accepted:
+            return False
+        if self.leadCount < self.leadBits:
+            # Raw lead bits go straight to the deserializer
+            self.deserializer.shiftBit(serialIn)
+            self.leadCount += 1
+        elif self.tokenBitCount == 0:
+            self.tokenIsRun    = not serialIn
+            self.tokenBitCount = 1
+        else:
+            self.tokenShift = ((self.tokenShift << 1) | serialIn) & ((1 << self.chunkSize) - 1)
+            if self.tokenBitCount == (self.runBits if self.tokenIsRun else self.chunkSize):
+                self.tokenBitCount = 0
+                self.tokenDone     = True
+            else:
+                self.tokenBitCount += 1
+        return True
+
+    # Streams a compressed bitstream (honouring StreamReady) until the configuration is loaded
+    # Returns the # of cycles taken
+    def load(self, bits):
+        startCycles = self.cycles
+        position = 0
+        while position < len(bits):
+            if self.clock(bits[position], True):
+                position += 1
+        while self.tokenDone or self.expandCount:
+            self.clock(0, False)
+        return self.cycles - startCycles
+
+
+# Checks a compressed load against the reference model. Returns (MATCHES, FULL_CYCLES, COMPRESSED_CYCLES)
+def verifyCompressed(image, layout, runBits = 6):
+    model = BitstreamDecompressorModel(layout.size, layout.decryptKey, layout.keyWidth, runBits)
+    compressedCycles = model.load(compressedBitstream(image, layout, runBits))
+    return model.deserializer.parallelOut == image and model.deserializer.cfgDone(False), layout.size, compressedCycles
+
+
+# Configuration image file (JSON) - {"layout": {N, K, M, segmentSize}, "size": <BITS>, "image": <HEX>}
+# The stored image is encrypted (the bits that sit in the deserializer)
+def writeImage(imageFile, layout, image):
+    with open(imageFile, "w") as f:
+        json.dump({"layout": layout.params(), "size": layout.size, "image": "%x"%(image)}, f, indent = 2)
+
+
+# Returns (LAYOUT_PARAMS, SIZE, IMAGE)
+def readImage(imageFile):
+    with open(imageFile, "r") as f:
+        contents = json.load(f)
+    return contents["layout"], contents["size"], int(contents["image"], 16)
+
+
+# Delta file - one "<ADDRESS> <DATA>" hex record per changed frame
+def writeFrames(deltaFile, frames, size, frameSize):
+    addressDigits = (frameAddressBits(size, frameSize) + 3) // 4
+    with open(deltaFile, "w") as f:
+        for address, data in frames:
+            f.write("%0*x %0*x\n"%(addressDigits, address, (frameSize + 3) // 4, data))
+
+
+# Bitstream file - one bit per line in stream order ($readmemb)
+def writeBitstream(bitstreamFile, bits):
+    with open(bitstreamFile, "w") as f:
+        f.write("".join("%d\n"%(bit) for bit in bits))
+
+
+# Diffs an image against the deployed image and writes the delta frames. Returns (FRAMES, FULL_CYCLES, DELTA_CYCLES)
+# A deployed image of a different layout can't be patched - a full load is required
+def generateDelta(deployedFile, layout, image, frameSize, deltaFile):
+    deployedLayout, deployedSize, deployedImage = readImage(deployedFile)
+    if deployedLayout != layout.params() or deployedSize != layout.size:
+        raise BitstreamError("Deployed image %s has layout %s, expected %s - a full load is required"%(deployedFile, \
+                             deployedLayout, layout.params()))
+    frames = deltaFrames(deployedImage, image, layout.size, frameSize)
+    writeFrames(deltaFile, frames, layout.size, frameSize)
+    fullCycles, deltaCycles = loadCycles(frames, layout.size, frameSize)
+    bitstreamLog.info("Delta bitstream %s - %d of %d frame(s) changed, %d cycles (full load %d cycles)"%(deltaFile, len(frames), \
+                      (layout.size + frameSize - 1) // frameSize, deltaCycles, fullCycles))
+    return frames, fullCycles, deltaCycles
+
+
+# Checks a delta against the reference model - full load of the deployed image followed by the delta frame writes
+def verifyDelta(deployedImage, image, size, frameSize):
+    model = BitstreamDeserializerModel(size, frameSize)
+    fullCycles  = model.load(fullBitstream(deployedImage, size), frameMode = False)
+    frames      = deltaFrames(deployedImage, image, size, frameSize)
+    deltaCycles = model.load(deltaBitstream(frames, size, frameSize), frameMode = True)
+    return model.parallelOut == image, fullCycles, deltaCycles
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    argParser = argparse.ArgumentParser(description = "Delta bitstream between two SMU configuration images")
+    argParser.add_argument("deployed", help = "Deployed configuration image")
+    argParser.add_argument("image", help = "New configuration image")
+    argParser.add_argument("--frame-size", type = int, default = 32)
+    argParser.add_argument("--delta", help = "Write the delta frames to this file")
+    args = argParser.parse_args()
+
+    deployedLayout, deployedSize, deployedImage = readImage(args.deployed)
+    layout, size, image = readImage(args.image)
+    if (deployedLayout, deployedSize) != (layout, size):
+        logging.error("Images have different layouts (%s, %s) - a full load is required"%(deployedLayout, layout))
+        exit(1)
+    frames = deltaFrames(deployedImage, image, size, args.frame_size)
+    if args.delta:
+        writeFrames(args.delta, frames, size, args.frame_size)
+    matches, fullCycles, deltaCycles = verifyDelta(deployedImage, image, size, args.frame_size)
+    logging.info("%d of %d frame(s) changed"%(len(frames), (size + args.frame_size - 1) // args.frame_size))
+    logging.info("Full load  : %d cycles"%(fullCycles))
+    logging.info("Delta load : %d cycles (%.1fx fewer)"%(deltaCycles, fullCycles / max(deltaCycles, 1)))
+    if not matches:
+        logging.error("Reference model mismatch - delta load doesn't reproduce the new image")
+        exit(1)
@@ -0,0 +1,180 @@
+import hashlib
+import json
+import logging                                                       # logger
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from DesignDatabase import fileDigest                                # Source content hashes
+
+
+# ************************************** <ASAP COMPILE CACHE> ************************************************
+# Content addressed cache of patch compile results. The key is the SHA256 of -
+#   design database digest | normalized patch AST digest | SMU parameters (N/K/M/SMU_SEGMENT_SIZE, key,
+#   RUN_BITS) | compiler version
+# so a result is reused whenever the same patch is compiled for the same instrumented design and
+# hardware, regardless of file names, formatting or comments of the patch.
+#
+# Two levels -
+#   Memory : LRU of up to <maxEntries> results (a hit is a dict lookup)
+#   Disk   : <cacheDir>/<KEY[:2]>/<KEY>.json, bounded to <maxBytes> by evicting the least recently used
+#            entries (hits refresh the entry mtime). A put only updates a running byte total - the directory
+#            is scanned on the first put, when the total crosses <maxBytes> (evicts down to 90%) and every
+#            <scanInterval> puts (picks up entries of other writers of a shared directory)
+# Shared cache directories - entries are written to a temporary file in the entry directory and renamed
+# into place (atomic), so readers never see a partial entry. Writers of the same key race harmlessly
+# (same content). Entries deleted by a concurrent eviction, or unreadable for any reason, are misses.
+#
+# Result - {"image": <ENCRYPTED IMAGE INT>, "compressed": <BITSTRING>, "report": {...}}
+# *************************************************************************************************************
+
+
+class CompileCache:
+    def __init__(self, cacheDir = None, maxEntries = 128, maxBytes = 256 << 20, scanInterval = 256) -> None:
+        self.cacheDir      = cacheDir
+        self.maxEntries    = maxEntries
+        self.maxBytes      = maxBytes
+        self.scanInterval  = scanInterval
+        self.memory        = OrderedDict()   # {<KEY>:<RESULT>}
+        self.fileDigests   = {}              # {<FILE>:((MTIME_NS, SIZE, INODE), <DIGEST>)}
+        self.lock          = threading.Lock()
+        self.hits          = 0
+        self.misses        = 0
+        self.diskLock      = threading.Lock()
+        self.diskBytes     = None            # Running size of the disk level (None until the first scan)
+        self.putsSinceScan = 0
+        if cacheDir:
+            os.makedirs(cacheDir, exist_ok = True)
+
+    # SHA256 of a file, memoized on (mtime, size, inode) - the design database is re-hashed only if rewritten
+    def fileDigest(self, file):
+        stat = os.stat(file)
+        stamp = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        cached = self.fileDigests.get(file)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        digest = fileDigest(file)
+        self.fileDigests[file] = (stamp, digest)
+        return digest
+
+    @staticmethod
+    def key(designDigest, patchDigest, params, version):
+        key = hashlib.sha256()
+        key.update(designDigest)
+        key.update(patchDigest)
+        key.update(json.dumps(params, sort_keys = True).encode('utf-8'))
+        key.update(str(version).encode('utf-8'))
+        return key.hexdigest()
+
+    def entryFile(self, key):
+        return os.path.join(self.cacheDir, key[:2], key + ".json")
+
+    # Returns the cached result of <key> or None
+    def get(self, key):
+        with self.lock:
+            result = self.memory.get(key)
+            if result is not None:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return result
+        result = self.load(key) if self.cacheDir else None
+        with self.lock:
+            if result is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.remember(key, result)
+        return result
+
+    def put(self, key, result):
+        with self.lock:
+            self.remember(key, result)
+        if self.cacheDir:
+            self.evict(self.store(key, result))
+
+    def remember(self, key, result):
+        self.memory[key] = result
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.maxEntries:
+            self.memory.popitem(last = False)
+
+    def load(self, key):
+        entryFile = self.entryFile(key)
+        try:
+            with open(entryFile, "r") as f:
+                entry = json.load(f)
+            result = {"image": int(entry["image"], 16), "compressed": entry["compressed"], "report": entry["report"]}
+        except (OSError, ValueError, KeyError) as e:
+            if not isinstance(e, FileNotFoundError):
+                logging.warning("Compile cache entry %s is unreadable - %s"%(entryFile, e))
+            return None
+        # LRU age - a read-only shared cache still serves hits
+        try:
+            os.utime(entryFile)
+        except OSError:
+            pass
+        return result
+
+    # Writes the disk entry of <key>. Returns the change of the disk level size in bytes
+    def store(self, key, result):
+        entryDir = os.path.dirname(self.entryFile(key))
+        os.makedirs(entryDir, exist_ok = True)
+        fd, tempFile = tempfile.mkstemp(dir = entryDir, prefix = ".tmp-", suffix = ".json")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({"image": "%x"%(result["image"]), "compressed": result["compressed"], "report": result["report"]}, f)
+            addedBytes = os.path.getsize(tempFile)
+            try:
+                addedBytes -= os.path.getsize(self.entryFile(key))
+            except OSError:
+                pass
+            os.replace(tempFile, self.entryFile(key))
+            return addedBytes
+        except OSError as e:
+            logging.warning("Compile cache entry %s not written - %s"%(key, e))
+            try:
+                os.remove(tempFile)
+            except OSError:
+                pass
+            return 0
+
+    # Accounts <addedBytes> to the disk level and evicts if it may be over maxBytes
+    def evict(self, addedBytes):
+        with self.diskLock:
+            self.putsSinceScan += 1
+            if self.diskBytes is not None and self.putsSinceScan < self.scanInterval:
+                self.diskBytes += addedBytes
+                if self.diskBytes <= self.maxBytes:
+                    return
+            self.putsSinceScan = 0
+            self.diskBytes = self.evictScan()
+
+    # Removes the least recently used disk entries once the cache directory is over maxBytes, down to 90% of
+    # maxBytes (so that a full cache isn't rescanned on every put). Returns the size of the disk level
+    def evictScan(self):
+        entries = []
+        totalBytes = 0
+        for entryDir in os.scandir(self.cacheDir):
+            if not entryDir.is_dir():
+                continue
+            for entry in os.scandir(entryDir.path):
+                if entry.name.startswith(".tmp-"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+                totalBytes += stat.st_size
+        if totalBytes <= self.maxBytes:
+            return totalBytes
+        entries.sort()
+        for _, size, path in entries:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            totalBytes -= size
+            if totalBytes <= self.maxBytes - self.maxBytes // 10:
+                break
+        return totalBytes
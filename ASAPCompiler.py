@@ -3,6 +3,20 @@ import ply.lex as lex
 import logging                                                       # logger
 import pyfiglet                                                      # ASCII formatter (Just for tooling fun :) :))
 import re                                                            # Regex
+import os
+import argparse                                                      # Command line options
+import hashlib                                                       # Patch AST digests (compile cache keys)
+import json
+from SignalIndex import SignalResolutionError                        # Hierarchical signal path index errors
+from DesignDatabase import DesignDatabase                            # Serialized design database (insertion -> compiler)
+from ASAPProfiler import profiler                                    # Stage timers/memory/counters (disabled by default)
+from ASAPBitstream import SmuConfigLayout, SmuImageCompiler, BitstreamError, writeImage, generateDelta, \
+                          compressedBitstream, writeBitstream           # SMU configuration image/bitstreams
+from ASAPCache import CompileCache                                   # Content addressed compile results
+from ASAPLog import addLoggingArguments, configureLogging            # Structured/asynchronous logging
+
+# Version of the compile output - part of the compile cache key. Bump when image/bitstream generation changes
+COMPILER_VERSION = "1"
 
 #--------------------------------------------- LOGGER SETUP----------------------------------------#
 # Configure logging - Done at file top so that all classes have it accessible
@@ -13,6 +27,8 @@ formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
 fileHandler.setFormatter(formatter)
 logging.getLogger().addHandler(fileHandler)
 logging.info("Started Automatic, Scalable And Programmable (ASAP) tool for Hardware Patching...\n\n " + pyfiglet.figlet_format("ASAP COMPILER"))
+# Patch parse/resolution/scheduling/image records (--log-level asap.compiler=LEVEL)
+compilerLog = logging.getLogger("asap.compiler")
 #--------------------------------------------------------------------------------------------------#
 
 
@@ -28,6 +44,9 @@ logging.info("Started Automatic, Scalable And Programmable (ASAP) tool for Hardw
 #  (TOP.A[1:0] == 2'b00)
 #  (TOP.inst1.inter[1:0] > 2'b10)
 # }
+# Constants are sized Verilog style literals - <WIDTH>'b/'o/'d/'h<DIGITS> (e.g. 2'b00, 12'h3ff, 8'd200).
+# '_' separates digits. x/? digits are don't-care bits (masked out of the comparison through RegCmpMask),
+# e.g. 8'b1x0? or 16'hxx3f. A leading x/? extends to the literal width (8'hx --> all bits don't-care)
 #Given below is the AST for the above sequence. A SequenceList may have multiple sequences
 #
 #SequenceList(List(Sequences))
@@ -38,7 +57,7 @@ logging.info("Started Automatic, Scalable And Programmable (ASAP) tool for Hardw
 #        |     |
 #        |     +-- Variable (name = TOP.A, msb = 1, lsb = 0)
 #        |     +-- Comparison (operator = "==")      
-#        |     +-- Const (width = 2, binaryValue = "00")     
+#        |     +-- Const (width = 2, value = 0)
 #        |     |     
 #        |          
 #        |
@@ -46,7 +65,7 @@ logging.info("Started Automatic, Scalable And Programmable (ASAP) tool for Hardw
 #              |
 #              +-- Variable (name = TOP.inst1.inter, msb = 1, lsb = 0)
 #              +-- Comparison (operator = ">")
-#              +-- Const (width = 2, binaryValue = "10")
+#              +-- Const (width = 2, value = 2)
 
 #
 # Refer the code for detailed analysis of the structures
@@ -54,24 +73,112 @@ logging.info("Started Automatic, Scalable And Programmable (ASAP) tool for Hardw
 
 #  ****  AST Structures for ASAP-SMU Programming Language **** #
 
-# A Const is always a sized binary representation like 3'b010.
-# For 3'b010, width = 3, binaryValue = 010
+# AST nodes use __slots__ - patches can carry hundreds of thousands of patterns
+
+# A Const is always a sized literal like 3'b010 or 8'h3x.
+# For 3'b010, width = 3, value = 2 (an int - compare/mask words are computed without re-parsing)
+# dontCare has the x/? bits set (their value bits are 0). For 8'h3x, value = 0x30, dontCare = 0x0f
 class Const:
-    def __init__(self, width:int, binaryValue:str):
-        self.width = width
-        self.binaryValue = binaryValue
+    __slots__ = ('width', 'value', 'dontCare')
+
+    def __init__(self, width:int, value:int, dontCare:int = 0):
+        self.width    = width
+        self.value    = value
+        self.dontCare = dontCare
+
+    # Binary digits (x for don't-care bits)
+    @property
+    def binaryValue(self) -> str:
+        bits = format(self.value, '0%db'%(self.width))
+        if self.dontCare:
+            dontCare = format(self.dontCare, '0%db'%(len(bits)))
+            bits = ''.join('x' if care == '1' else bit for bit, care in zip(bits, dontCare))
+        return bits
 
     def __repr__(self):
         return f'{self.width}\'b{self.binaryValue}'
 
+
+# {<RADIX>:(BASE, BITS PER DIGIT, <DON'T-CARE DIGIT TRANSLATION>)}. The translation maps x/? to an all ones
+# digit and every other digit to 0 (the don't-care mask in the same radix)
+CONST_RADIX = {radix: (base, bits, str.maketrans('0123456789abcdefABCDEFxX?', '0' * 22 + allOnes * 3))  \
+               for radix, base, bits, allOnes in (('b', 2, 1, '1'), ('o', 8, 3, '7'), ('h', 16, 4, 'f'))}
+DONT_CARE_DIGITS = str.maketrans('xX?', '000')
+
+# Largest decimal literal (in digits) converted with a single int() - int_max_str_digits of Python 3.11+
+DECIMAL_CHUNK = 4000
+
+
+# Value of a decimal digit string - split in halves above DECIMAL_CHUNK digits
+def decimalValue(digits):
+    if len(digits) <= DECIMAL_CHUNK:
+        return int(digits, 10)
+    half = len(digits) // 2
+    return decimalValue(digits[:half]) * 10 ** (len(digits) - half) + decimalValue(digits[half:])
+
+
+# Decodes the digits of a sized literal (radix - b/o/d/h). Returns (VALUE, DONT_CARE)
+# Binary/octal/hex digits are converted by int() in their own radix (linear in the # of digits)
+def constValue(width, radix, digits):
+    digits = digits.replace('_', '')
+    radix  = radix.lower()
+    if radix == 'd':
+        if digits in ('x', 'X', '?'):
+            return 0, (1 << width) - 1
+        return decimalValue(digits), 0
+    base, bits, dontCareDigits = CONST_RADIX[radix]
+    if 'x' not in digits and 'X' not in digits and '?' not in digits:
+        return int(digits, base), 0
+    value    = int(digits.translate(DONT_CARE_DIGITS), base)
+    dontCare = int(digits.translate(dontCareDigits), base)
+    if digits[0] in 'xX?':
+        dontCare |= ((1 << width) - 1) & ~((1 << (bits * len(digits))) - 1)
+    return value, dontCare
+
+
+# Interned hierarchical signal paths of patch variables - a path is stored once, variables keep its ID
+class SignalPathTable:
+    def __init__(self) -> None:
+        self.ids   = {}   # {<PATH>:<PATH_ID>}
+        self.paths = []   # [<PATH>]
+
+    def intern(self, path) -> int:
+        pathId = self.ids.get(path)
+        if pathId is None:
+            pathId = len(self.paths)
+            self.ids[path] = pathId
+            self.paths.append(path)
+        return pathId
+
+    def path(self, pathId) -> str:
+        return self.paths[pathId]
+
+    def __len__(self):
+        return len(self.paths)
+
+
+signalPaths = SignalPathTable()
+
+
 # A variable is always a partselected var like A[1:0]
 # It may also have hierarchy in name - e.g. TOP.inst1.sig[1:0]
-# In that case, TOP.inst1.sig becomes name, msb = 1, lsb = 0        
+# In that case, TOP.inst1.sig becomes name, msb = 1, lsb = 0. The name is kept as its signalPaths ID (pathId)
+# portRange is the absolute (msb, lsb) range of the variable on observe_port and latency the # of
+# pipeline stages between the signal and observe_port. Both are populated once the patch is
+# resolved against the signal index of the instrumented design
 class Variable:
+    __slots__ = ('pathId', 'msb', 'lsb', 'portRange', 'latency')
+
     def __init__(self, name:str, msb:int, lsb:int):
-        self.name = name
+        self.pathId = signalPaths.intern(name)
         self.msb  = msb
         self.lsb  = lsb
+        self.portRange = None
+        self.latency   = None
+
+    @property
+    def name(self) -> str:
+        return signalPaths.path(self.pathId)
 
     def __repr__(self):
         return f'{self.name}[{self.msb}:{self.lsb}]'
@@ -79,6 +186,8 @@ class Variable:
 
 # An operation can be >/</==
 class Comparison:
+    __slots__ = ('operator',)
+
     def __init__(self, operator: str):
         self.operator = operator
 
@@ -89,6 +198,8 @@ class Comparison:
 # A token is always an operation statement with LHS and RHS. e.g. A[1:0] == 2'b00 / A[1:0] > 2'b01 /  A[1:0] < 2'b11 
 # Here lhs can be either a Variable/Token. rhs can be either a Const/Token
 class Pattern:
+    __slots__ = ('lhs', 'opType', 'rhs')
+
     def __init__(self, lhs: Variable, opType: Comparison, rhs: Const):
         self.lhs = lhs
         self.opType = opType
@@ -99,10 +210,18 @@ class Pattern:
 
 
 
+# latency is the # of cycles by which the SMU sees the sequence after it happens in the design
+# (observe pipeline stages). Populated by ASAPSmuParser.scheduleSequences
+# trigger is the index of the (deduplicated) trigger raised by the sequence. Sequences with the same
+# canonical patterns share a trigger. Populated by ASAPSmuParser.deduplicateSequences
 class Sequence:
+    __slots__ = ('patterns', 'name', 'latency', 'trigger')
+
     def __init__(self, patterns: List['Pattern'], name: str):
         self.patterns = patterns if patterns is not None else []
         self.name = name
+        self.latency = None
+        self.trigger = None
 
     def addPatterns(self, pattern):
         self.patterns.append(pattern)
@@ -112,6 +231,8 @@ class Sequence:
     
 
 class SequenceList:
+    __slots__ = ('sequences',)
+
     def __init__(self, sequences:List['Sequence']):
         self.sequences = sequences if sequences is not None else []
 
@@ -122,6 +243,44 @@ class SequenceList:
         return f'SequenceList({self.sequences})'
 
 
+# Canonical key of a resolved pattern - (PORT_MSB, PORT_LSB, OPERATOR, VALUE, DONT_CARE)
+# Patterns on different names/ranges of the same observe_port bits share a key
+def patternKey(pattern):
+    msb, lsb = pattern.lhs.portRange
+    return (msb, lsb, pattern.opType.operator, pattern.rhs.value, pattern.rhs.dontCare & ((1 << (msb - lsb + 1)) - 1))
+
+
+# Exception class for sequences that can not be timed on the SMU
+class SequenceTimingError(Exception):
+    pass
+
+
+# A lexical/syntax error of a patch file. line and column are 1-based
+class SmuDiagnostic:
+    def __init__(self, file, line, column, message) -> None:
+        self.file    = file
+        self.line    = line
+        self.column  = column
+        self.message = message
+
+    def __str__(self):
+        return f'{self.file}:{self.line}:{self.column}: {self.message}'
+
+    def __repr__(self):
+        return f'SmuDiagnostic({self.file!r}, {self.line}, {self.column}, {self.message!r})'
+
+
+# Raised once a patch file is parsed if any diagnostics were collected
+class SmuParseError(Exception):
+    def __init__(self, diagnostics) -> None:
+        self.diagnostics = diagnostics
+        super().__init__("%d error(s) in patch - %s"%(len(diagnostics), "; ".join(str(diagnostic) for diagnostic in diagnostics)))
+
+
+# Unexpected text skipped by the lexers - up to the next whitespace or bracket
+SMU_ERROR_TEXT = re.compile(r'[^\s(){}]+|.')
+
+
 class ASAPSmuLexer:
     # Token definitions
     tokens = (
@@ -131,7 +290,7 @@ class ASAPSmuLexer:
         'PATTERN_END',     # ')' Marks the end of a pattern
         'VARIABLE',        # '<Starts with an small/cap alphabet>, <Followed by alpha numeric chars>, <have multiple '.'s, <Has part select>>'
         'COMPARISON',      # Either of </>/==
-        'CONST',           # A binary number with size. e.g. 2'b00, 5'b10101 
+        'CONST',           # A sized literal. e.g. 2'b00, 5'b10101, 8'hx3, 10'd513 
     )
 
     # Token regex patterns
@@ -141,40 +300,157 @@ class ASAPSmuLexer:
     t_PATTERN_END    = r'\)'
     t_VARIABLE       = r'[a-zA-Z_][a-zA-Z_0-9]*(?:\.[a-zA-Z_][a-zA-Z_0-9]*)*\[[0-9]+:[0-9]+\]'
     t_COMPARISON     = r'[><=]=?'
-    t_CONST          = r'[0-9]+\'[bB][01]+'
+    t_CONST          = r'[0-9]+\'(?:[bB][01xX?_]+|[oO][0-7xX?_]+|[dD](?:[0-9][0-9_]*|[xX?])|[hH][0-9a-fA-FxX?_]+)(?![0-9a-zA-Z_?])'
 
     # Ignored characters
     t_ignore = ' \t\n'
 
-    # Error handling - Raise an exception
+    # Error handling - Record the error as (LEXPOS, MESSAGE) and skip the unexpected text
     def t_error(self, t):
-        raise Exception(f"Unexpected character '{t.value[0]}' at line {t.lineno}, position {t.lexpos}")
+        errorText = SMU_ERROR_TEXT.match(t.value).group()
+        self.diagnostics.append((t.lexpos, f"Unexpected input '{errorText}'"))
+        t.lexer.skip(len(errorText))
 
     # Build the lexer
     def build(self, **kwargs):
         self.lexer = lex.lex(module=self, **kwargs)
 
     def __init__(self, **kwargs):
+        self.diagnostics = []
         self.build(**kwargs)
 
 
+# Token of ASAPSmuScanner. payload holds the decoded fields of the token -
+#   SEQUENCE_START --> <NAME>
+#   VARIABLE       --> (<NAME>, MSB, LSB)
+#   CONST          --> (WIDTH, VALUE, DONT_CARE)
+class SmuToken:
+    __slots__ = ('type', 'value', 'payload', 'lexpos')
+
+    def __init__(self, type, value, payload, lexpos):
+        self.type    = type
+        self.value   = value
+        self.payload = payload
+        self.lexpos  = lexpos
+
+    def __repr__(self):
+        return f'SmuToken({self.type}, {self.value!r}, {self.lexpos})'
+
+
+# Scanner for the ASAP-SMU language - a single alternation regex (leading whitespace folded in), matched
+# lazily like PLY. Tokens are the ones of ASAPSmuLexer, but SEQUENCE_START/VARIABLE/CONST payloads are
+# decoded from the groups of the same match (no second regex pass per token). Drop-in for the PLY lexer -
+# input()/token()
+class ASAPSmuScanner:
+    tokens = ASAPSmuLexer.tokens
+
+    MASTER = re.compile(r"""[ \t\r\n]*(?:
+        (?P<SEQUENCE_START>([a-zA-Z_][a-zA-Z_0-9]*)\s*\{)
+      | (?P<SEQUENCE_END>\})
+      | (?P<PATTERN_START>\()
+      | (?P<PATTERN_END>\))
+      | (?P<VARIABLE>([a-zA-Z_][a-zA-Z_0-9]*(?:\.[a-zA-Z_][a-zA-Z_0-9]*)*)\[([0-9]+):([0-9]+)\])
+      | (?P<COMPARISON>[><=]=?)
+      | (?P<CONST>([0-9]+)'(?:[bB]([01xX?_]+)|[oO]([0-7xX?_]+)|[dD]([0-9][0-9_]*|[xX?])|[hH]([0-9a-fA-FxX?_]+))(?![0-9a-zA-Z_?]))
+    )""", re.VERBOSE)
+
+    def __init__(self) -> None:
+        self.lexer       = self         # PLY style access - scanner.lexer.token()
+        self.text        = ""
+        self.position    = 0
+        self.nextMatch   = iter(()).__next__
+        self.diagnostics = []           # [(LEXPOS, MESSAGE)] like ASAPSmuLexer
+
+    def input(self, text):
+        self.text      = text
+        self.position  = 0
+        self.nextMatch = self.MASTER.finditer(text).__next__
+
+    # Returns the next token (None at the end of the input)
+    # An unexpected character is recorded in diagnostics and skipped
+    def token(self):
+        while True:
+            try:
+                match = self.nextMatch()
+            except StopIteration:
+                match = None
+            if match is not None and match.start() == self.position:
+                break
+            rest = self.text[self.position:]
+            if not rest.strip():
+                return None
+            position  = self.position + len(rest) - len(rest.lstrip())
+            errorText = SMU_ERROR_TEXT.match(self.text, position).group()
+            self.diagnostics.append((position, f"Unexpected input '{errorText}'"))
+            self.position  = position + len(errorText)
+            self.nextMatch = self.MASTER.finditer(self.text, self.position).__next__
+        self.position = match.end()
+        kind = match.lastgroup
+        if kind == 'VARIABLE':
+            value, name, msb, lsb = match.group(6, 7, 8, 9)
+            return SmuToken(kind, value, (name, int(msb), int(lsb)), match.start(6))
+        if kind == 'CONST':
+            value, width, binary, octal, decimal, hexadecimal = match.group(11, 12, 13, 14, 15, 16)
+            width = int(width)
+            if binary is not None:
+                payload = (width,) + constValue(width, 'b', binary)
+            elif hexadecimal is not None:
+                payload = (width,) + constValue(width, 'h', hexadecimal)
+            elif octal is not None:
+                payload = (width,) + constValue(width, 'o', octal)
+            else:
+                payload = (width,) + constValue(width, 'd', decimal)
+            return SmuToken(kind, value, payload, match.start(11))
+        if kind == 'SEQUENCE_START':
+            value, name = match.group(1, 2)
+            return SmuToken(kind, value, name, match.start(1))
+        group = match.lastindex
+        return SmuToken(kind, match.group(group), None, match.start(group))
+
+
 class ASAPSmuParser:
-    def __init__(self, asapSmuFile) -> None:
+    # -- scanner : "regex" (ASAPSmuScanner) or "ply" (ASAPSmuLexer)
+    # Raises SmuParseError with all lexical/syntax diagnostics of the file if any
+    def __init__(self, asapSmuFile, scanner = "regex") -> None:
         self.asapSmuFile = asapSmuFile
-        self.smuLexer = ASAPSmuLexer()
+        self.smuLexer = ASAPSmuScanner() if scanner == "regex" else ASAPSmuLexer()
         with open(asapSmuFile, "r") as file:
-            smuCode = file.read() 
-            try:
-                logging.info("Running lexical analysis on ASAP-SMU patch file - '%s'"%(self.asapSmuFile))
-                self.smuLexer.lexer.input(smuCode)
-            except Exception as e:
-                logging.info(str(e))
-                logging.info("Lexical analysis failed.")
-                exit(1)
-            logging.info("Lexical analysis successyfully completed.")
+            self.smuCode = file.read()
+        compilerLog.info("Running lexical analysis on ASAP-SMU patch file - '%s'"%(self.asapSmuFile))
+        with profiler.stage("lex"):
+            self.smuLexer.lexer.input(self.smuCode)
         self.sequenceList = SequenceList([])
-        self.parse()
-        logging.info("Generated AST is - \n %s"%(self.sequenceList))
+        self.diagnostics  = []
+        self.comparisons  = {}            # {<OPERATOR>:Comparison} - shared by the patterns
+        # NOTE: Both lexers tokenize lazily, so token matching is accounted under the parse stage
+        with profiler.stage("parse"):
+            self.parse()
+        self.diagnostics = sorted(self.diagnostics, key = lambda diagnostic: (diagnostic.line, diagnostic.column))
+        if self.diagnostics:
+            for diagnostic in self.diagnostics:
+                compilerLog.info(str(diagnostic))
+            compilerLog.info("Parsing failed - %d error(s)"%(len(self.diagnostics)))
+            raise SmuParseError(self.diagnostics)
+        compilerLog.info("Generated AST is - \n %s"%(self.sequenceList))
+
+    # Returns the 1-based (line, column) of a buffer position
+    def location(self, lexpos):
+        line = self.smuCode.count("\n", 0, lexpos) + 1
+        return line, lexpos - (self.smuCode.rfind("\n", 0, lexpos) + 1) + 1
+
+    # Records a diagnostic at <token> (end of file if None)
+    def error(self, token, message):
+        line, column = self.location(token.lexpos if token is not None else len(self.smuCode))
+        self.diagnostics.append(SmuDiagnostic(self.asapSmuFile, line, column, message))
+
+    @staticmethod
+    def tokenName(token):
+        return token.type if token is not None else "end of file"
+
+    # Skips tokens up to the next token of <tokenTypes> (error recovery)
+    def synchronize(self, tokenTypes):
+        while self.currentToken is not None and self.currentToken.type not in tokenTypes:
+            self.currentToken = self.smuLexer.lexer.token()
 
     def extractVariableInfo(self, variable):
         # Define a regular expression pattern to match VAR_NAME, MSB, and LSB
@@ -191,12 +467,12 @@ class ASAPSmuParser:
             
             return name, msb, lsb
         else:
-            logging.info("Invalid variable string format - %s" %(variable))
+            compilerLog.info("Invalid variable string format - %s" %(variable))
             raise ValueError("Invalid variable string format")
 
     def extractConstInfo(self, const):
-        # Define a regular expression pattern to match WIDTH and BINARY_VALUE
-        pattern = r'(?P<width>\d+)\'b(?P<binary_value>[01]+)'
+        # Define a regular expression pattern to match WIDTH, RADIX and DIGITS
+        pattern = r'(?P<width>\d+)\'(?P<radix>[bBoOdDhH])(?P<digits>[0-9a-fA-FxX?_]+)'
         
         # Match the pattern in the input string
         match = re.match(pattern, const)
@@ -204,100 +480,263 @@ class ASAPSmuParser:
         if match:
             # Extract matched groups
             width = int(match.group('width'))
-            binaryValue = match.group('binary_value')
+            value, dontCare = constValue(width, match.group('radix'), match.group('digits'))
             
-            return width, binaryValue
+            return width, value, dontCare
         else:
-            logging.info("Invalid constant string format - %s" %(const))
+            compilerLog.info("Invalid constant string format - %s" %(const))
             raise ValueError("Invalid constant string format")
 
+    # Parses the token stream into sequenceList. Errors are collected in diagnostics and parsing resumes at
+    # the next '(' (next pattern) or '}' (end of sequence). A sequence start within a sequence closes it
     def parse(self):
-        currentToken = self.smuLexer.lexer.token()
-        logging.info("Parsing %s"%(self.asapSmuFile))
-        while currentToken:
-            try:
-                if currentToken.type == "SEQUENCE_START":
-                    seqName = currentToken.value.rstrip('{')
-                    newSequence = Sequence(patterns = [],     \
-                                           name     = seqName)
-                    currentToken = self.smuLexer.lexer.token()
-                    while currentToken.type != "SEQUENCE_END":
-                        try:
-                            if currentToken.type == "PATTERN_START":
-                                varToken   = self.smuLexer.lexer.token()
-                                compToken  = self.smuLexer.lexer.token()
-                                constToken = self.smuLexer.lexer.token()
-                                # Parsing the variable
-                                try:
-                                    if varToken.type == "VARIABLE":
-                                        varName, msb, lsb  = self.extractVariableInfo(varToken.value)
-                                        newVar = Variable(name = varName, \
-                                                          msb  = msb,     \
-                                                          lsb  = lsb)
-                                    else:
-                                        raise Exception("Syntax Error - Expected a VARIABLE token. Received token %s" % varToken.type)
-                                except Exception as e:
-                                    logging.info(str(e))
-                                    logging.info("Parsing failed")
-                                    exit(1)
-                                # Parsing the comparison operation
-                                try:
-                                    if compToken.type == "COMPARISON":
-                                        compType  = compToken.value
-                                        newComp = Comparison(operator = compType)
-                                    else:
-                                        raise Exception("Syntax Error - Expected a COMPARISON token. Received token %s" % compToken.type)
-                                except Exception as e:
-                                    logging.info(str(e))
-                                    logging.info("Parsing failed")
-                                    exit(1)
-                                # Parsing the Const value
-                                try:
-                                    if constToken.type == "CONST":
-                                        width, binVal  = self.extractConstInfo(constToken.value)
-                                        newConst = Const(width       = width, \
-                                                         binaryValue = binVal)
-                                    else:
-                                        raise Exception("Syntax Error - Expected a CONST token. Received token %s" % constToken.type)
-                                except Exception as e:
-                                    logging.info(str(e))
-                                    logging.info("Parsing failed")
-                                    exit(1)
-                                try:
-                                    patternEndToken = self.smuLexer.lexer.token()
-                                    if  patternEndToken.type == "PATTERN_END":
-                                        newPattern = Pattern(lhs    = newVar,   \
-                                                             opType = newComp,  \
-                                                             rhs    = newConst)
-                                        newSequence.addPatterns(newPattern)
-                                    else:
-                                        raise Exception("Syntax Error - Pattern should end with ')'. Received token %s" % patternEndToken.type)
-                                except Exception as e:
-                                    logging.info(str(e))
-                                    logging.info("Parsing failed")
-                                    exit(1)
-                                currentToken = self.smuLexer.lexer.token()
-                            else:
-                                raise Exception("Syntax Error - Pattern should begin with '(' Received token %s" % currentToken.type)
-                        except Exception as e:
-                            logging.info(str(e))
-                            logging.info("Parsing failed")
-                            exit(1)
-
-                    self.sequenceList.addSequences(newSequence)
-                    currentToken = self.smuLexer.lexer.token()
+        compilerLog.info("Parsing %s"%(self.asapSmuFile))
+        self.currentToken = self.smuLexer.lexer.token()
+        while self.currentToken:
+            currentToken = self.currentToken
+            if currentToken.type != "SEQUENCE_START":
+                self.error(currentToken, "Syntax Error - Sequence should start with '<NAME> {' Received token %s" % currentToken.type)
+                self.synchronize(("SEQUENCE_END", "SEQUENCE_START"))
+                if self.currentToken is not None and self.currentToken.type == "SEQUENCE_END":
+                    self.currentToken = self.smuLexer.lexer.token()
+                continue
+            seqName = currentToken.payload if isinstance(currentToken, SmuToken) else currentToken.value.rstrip('{').rstrip()
+            newSequence = Sequence(patterns = [],     \
+                                   name     = seqName)
+            self.currentToken = self.smuLexer.lexer.token()
+            while self.currentToken is not None and self.currentToken.type not in ("SEQUENCE_END", "SEQUENCE_START"):
+                if self.currentToken.type == "PATTERN_START":
+                    newPattern = self.parsePattern()
+                    if newPattern is not None:
+                        newSequence.addPatterns(newPattern)
                 else:
-                    raise Exception("Syntax Error - Sequence should start with '{{' Received token %s" % currentToken.type)
-            except Exception as e:
-                logging.info(str(e))
-                logging.info("Parsing failed")
-                exit(1)
-        logging.info("Parsed %s successfully - AST generated"%(self.asapSmuFile))
+                    self.error(self.currentToken, "Syntax Error - Pattern should begin with '(' Received token %s" % self.currentToken.type)
+                    self.synchronize(("PATTERN_START", "SEQUENCE_END", "SEQUENCE_START"))
+            if self.currentToken is None or self.currentToken.type != "SEQUENCE_END":
+                self.error(self.currentToken, "Syntax Error - Sequence %s should end with '}' Received %s" % (seqName, self.tokenName(self.currentToken)))
+            else:
+                self.currentToken = self.smuLexer.lexer.token()
+            self.sequenceList.addSequences(newSequence)
+        if not self.diagnostics and not self.smuLexer.diagnostics:
+            compilerLog.info("Parsed %s successfully - AST generated"%(self.asapSmuFile))
+        for lexpos, message in self.smuLexer.diagnostics:
+            self.diagnostics.append(SmuDiagnostic(self.asapSmuFile, *self.location(lexpos), message))
+
+    # Parses '(' VARIABLE COMPARISON CONST ')' at the current token. Returns the Pattern, or None after
+    # recording a diagnostic and resynchronizing
+    def parsePattern(self):
+        tokens = []
+        for tokenType, message in (("VARIABLE",    "Expected a VARIABLE token."),   \
+                                   ("COMPARISON",  "Expected a COMPARISON token."), \
+                                   ("CONST",       "Expected a CONST token."),      \
+                                   ("PATTERN_END", "Pattern should end with ')'.")):
+            self.currentToken = self.smuLexer.lexer.token()
+            if self.currentToken is None or self.currentToken.type != tokenType:
+                self.error(self.currentToken, "Syntax Error - %s Received token %s" % (message, self.tokenName(self.currentToken)))
+                self.synchronize(("PATTERN_START", "SEQUENCE_END", "SEQUENCE_START"))
+                return None
+            tokens.append(self.currentToken)
+        varToken, compToken, constToken, _ = tokens
+        self.currentToken = self.smuLexer.lexer.token()
+        varName, msb, lsb = varToken.payload if isinstance(varToken, SmuToken) else \
+                            self.extractVariableInfo(varToken.value)
+        width, value, dontCare = constToken.payload if isinstance(constToken, SmuToken) else \
+                                 self.extractConstInfo(constToken.value)
+        comparison = self.comparisons.get(compToken.value)
+        if comparison is None:
+            comparison = self.comparisons[compToken.value] = Comparison(operator = compToken.value)
+        return Pattern(lhs    = Variable(name = varName, msb = msb, lsb = lsb), \
+                       opType = comparison,                                    \
+                       rhs    = Const(width = width, value = value, dontCare = dontCare))
+
+    # Resolves every pattern variable to its absolute bit range on observe_port
+    # signalIndex is the observe SignalIndex generated by insertion
+    def resolveSignals(self, signalIndex):
+        compilerLog.info("Resolving patch variables against the observe signal index")
+        with profiler.stage("resolveSignals"):
+            for sequence in self.sequenceList.sequences:
+                for pattern in sequence.patterns:
+                    variable = pattern.lhs
+                    try:
+                        variable.portRange = signalIndex.resolve(variable.name, variable.msb, variable.lsb)
+                    except SignalResolutionError as e:
+                        compilerLog.info(str(e))
+                        compilerLog.info("Signal resolution failed for sequence '%s'"%(sequence.name))
+                        raise
+                    variable.latency = signalIndex.lookup(variable.name).latency
+                    compilerLog.info("-- %s resolved to observe_port[%d:%d] (latency %d)"%(variable, variable.portRange[0], variable.portRange[1], \
+                                                                                            variable.latency))
+        compilerLog.info("Signal resolution complete")
+
+    # Accounts for observe pipeline latency in SMU sequence timing (Must run after resolveSignals)
+    # The SMU FSM matches pattern <i> of a sequence in the i-th cycle after the first match. A pattern on a
+    # signal with latency L sees the design value of L cycles earlier, so the patterns of a sequence stay
+    # on consecutive design cycles only if all of them have the same latency. The sequence is then matched
+    # (and the trigger fires) <latency> cycles after it happens in the design.
+    def scheduleSequences(self):
+        compilerLog.info("Scheduling sequences against observe pipeline latency")
+        for sequence in self.sequenceList.sequences:
+            latencies = {pattern.lhs.latency for pattern in sequence.patterns}
+            if len(latencies) > 1:
+                compilerLog.info("Sequence '%s' mixes signals with observe latencies %s"%(sequence.name, sorted(latencies)))
+                raise SequenceTimingError("Sequence '%s' observes signals with different pipeline latencies %s - "
+                                          "patterns of a sequence must share one observe latency"%(sequence.name, sorted(latencies)))
+            sequence.latency = latencies.pop() if latencies else 0
+            compilerLog.info("-- Sequence '%s' triggers %d cycle(s) after the final pattern occurs"%(sequence.name, sequence.latency))
+        compilerLog.info("Sequence scheduling complete")
+
+    # Merges sequences that match the same patterns into one trigger (Must run after resolveSignals)
+    # Patterns are hash-consed into ids by their canonical key, and a sequence is keyed by its tuple of
+    # pattern ids - a single pass over the patch. Returns the # of SMU units saved
+    def deduplicateSequences(self):
+        compilerLog.info("Deduplicating sequences")
+        with profiler.stage("deduplicateSequences"):
+            patternIds  = {}   # {<PATTERN KEY>:<PATTERN ID>}
+            triggerIds  = {}   # {(<PATTERN ID>, ...):<TRIGGER>}
+            triggerToSequence = []
+            patternCount = 0
+            for sequence in self.sequenceList.sequences:
+                if not sequence.patterns:
+                    continue
+                sequenceKey = tuple(patternIds.setdefault(patternKey(pattern), len(patternIds)) for pattern in sequence.patterns)
+                patternCount += len(sequence.patterns)
+                trigger = triggerIds.get(sequenceKey)
+                if trigger is None:
+                    trigger = triggerIds[sequenceKey] = len(triggerToSequence)
+                    triggerToSequence.append(sequence)
+                else:
+                    compilerLog.info("-- Sequence '%s' matches the patterns of sequence '%s' - sharing trigger %d"%(sequence.name, \
+                                     triggerToSequence[trigger].name, trigger))
+                sequence.trigger = trigger
+            sequenceCount = sum(1 for sequence in self.sequenceList.sequences if sequence.patterns)
+            saved = sequenceCount - len(triggerToSequence)
+            profiler.count("uniquePatterns", len(patternIds))
+            profiler.count("smuUnitsSaved", saved)
+        compilerLog.info("Deduplication complete - %d sequence(s) on %d trigger(s) (%d SMU unit(s) saved), %d unique of %d pattern(s)"%( \
+                         sequenceCount, len(triggerToSequence), saved, len(patternIds), patternCount))
+        return saved
+
+    # Packs the resolved patch into the encrypted SMU configuration image for <layout> (Must run after resolveSignals)
+    def generateImage(self, layout):
+        compilerLog.info("Generating SMU configuration image (N = %d, K = %d, M = %d, SMU_SEGMENT_SIZE = %d, %d bits)"%(layout.N, \
+                         layout.K, layout.M, layout.segmentSize, layout.size))
+        with profiler.stage("generateImage"):
+            image = layout.encrypt(SmuImageCompiler(layout).compile(self.sequenceList))
+        compilerLog.info("SMU configuration image generated")
+        return image
+
+    # SHA256 of the normalized AST - sequence names and patterns, independent of formatting and literal radix
+    def patchDigest(self):
+        digest = hashlib.sha256()
+        for sequence in self.sequenceList.sequences:
+            digest.update(repr((sequence.name, [(pattern.lhs.name, pattern.lhs.msb, pattern.lhs.lsb, pattern.opType.operator, \
+                                                 pattern.rhs.width, pattern.rhs.value, pattern.rhs.dontCare)                \
+                                                for pattern in sequence.patterns])).encode('utf-8'))
+        return digest.digest()
+
+    # Compiles the patch for <layout> - signal resolution, scheduling, deduplication, image and compressed bitstream
+    # Returns {"image": <ENCRYPTED IMAGE>, "compressed": <BITSTRING>, "report": {...}}. With a CompileCache and the
+    # digest of the design database, the result is served from/stored into the cache
+    def compile(self, signalIndex, layout, runBits = 6, cache = None, designDigest = None):
+        cacheKey = None
+        if cache is not None and designDigest is not None:
+            params = dict(layout.params(), decryptKey = layout.decryptKey, keyWidth = layout.keyWidth, runBits = runBits)
+            cacheKey = cache.key(designDigest, self.patchDigest(), params, COMPILER_VERSION)
+            result = cache.get(cacheKey)
+            if result is not None:
+                compilerLog.info("Compile cache hit - %s"%(cacheKey))
+                return result
+        self.resolveSignals(signalIndex)
+        self.scheduleSequences()
+        self.deduplicateSequences()
+        image = self.generateImage(layout)
+        with profiler.stage("compressedBitstream"):
+            compressed = "".join(str(bit) for bit in compressedBitstream(image, layout, runBits))
+        result = {"image"     : image,                                                            \
+                  "compressed": compressed,                                                       \
+                  "report"    : {"layout"    : layout.params(),                                   \
+                                 "imageBits" : layout.size,                                       \
+                                 "compressedBits": len(compressed),                               \
+                                 "sequences" : [{"name"    : sequence.name,                       \
+                                                 "patterns": len(sequence.patterns),              \
+                                                 "latency" : sequence.latency,                    \
+                                                 "trigger" : sequence.trigger}                    \
+                                                for sequence in self.sequenceList.sequences]}}
+        if cacheKey is not None:
+            cache.put(cacheKey, result)
+        return result
 
 
 
 if __name__ == '__main__':
-    parser = ASAPSmuParser("patch.asap.smu")
-
-
-
+    argParser = argparse.ArgumentParser(description = "ASAP-SMU patch compiler")
+    argParser.add_argument("--profile", metavar = "REPORT_JSON", help = "Write a per-stage time/memory/counter report")
+    argParser.add_argument("--trace-memory", action = "store_true", help = "Track per-stage memory with tracemalloc")
+    argParser.add_argument("--cprofile", metavar = "PROFILE_FILE", help = "Dump a cProfile of the run")
+    argParser.add_argument("--image", metavar = "IMAGE_FILE", help = "Write the SMU configuration image")
+    argParser.add_argument("--deployed", metavar = "IMAGE_FILE", help = "Deployed SMU configuration image - emit a delta bitstream")
+    argParser.add_argument("--delta", metavar = "DELTA_FILE", default = "patch.smu.delta", help = "Delta frame records (with --deployed)")
+    argParser.add_argument("--compressed", metavar = "BITSTREAM_FILE", help = "Write the zero-run compressed SMU bitstream")
+    argParser.add_argument("--run-bits", type = int, default = 6, help = "Run length field of the compressed bitstream (RUN_BITS)")
+    argParser.add_argument("--N", type = int, default = 2, help = "Maximum # of cycles for observability")
+    argParser.add_argument("--K", type = int, help = "Maximum # of observable signal bits (default - observe_port width)")
+    argParser.add_argument("--M", type = int, default = 6, help = "Maximum # of triggers (parallel SMU units)")
+    argParser.add_argument("--segment-size", type = int, default = 64, help = "SMU_SEGMENT_SIZE")
+    argParser.add_argument("--decrypt-key", type = lambda key: int(key, 16), default = 0xDEADBEEF, help = "DECRYPT_KEY (hex)")
+    argParser.add_argument("--frame-size", type = int, default = 32, help = "Frame size of the delta bitstream")
+    argParser.add_argument("--report", metavar = "REPORT_JSON", help = "Write the compile report")
+    argParser.add_argument("--cache-dir", help = "Compile cache directory (results keyed by design, patch and SMU parameters)")
+    addLoggingArguments(argParser)
+    args = argParser.parse_args()
+    configureLogging(args)
+    if args.profile or args.cprofile:
+        profiler.enable(traceMemory = args.trace_memory, cProfileFile = args.cprofile)
+
+    DESIGN_DATABASE = "Sample.asap.db"
+    try:
+        parser = ASAPSmuParser("patch.asap.smu")
+    except SmuParseError as e:
+        for diagnostic in e.diagnostics:
+            compilerLog.error(str(diagnostic))
+        exit(1)
+    if os.path.exists(DESIGN_DATABASE):
+        with DesignDatabase(DESIGN_DATABASE) as designDatabase:
+            compilerLog.info("Loaded design database '%s' (top module - '%s')"%(DESIGN_DATABASE, designDatabase.topModule))
+            staleFiles = designDatabase.staleFiles()
+            if staleFiles:
+                compilerLog.warning("Design sources changed since insertion - %s. Re-run insertion."%(", ".join(staleFiles)))
+            try:
+                if args.image or args.deployed or args.compressed or args.report:
+                    K = args.K if args.K is not None else designDatabase.signalIndex('observe').width
+                    layout = SmuConfigLayout(args.N, K, args.M, args.segment_size, args.decrypt_key)
+                    cache  = CompileCache(args.cache_dir) if args.cache_dir else None
+                    result = parser.compile(designDatabase.signalIndex('observe'), layout, args.run_bits, cache, \
+                                            cache.fileDigest(DESIGN_DATABASE) if cache else None)
+                    image = result["image"]
+                    if args.image:
+                        writeImage(args.image, layout, image)
+                        compilerLog.info("SMU configuration image written to %s"%(args.image))
+                    if args.compressed:
+                        writeBitstream(args.compressed, (int(bit) for bit in result["compressed"]))
+                        compilerLog.info("Compressed SMU bitstream written to %s - %d bits (full load %d bits)"%(args.compressed, \
+                                         len(result["compressed"]), layout.size))
+                    if args.deployed:
+                        generateDelta(args.deployed, layout, image, args.frame_size, args.delta)
+                    if args.report:
+                        with open(args.report, "w") as f:
+                            json.dump(result["report"], f, indent = 2)
+                        compilerLog.info("Compile report written to %s"%(args.report))
+                else:
+                    parser.resolveSignals(designDatabase.signalIndex('observe'))
+                    parser.scheduleSequences()
+                    parser.deduplicateSequences()
+            except (SignalResolutionError, SequenceTimingError, BitstreamError) as e:
+                if isinstance(e, BitstreamError):
+                    compilerLog.info(str(e))
+                exit(1)
+    else:
+        compilerLog.warning("Design database '%s' not found - skipping signal resolution"%(DESIGN_DATABASE))
+    profiler.disable()
+    if args.profile:
+        profiler.writeReport(args.profile)
+        compilerLog.info("Profile report written to %s"%(args.profile))
@@ -0,0 +1,217 @@
+import argparse
+import json
+import logging                                                       # logger
+import os
+from concurrent.futures import ProcessPoolExecutor                   # Worker pool for patch compilation
+from InsertionTool import VerilogParser, VerilogGenerator, LowMemoryVerilogGenerator   # Insertion pipeline
+from SignalIndex import SignalResolutionError                        # Hierarchical signal path index errors
+from ASAPProfiler import profiler, peakRss                           # Stage timers/memory/counters (disabled by default)
+from ASAPBitstream import SmuConfigLayout, BitstreamError, writeImage, writeBitstream   # SMU configuration bitstreams
+from ASAPCache import CompileCache                                   # Content addressed compile results
+from ASAPCompiler import ASAPSmuParser, SmuParseError, SequenceTimingError   # ASAP-SMU patch compiler
+from ASAPLog import addLoggingArguments, configureLogging            # Structured/asynchronous logging
+
+
+# ************************************** <ASAP PIPELINE DRIVER> **********************************************
+# Runs insertion and patch compilation end to end in one process -
+#   pragma extraction --> parse --> insertion (stage 1/2) --> signal map --> codegen + design database
+#   --> patch parse/resolution/scheduling/dedup --> SMU image + compressed bitstream
+# The observe SignalIndex is handed to the compiler in memory (the design database is still written for
+# later standalone compiler runs and is the design half of the compile cache key).
+#
+# Outputs per patch <NAME>.asap.smu (in --output-dir) -
+#   <NAME>.smu.image.json --> SMU configuration image (ASAPBitstream.writeImage)
+#   <NAME>.smu.bits       --> Zero-run compressed SMU bitstream, one bit per line
+#   <NAME>.smu.report.json --> Compile report
+# --workers fans stage 1 (modules with pragmas), code generation and patch compilation out over worker processes.
+# *************************************************************************************************************
+
+
+# Compiles one patch file. Returns (<RESULT>, <ERRORS>) - RESULT is None if the patch failed
+# Module level so that it can run in a worker process
+def compilePatch(smuFile, signalIndex, smuParams, runBits, cache = None, cacheDir = None, designDigest = None):
+    if cache is None and cacheDir:
+        cache = CompileCache(cacheDir)
+    try:
+        smuParser = ASAPSmuParser(smuFile)
+        layout = SmuConfigLayout(smuParams["N"],                                                        \
+                                 smuParams["K"] if smuParams["K"] is not None else signalIndex.width,   \
+                                 smuParams["M"],                                                        \
+                                 smuParams["segmentSize"],                                              \
+                                 smuParams["decryptKey"])
+        return smuParser.compile(signalIndex, layout, runBits, cache, designDigest), []
+    except SmuParseError as e:
+        return None, [str(diagnostic) for diagnostic in e.diagnostics]
+    except (SignalResolutionError, SequenceTimingError, BitstreamError) as e:
+        return None, ["%s: %s"%(smuFile, e)]
+
+
+# Writes the image, compressed bitstream and report of a compiled patch to <outputDir>/<NAME>.smu.*
+def writeOutputs(smuFile, result, outputDir, decryptKey):
+    os.makedirs(outputDir, exist_ok = True)
+    name = os.path.basename(smuFile)
+    for suffix in (".asap.smu", ".smu"):
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+            break
+    base = os.path.join(outputDir, name)
+    layout = result["report"]["layout"]
+    writeImage(base + ".smu.image.json",                                                                  \
+               SmuConfigLayout(layout["N"], layout["K"], layout["M"], layout["segmentSize"], decryptKey),  \
+               result["image"])
+    writeBitstream(base + ".smu.bits", (int(bit) for bit in result["compressed"]))
+    with open(base + ".smu.report.json", "w") as f:
+        json.dump(result["report"], f, indent = 2)
+    logging.info("Patch %s - image, compressed bitstream (%d bits) and report written to %s.smu.*"%(smuFile, \
+                 len(result["compressed"]), base))
+
+
+class PipelineDriver:
+    def __init__(self, filelist, topModule, smuFiles, observePort = "observe_port", controlPortIn = "control_port_in", \
+                       controlPortOut = "control_port_out", workers = 1, cacheDir = None, outputDir = ".",           \
+                       smuParams = None, runBits = 6, lowMemory = False, spillDir = None, observePipeline = None,     \
+                       pipelineClock = "clk") -> None:
+        self.filelist        = filelist
+        self.topModule       = topModule
+        self.smuFiles        = list(smuFiles)
+        self.observePort     = observePort
+        self.controlPortIn   = controlPortIn
+        self.controlPortOut  = controlPortOut
+        self.workers         = workers
+        self.cacheDir        = cacheDir
+        self.outputDir       = outputDir
+        self.smuParams       = dict(N = 2, K = None, M = 6, segmentSize = 64, decryptKey = 0xDEADBEEF)
+        self.smuParams.update(smuParams or {})
+        self.runBits         = runBits
+        self.lowMemory       = lowMemory
+        self.spillDir        = spillDir
+        self.observePipeline = observePipeline if observePipeline is not None else {}
+        self.pipelineClock   = pipelineClock
+        self.dbFile          = topModule + ".asap.db"
+        self.cache           = CompileCache(cacheDir)
+
+    # Pragma extraction, parse, insertion, signal map, codegen and design database. Returns the generator
+    def insert(self):
+        if self.lowMemory:
+            parser = VerilogParser(self.filelist, self.topModule, lowMemory = True)
+            generator = LowMemoryVerilogGenerator(parser,                                  \
+                                                  self.topModule,                          \
+                                                  self.observePort,                        \
+                                                  self.controlPortIn,                      \
+                                                  self.controlPortOut,                     \
+                                                  spillDir        = self.spillDir,         \
+                                                  observePipeline = self.observePipeline,  \
+                                                  pipelineClock   = self.pipelineClock)
+        else:
+            parser = VerilogParser(self.filelist, self.topModule)
+            fileToModuleToSignalToObserve, fileToModuleToSignalToControl = parser.fileToModuleToSignalToPragma()
+            generator = VerilogGenerator(parser.fileToAst,                       \
+                                         parser.tree,                            \
+                                         self.topModule,                         \
+                                         fileToModuleToSignalToObserve,          \
+                                         fileToModuleToSignalToControl,          \
+                                         self.observePort,                       \
+                                         self.controlPortIn,                     \
+                                         self.controlPortOut,                    \
+                                         observePipeline = self.observePipeline, \
+                                         pipelineClock   = self.pipelineClock)
+        generator.generateVerilog(workers = self.workers)
+        with profiler.stage("designDatabase"):
+            generator.writeDesignDatabase(self.dbFile)
+        return generator
+
+    # Compiles all patches against the in-memory observe signal index. Returns {<SMU_FILE>:(<RESULT>, <ERRORS>)}
+    def compile(self, signalIndex):
+        designDigest = self.cache.fileDigest(self.dbFile)
+        results = {}
+        with profiler.stage("compile"):
+            if self.workers > 1 and len(self.smuFiles) > 1:
+                logging.info("Compiling %d patches on %d workers..."%(len(self.smuFiles), self.workers))
+                with ProcessPoolExecutor(max_workers = min(self.workers, len(self.smuFiles))) as pool:
+                    futures = {smuFile: pool.submit(compilePatch, smuFile, signalIndex, self.smuParams, self.runBits, \
+                                                    None, self.cacheDir, designDigest) for smuFile in self.smuFiles}
+                    # Workers share the disk level of the cache (safe for concurrent use)
+                    for smuFile, future in futures.items():
+                        results[smuFile] = future.result()
+            else:
+                for smuFile in self.smuFiles:
+                    results[smuFile] = compilePatch(smuFile, signalIndex, self.smuParams, self.runBits, self.cache, None, designDigest)
+        return results
+
+    def writeOutputs(self, smuFile, result):
+        writeOutputs(smuFile, result, self.outputDir, self.smuParams["decryptKey"])
+
+    # Runs the whole pipeline. Returns True if every patch compiled
+    def run(self):
+        with profiler.stage("insertion"):
+            generator = self.insert()
+        results = self.compile(generator.observeSignalIndex)
+        success = True
+        for smuFile, (result, errors) in results.items():
+            if result is None:
+                success = False
+                for error in errors:
+                    logging.error(error)
+                logging.error("Patch %s failed to compile"%(smuFile))
+            else:
+                self.writeOutputs(smuFile, result)
+        return success
+
+
+if __name__ == '__main__':
+    argParser = argparse.ArgumentParser(description = "ASAP insertion and patch compilation in one process")
+    argParser.add_argument("--filelist", default = "filelist.f")
+    argParser.add_argument("--top", default = "Sample", help = "Top module")
+    argParser.add_argument("--smu", nargs = "*", default = ["patch.asap.smu"], help = "ASAP-SMU patch files")
+    argParser.add_argument("--observe-port", default = "observe_port")
+    argParser.add_argument("--control-port-in", default = "control_port_in")
+    argParser.add_argument("--control-port-out", default = "control_port_out")
+    argParser.add_argument("--workers", type = int, default = 1, help = "# of worker processes (stage 1, code generation, patch compilation)")
+    argParser.add_argument("--cache-dir", help = "Compile cache directory")
+    argParser.add_argument("--output-dir", default = ".", help = "Directory for SMU images, bitstreams and reports")
+    argParser.add_argument("--low-memory", action = "store_true", help = "Hold one file's AST at a time (ASTs are spilled to disk)")
+    argParser.add_argument("--spill-dir", help = "Directory for spilled ASTs in low-memory mode (default: temporary directory)")
+    argParser.add_argument("--pipeline-observe", metavar = "MODULE[:STAGES]", action = "append", default = [])
+    argParser.add_argument("--pipeline-clock", default = "clk")
+    argParser.add_argument("--N", type = int, default = 2, help = "Maximum # of cycles for observability")
+    argParser.add_argument("--K", type = int, help = "Maximum # of observable signal bits (default - observe_port width)")
+    argParser.add_argument("--M", type = int, default = 6, help = "Maximum # of triggers (parallel SMU units)")
+    argParser.add_argument("--segment-size", type = int, default = 64, help = "SMU_SEGMENT_SIZE")
+    argParser.add_argument("--decrypt-key", type = lambda key: int(key, 16), default = 0xDEADBEEF, help = "DECRYPT_KEY (hex)")
+    argParser.add_argument("--run-bits", type = int, default = 6, help = "Run length field of the compressed bitstream (RUN_BITS)")
+    argParser.add_argument("--profile", metavar = "REPORT_JSON", help = "Write a per-stage time/memory/counter report")
+    argParser.add_argument("--trace-memory", action = "store_true", help = "Track per-stage memory with tracemalloc")
+    argParser.add_argument("--cprofile", metavar = "PROFILE_FILE", help = "Dump a cProfile of the run")
+    addLoggingArguments(argParser)
+    args = argParser.parse_args()
+    configureLogging(args)
+    if args.profile or args.cprofile:
+        profiler.enable(traceMemory = args.trace_memory, cProfileFile = args.cprofile)
+
+    observePipeline = {}
+    for boundary in args.pipeline_observe:
+        moduleName, _, stages = boundary.partition(":")
+        observePipeline[moduleName] = int(stages) if stages else 1
+    driver = PipelineDriver(args.filelist, args.top, args.smu,                                   \
+                            observePort     = args.observe_port,                                 \
+                            controlPortIn   = args.control_port_in,                              \
+                            controlPortOut  = args.control_port_out,                             \
+                            workers         = args.workers,                                      \
+                            cacheDir        = args.cache_dir,                                    \
+                            outputDir       = args.output_dir,                                   \
+                            smuParams       = dict(N = args.N, K = args.K, M = args.M,           \
+                                                   segmentSize = args.segment_size,              \
+                                                   decryptKey  = args.decrypt_key),              \
+                            runBits         = args.run_bits,                                     \
+                            lowMemory       = args.low_memory,                                   \
+                            spillDir        = args.spill_dir,                                    \
+                            observePipeline = observePipeline,                                   \
+                            pipelineClock   = args.pipeline_clock)
+    success = driver.run()
+    profiler.disable()
+    if args.profile:
+        profiler.writeReport(args.profile)
+        logging.info("Profile report written to %s"%(args.profile))
+    if peakRss() is not None:
+        logging.info("Peak resident memory - %.1f MiB"%(peakRss() / (1 << 20)))
+    exit(0 if success else 1)
@@ -0,0 +1,166 @@
+import atexit
+import json
+from contextlib import contextmanager
+import logging                                                       # logger
+import logging.handlers
+import os
+import queue
+
+
+# ************************************** <ASAP ASYNCHRONOUS LOGGING> *****************************************
+# Moves log I/O off the insertion/compiler threads -
+#   Caller     : The root logger gets a single DeferredQueueHandler. A log call only creates the record and
+#                enqueues it (the message is formatted by the writer, not by the caller)
+#   Writer     : A QueueListener thread hands the records to the handlers the tools configured at import
+#                (console, verilog_parse.log, asap_compiler.log) plus an optional JSON lines file
+#   Exit       : The writer is drained and stopped at interpreter exit (atexit), so no record is lost
+# Forked worker processes (ProcessPoolExecutor) get the original handlers back - the writer thread is not
+# inherited by the child.
+#
+# Subsystems are logger names under "asap" (e.g. asap.insertion.stageOne, asap.insertion.stageTwo, asap.compiler,
+# asap.compiler.bitstream) and get their own levels with --log-level SUBSYSTEM=LEVEL.
+# Structured records - pass the event fields with extra = logEvent(module = ..., signal = ..., action = ...,
+# widths = ...). In the JSON lines file a record is -
+#   {"time": <EPOCH>, "level": <LEVEL>, "subsystem": <LOGGER>, "message": <MESSAGE>, <EVENT FIELDS>...}
+# *************************************************************************************************************
+
+
+# extra for a structured log record - logger.info(message, *args, extra = logEvent(module = "Sample", ...))
+def logEvent(**fields):
+    return {"event": fields}
+
+
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {"time"     : record.created,       \
+                 "level"    : record.levelname,     \
+                 "subsystem": record.name,          \
+                 "message"  : record.getMessage()}
+        entry.update(getattr(record, "event", {}))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default = str)
+
+
+# Enqueues records as they are - formatting is left to the writer thread
+# (log arguments are plain strings/numbers, so they can't change before the writer formats them)
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        return record
+
+
+class AsyncLogging:
+    def __init__(self) -> None:
+        self.listener     = None
+        self.queueHandler = None
+        self.handlers     = []
+
+    # Starts the writer thread
+    # -- jsonFile : Also write every record as a JSON line to this file
+    # -- levels   : {<SUBSYSTEM>:<LEVEL>} per logger levels (e.g. {"asap.insertion.stageOne": "WARNING"})
+    def start(self, jsonFile = None, levels = None):
+        if self.listener is not None:
+            return
+        for subsystem, level in (levels or {}).items():
+            logging.getLogger(subsystem).setLevel(level.upper() if isinstance(level, str) else level)
+        root = logging.getLogger()
+        self.handlers = list(root.handlers)
+        if jsonFile:
+            jsonHandler = logging.FileHandler(jsonFile, mode = 'w')
+            jsonHandler.setFormatter(JsonLinesFormatter())
+            self.handlers.append(jsonHandler)
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        self.queueHandler = DeferredQueueHandler(queue.SimpleQueue())
+        root.addHandler(self.queueHandler)
+        self.listener = logging.handlers.QueueListener(self.queueHandler.queue, *self.handlers, respect_handler_level = True)
+        self.listener.start()
+        atexit.register(self.stop)
+
+    # Drains the queue, stops the writer thread and restores the handlers
+    def stop(self):
+        if self.listener is None:
+            return
+        self.listener.stop()
+        self.listener = None
+        self.restoreHandlers()
+        for handler in self.handlers:
+            handler.flush()
+
+    def restoreHandlers(self):
+        root = logging.getLogger()
+        if self.queueHandler in root.handlers:
+            root.removeHandler(self.queueHandler)
+        for handler in self.handlers:
+            if handler not in root.handlers:
+                root.addHandler(handler)
+
+    # Forked child - the writer thread doesn't exist there, log through the original handlers
+    def afterFork(self):
+        if self.listener is not None:
+            self.listener = None
+            self.restoreHandlers()
+
+
+# Keeps the log records of a block (e.g. a task in a worker process) instead of handling them
+# The records are picklable (message formatted, exception text rendered), so a worker can return them and the
+# parent replays them in submission order - the log of a parallel run reads like the serial one
+class LogRecordCollector(logging.Handler):
+    def __init__(self) -> None:
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        record.msg  = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        self.records.append(record)
+
+
+@contextmanager
+def collectLogRecords():
+    root = logging.getLogger()
+    handlers = root.handlers[:]
+    collector = LogRecordCollector()
+    for handler in handlers:
+        root.removeHandler(handler)
+    root.addHandler(collector)
+    try:
+        yield collector.records
+    finally:
+        root.removeHandler(collector)
+        for handler in handlers:
+            root.addHandler(handler)
+
+
+# Hands collected records to the handlers of this process
+def replayLogRecords(records):
+    for record in records:
+        logging.getLogger(record.name).handle(record)
+
+
+asyncLogging = AsyncLogging()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child = asyncLogging.afterFork)
+
+
+# Command line options shared by the tools
+def addLoggingArguments(argParser):
+    argParser.add_argument("--async-log", action = "store_true", help = "Write logs from a background thread")
+    argParser.add_argument("--log-json", metavar = "JSONL_FILE", help = "Also write structured JSON lines logs (implies --async-log)")
+    argParser.add_argument("--log-level", metavar = "SUBSYSTEM=LEVEL", action = "append", default = [],
+                           help = "Log level of a subsystem, e.g. asap.insertion.stageOne=WARNING (repeatable)")
+
+
+def configureLogging(args):
+    levels = {}
+    for setting in args.log_level:
+        subsystem, _, level = setting.partition("=")
+        levels[subsystem] = level
+    if args.async_log or args.log_json:
+        asyncLogging.start(jsonFile = args.log_json, levels = levels)
+    else:
+        for subsystem, level in levels.items():
+            logging.getLogger(subsystem).setLevel(level.upper())
@@ -0,0 +1,239 @@
+import cProfile                                                      # Optional function level profile dump
+import json
+import sys
+import time
+import tracemalloc                                                   # Memory usage per stage
+from contextlib import contextmanager
+
+
+# ************************************** <ASAP STAGE PROFILER> ***********************************************
+# Hierarchical stage timers, memory tracking and counters for the insertion tool and compiler.
+#
+#   with profiler.stage("stageOne"):
+#       with profiler.stage("module:Sample"):
+#           ...
+#   profiler.count("assignsEmitted", len(assignmentList))
+#
+# The profiler is disabled by default. A disabled profiler hands out a shared no-op stage and
+# ignores counters, so instrumented code pays an attribute lookup and a call per stage. Hot loops
+# should still guard counter updates with `if profiler.enabled`.
+#
+# Report (JSON) -
+#   {"stages":   {"name": "total", "calls": 1, "time": <SECONDS>, "memoryPeak": <BYTES>,
+#                 "memoryDelta": <BYTES>, "children": [...]},
+#    "counters": {<COUNTER>: <VALUE>},
+#    "peakRss":  <BYTES>}
+# memoryPeak/memoryDelta (and topAllocations for top-level stages) are reported with traceMemory only.
+# "peakRss" is the peak resident set size of the process (bytes, None where unavailable).
+#
+# Worker processes don't share the profiler of the parent. A worker profiles its part of a stage into a
+# fresh profile (profiler.collect) and the parent merges it under its current stage (profiler.merge), like
+# log records. Merged stage times add up the worker times, and memory isn't tracked in workers.
+# *************************************************************************************************************
+
+
+# Returns the peak resident set size of the process in bytes (None if the platform can't tell)
+def peakRss():
+    try:
+        import resource
+    except ImportError:
+        return None
+    maxRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere
+    return maxRss if sys.platform == "darwin" else maxRss * 1024
+
+
+# Node of the stage hierarchy - accumulates over repeated entries of the same stage
+class ProfileNode:
+    def __init__(self, name) -> None:
+        self.name           = name
+        self.calls          = 0
+        self.time           = 0.0
+        self.memoryPeak     = 0
+        self.memoryDelta    = 0
+        self.topAllocations = None
+        self.children       = {}
+
+    def toDict(self, traceMemory):
+        node = {"name": self.name, "calls": self.calls, "time": self.time}
+        if traceMemory:
+            node["memoryPeak"]  = self.memoryPeak
+            node["memoryDelta"] = self.memoryDelta
+            if self.topAllocations is not None:
+                node["topAllocations"] = self.topAllocations
+        if self.children:
+            node["children"] = [child.toDict(traceMemory) for child in self.children.values()]
+        return node
+
+    # Accumulates the stages of <other> (same stage, profiled in another process) into this node
+    def merge(self, other):
+        self.calls       += other.calls
+        self.time        += other.time
+        self.memoryPeak   = max(self.memoryPeak, other.memoryPeak)
+        self.memoryDelta += other.memoryDelta
+        for name, otherChild in other.children.items():
+            child = self.children.get(name)
+            if child is None:
+                child = self.children[name] = ProfileNode(name)
+            child.merge(otherChild)
+
+
+# No-op stage handed out by a disabled profiler
+class NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+NULL_STAGE = NullStage()
+
+
+# Active stage (context manager)
+class ProfileStage:
+    def __init__(self, profiler, name) -> None:
+        self.profiler = profiler
+        self.name     = name
+
+    def __enter__(self):
+        profiler = self.profiler
+        parent = profiler.stack[-1]
+        node = parent.node.children.get(self.name)
+        if node is None:
+            node = parent.node.children[self.name] = ProfileNode(self.name)
+        self.node = node
+        if profiler.traceMemory:
+            # Fold the peak seen so far into the parent before re-arming the peak tracker
+            parent.peak = max(parent.peak, tracemalloc.get_traced_memory()[1])
+            # Snapshots are traced allocations themselves - take it before the baseline is recorded
+            self.snapshot = tracemalloc.take_snapshot() if len(profiler.stack) == 1 else None
+            tracemalloc.reset_peak()
+            self.memoryStart = tracemalloc.get_traced_memory()[0]
+            self.peak = self.memoryStart
+        profiler.stack.append(self)
+        self.startTime = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        elapsed = time.perf_counter() - self.startTime
+        profiler = self.profiler
+        profiler.stack.pop()
+        node = self.node
+        node.calls += 1
+        node.time  += elapsed
+        if profiler.traceMemory:
+            current, peak = tracemalloc.get_traced_memory()
+            self.peak = max(self.peak, peak)
+            node.memoryPeak   = max(node.memoryPeak, self.peak - self.memoryStart)
+            node.memoryDelta += current - self.memoryStart
+            parent = profiler.stack[-1]
+            parent.peak = max(parent.peak, self.peak)
+            if self.snapshot is not None:
+                statistics = tracemalloc.take_snapshot().compare_to(self.snapshot, "lineno")[:profiler.topAllocations]
+                node.topAllocations = [{"location": str(statistic.traceback), "sizeDiff": statistic.size_diff} \
+                                       for statistic in statistics]
+                # Release the snapshots right away so they don't skew the next stage
+                self.snapshot = None
+        return False
+
+
+# Root frame of the stage stack
+class RootStage:
+    def __init__(self) -> None:
+        self.node = ProfileNode("total")
+        self.peak = 0
+
+
+class StageProfiler:
+    def __init__(self) -> None:
+        self.enabled        = False
+        self.traceMemory    = False
+        self.topAllocations = 5
+        self.cProfileFile   = None
+        self.cProfile       = None
+        self.reset()
+
+    def reset(self):
+        self.root      = RootStage()
+        self.stack     = [self.root]
+        self.counters  = {}
+        self.startTime = time.perf_counter()
+
+    # Enables profiling
+    # -- traceMemory  : Track current/peak memory per stage with tracemalloc (slows the run down)
+    # -- cProfileFile : Also collect a cProfile of the run and dump it to this file on disable()
+    def enable(self, traceMemory = False, cProfileFile = None):
+        self.reset()
+        self.enabled     = True
+        self.traceMemory = traceMemory
+        if traceMemory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.cProfileFile = cProfileFile
+        if cProfileFile:
+            self.cProfile = cProfile.Profile()
+            self.cProfile.enable()
+
+    def disable(self):
+        if not self.enabled:
+            return
+        self.root.node.time = time.perf_counter() - self.startTime
+        self.root.node.calls = 1
+        if self.traceMemory:
+            self.root.node.memoryPeak = max(self.root.peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        if self.cProfile is not None:
+            self.cProfile.disable()
+            self.cProfile.dump_stats(self.cProfileFile)
+            self.cProfile = None
+        self.enabled = False
+
+    def stage(self, name):
+        if not self.enabled:
+            return NULL_STAGE
+        return ProfileStage(self, name)
+
+    def count(self, name, value = 1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    # Profiles a worker process into a fresh profile. <enabled> is the state of the parent profiler (the
+    # profiler of a worker is a disabled or forked copy). Yields {} - {"stages": <ROOT NODE>, "counters": {...}}
+    # on exit with <enabled>, to be passed to merge() in the parent
+    @contextmanager
+    def collect(self, enabled):
+        profile = {}
+        if not enabled:
+            yield profile
+            return
+        saved = (self.enabled, self.traceMemory, self.root, self.stack, self.counters, self.startTime)
+        self.enabled     = True
+        self.traceMemory = False
+        self.reset()
+        try:
+            yield profile
+        finally:
+            profile["stages"]   = self.root.node
+            profile["counters"] = self.counters
+            self.enabled, self.traceMemory, self.root, self.stack, self.counters, self.startTime = saved
+
+    # Merges a worker profile (collect) under the current stage
+    def merge(self, profile):
+        if not self.enabled or not profile:
+            return
+        self.stack[-1].node.merge(profile["stages"])
+        for name, value in profile["counters"].items():
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def report(self):
+        return {"stages"  : self.root.node.toDict(self.traceMemory), \
+                "counters": dict(self.counters),                     \
+                "peakRss" : peakRss()}
+
+    def writeReport(self, reportFile):
+        with open(reportFile, "w") as f:
+            json.dump(self.report(), f, indent = 2)
+
+
+# Shared profiler used by the ASAP tools
+profiler = StageProfiler()
@@ -0,0 +1,898 @@
+import argparse
+import logging                                                       # logger
+import random
+import re
+import time
+from pyverilog.vparser.ast import *                                  # PyVerilog AST
+from InsertionTool import VerilogParser                              # Shared pyverilog parser
+from ASAPProfiler import profiler                                    # Stage timers/memory/counters (disabled by default)
+
+
+# ************************************** <ASAP COMPILED SIMULATOR> ******************************************
+# Cycle based, bit-parallel simulator used to check that inserted hooks are transparent - the patched
+# design (FRU disabled: control_port_out = control_port_in) must match the original design cycle by cycle.
+#
+#   Elaboration --> The hierarchy below the top module is flattened into nets. Every net bit is one Python
+#                   variable holding a bit slice - bit <v> of the slice is the value of the net bit in
+#                   stimulus vector <v>, so every operation evaluates all vectors at once (packed ints).
+#   Compilation --> Continuous assigns and port connections become one statement per net bit. Statements
+#                   are levelized at bit granularity (a loop through different bits of the same vector is
+#                   fine, a true combinational loop is an error). always @(posedge) blocks are executed
+#                   symbolically into next-state expressions of their regs (if/case become muxes).
+#                   The whole design is emitted as the source of a single Python function and compiled once -
+#                     cycle(M, state, inputs) -> (nextState, outputs)
+#   Simulation  --> One call per clock cycle - random inputs, settle, sample outputs, clock edge.
+#
+# Supported subset - ANSI/non-ANSI ports, wire/reg declarations, parameters, continuous assigns, instances
+# (named/positional ports and parameter overrides), always @(posedge <clk>) with blocking/non-blocking
+# assignments, if and case. All values are unsigned and x/z are simulated as 0. Every always block is
+# clocked by the one cycle clock; top level inputs that clock always blocks are not randomized.
+# *************************************************************************************************************
+
+
+# Exception class for designs outside the supported subset
+class SimulationError(Exception):
+    pass
+
+
+CONSTANT_PATTERN = re.compile(r"^(\d*)'[sS]?([bBoOdDhH])([0-9a-fA-FxXzZ?_]+)$")
+VARIABLE_PATTERN = re.compile(r"\bv\d+\b")
+RADIX = {"b": 2, "o": 8, "d": 10, "h": 16}
+
+# Compound expressions longer than this are materialized into a temporary
+MAX_EXPRESSION = 160
+
+
+# Returns (WIDTH, VALUE) of an IntConst. Unsized constants are 32 bits wide
+def parseConstant(text):
+    text = text.replace("_", "")
+    match = CONSTANT_PATTERN.match(text)
+    if match is None:
+        return 32, int(text)
+    size, radix, digits = match.groups()
+    digits = re.sub(r"[xXzZ?]", "0", digits)
+    value = int(digits, RADIX[radix.lower()])
+    width = int(size) if size else 32
+    return width, value & ((1 << width) - 1)
+
+
+# A flattened net - bits are variable names, LSB first
+class Net:
+    __slots__ = ("name", "msb", "lsb", "bits", "isReg")
+
+    def __init__(self, name, msb, lsb, bits, isReg = False) -> None:
+        self.name  = name
+        self.msb   = msb
+        self.lsb   = lsb
+        self.bits  = bits
+        self.isReg = isReg
+
+    # Bit position of a declared index
+    def position(self, index):
+        position = index - self.lsb if self.msb >= self.lsb else self.lsb - index
+        if not 0 <= position < len(self.bits):
+            raise SimulationError("Index %d is out of range of %s[%d:%d]"%(index, self.name, self.msb, self.lsb))
+        return position
+
+
+# Elaborated instance of a module - {<NAME>:Net}, parameter values and the hierarchical prefix
+class Scope:
+    def __init__(self, prefix, moduleDef, params) -> None:
+        self.prefix    = prefix
+        self.moduleDef = moduleDef
+        self.params    = params
+        self.nets      = {}
+
+    def net(self, name):
+        net = self.nets.get(name)
+        if net is None:
+            raise SimulationError("Unknown net '%s' in module %s (%s)"%(name, self.moduleDef.name, self.prefix or "top"))
+        return net
+
+
+class SimulatorCompiler:
+    def __init__(self, moduleDefs, topModule, ties = None) -> None:
+        self.moduleDefs = moduleDefs
+        self.topModule  = topModule
+        self.ties       = ties if ties is not None else {}
+        self.varNames   = []     # Variable -> "<NET>[<BIT>]" (diagnostics)
+        self.combStatements = {} # {<VAR>:<EXPRESSION>} continuous assigns and port connections
+        self.seqStatements  = [] # [(<VAR>, <EXPRESSION>)] next-state computation (in order)
+        self.nextState  = {}     # {<REG VAR>:<NEXT STATE VAR>}
+        self.netAlias   = {}     # {<NET>:<NET>} for plain port connections (clock tracing)
+        self.clockNets  = set()
+        self.sink       = None   # Statement list temporaries are emitted to
+        self.reads      = None   # Blocking assignment overrides while executing an always block
+
+    # -------------------------------------------- Elaboration --------------------------------------------
+
+    def newVar(self, name):
+        self.varNames.append(name)
+        return "v%d"%(len(self.varNames) - 1)
+
+    def constValue(self, node, params):
+        if isinstance(node, (Rvalue, Lvalue)):
+            return self.constValue(node.var, params)
+        if isinstance(node, IntConst):
+            return parseConstant(node.value)[1]
+        if isinstance(node, Identifier):
+            if node.name not in params:
+                raise SimulationError("'%s' is not a constant"%(node.name))
+            return params[node.name]
+        if isinstance(node, Cond):
+            return self.constValue(node.true_value if self.constValue(node.cond, params) else node.false_value, params)
+        if isinstance(node, UnaryOperator):
+            value = self.constValue(node.right, params)
+            operations = {Uminus: lambda: -value, Uplus: lambda: value, Ulnot: lambda: int(not value), Unot: lambda: ~value}
+        elif isinstance(node, Operator):
+            left, right = self.constValue(node.left, params), self.constValue(node.right, params)
+            operations = {Plus: lambda: left + right, Minus: lambda: left - right, Times: lambda: left * right,
+                          Divide: lambda: left // right, Mod: lambda: left % right, Power: lambda: left ** right,
+                          Sll: lambda: left << right, Srl: lambda: left >> right, Sla: lambda: left << right,
+                          Sra: lambda: left >> right, And: lambda: left & right, Or: lambda: left | right,
+                          Xor: lambda: left ^ right, Eq: lambda: int(left == right), NotEq: lambda: int(left != right),
+                          LessThan: lambda: int(left < right), GreaterThan: lambda: int(left > right),
+                          LessEq: lambda: int(left <= right), GreaterEq: lambda: int(left >= right)}
+        else:
+            operations = {}
+        if type(node) not in operations:
+            raise SimulationError("Unsupported constant expression %s"%(type(node).__name__))
+        return operations[type(node)]()
+
+    def declare(self, scope, name, width, isReg):
+        msb, lsb = (self.constValue(width.msb, scope.params), self.constValue(width.lsb, scope.params)) if width is not None else (0, 0)
+        net = scope.nets.get(name)
+        if net is None:
+            fullName = scope.prefix + name
+            net = scope.nets[name] = Net(fullName, msb, lsb, [self.newVar("%s[%d]"%(fullName, bit)) for bit in range(abs(msb - lsb) + 1)])
+        elif width is not None and (msb, lsb) != (net.msb, net.lsb) and len(net.bits) == 1:
+            # 'output x; reg [3:0] x;' - the later declaration carries the width
+            fullName = scope.prefix + name
+            net.msb, net.lsb = msb, lsb
+            net.bits = [self.newVar("%s[%d]"%(fullName, bit)) for bit in range(abs(msb - lsb) + 1)]
+        net.isReg = net.isReg or isReg
+        return net
+
+    def declareVariable(self, scope, variable, ports):
+        if getattr(variable, "dimensions", None) is not None:
+            raise SimulationError("Memories are not supported (%s in module %s)"%(variable.name, scope.moduleDef.name))
+        if isinstance(variable, Inout):
+            raise SimulationError("Inout ports are not supported (%s in module %s)"%(variable.name, scope.moduleDef.name))
+        self.declare(scope, variable.name, variable.width, isinstance(variable, Reg))
+        if isinstance(variable, (Input, Output)):
+            ports[variable.name] = "input" if isinstance(variable, Input) else "output"
+
+    # Flattens the hierarchy below the top module. Returns the top scope
+    def elaborate(self):
+        if self.topModule not in self.moduleDefs:
+            raise SimulationError("Top module %s not found"%(self.topModule))
+        topScope = None
+        # Work list - (MODULE_DEF, PREFIX, PARAMETER OVERRIDES, PARENT SCOPE, INSTANCE)
+        workList = [(self.moduleDefs[self.topModule], "", {}, None, None)]
+        while workList:
+            moduleDef, prefix, overrides, parentScope, instance = workList.pop()
+            scope = self.elaborateModule(moduleDef, prefix, overrides, workList)
+            if parentScope is None:
+                topScope = scope
+            else:
+                self.connectInstance(parentScope, scope, instance)
+        return topScope
+
+    def elaborateModule(self, moduleDef, prefix, overrides, workList):
+        params = {}
+        scope = Scope(prefix, moduleDef, params)
+        positional = [name for name in overrides if isinstance(name, int)]
+        if moduleDef.paramlist is not None:
+            for index, decl in enumerate(moduleDef.paramlist.params):
+                for param in decl.list:
+                    override = overrides.get(param.name, overrides.get(index))
+                    params[param.name] = override if override is not None else self.constValue(param.value, params)
+        elif positional:
+            raise SimulationError("Module %s has no parameters to override"%(moduleDef.name))
+
+        scope.ports = {}                          # {<PORT>:"input"/"output"}
+        scope.portOrder = []
+        for port in moduleDef.portlist.ports:
+            if isinstance(port, Ioport):
+                self.declareVariable(scope, port.first, scope.ports)
+                if port.second is not None:
+                    self.declare(scope, port.second.name, port.second.width or port.first.width, isinstance(port.second, Reg))
+                scope.portOrder.append(port.first.name)
+            else:
+                scope.portOrder.append(port.name)
+
+        # Declarations first - nets may be used before they are declared in the item list
+        for item in moduleDef.items:
+            if isinstance(item, Decl):
+                for variable in item.list:
+                    if isinstance(variable, (Parameter, Localparam)):
+                        params[variable.name] = overrides.get(variable.name, self.constValue(variable.value, params)) \
+                                                if not isinstance(variable, Localparam) else self.constValue(variable.value, params)
+                    elif isinstance(variable, (Input, Output, Inout, Wire, Reg)):
+                        self.declareVariable(scope, variable, scope.ports)
+                    else:
+                        raise SimulationError("Unsupported declaration %s in module %s"%(type(variable).__name__, moduleDef.name))
+
+        for item in moduleDef.items:
+            if isinstance(item, Decl):
+                continue
+            if isinstance(item, Assign):
+                self.sink = None
+                self.assign(scope, item.left, item.right)
+            elif isinstance(item, Always):
+                self.always(scope, item)
+            elif isinstance(item, InstanceList):
+                for instance in item.instances:
+                    if instance.array is not None:
+                        raise SimulationError("Instance arrays are not supported (%s in module %s)"%(instance.name, moduleDef.name))
+                    if instance.module not in self.moduleDefs:
+                        raise SimulationError("Module %s (instance %s%s) not found"%(instance.module, prefix, instance.name))
+                    childOverrides = {}
+                    for index, paramArg in enumerate(instance.parameterlist or ()):
+                        childOverrides[paramArg.paramname if paramArg.paramname is not None else index] = \
+                            self.constValue(paramArg.argname, params)
+                    # Implicit nets of the connections are declared before the child is elaborated
+                    for portArg in instance.portlist:
+                        self.implicitNets(scope, portArg.argname)
+                    workList.append((self.moduleDefs[instance.module], prefix + instance.name + ".", childOverrides, scope, instance))
+            else:
+                raise SimulationError("Unsupported module item %s in module %s"%(type(item).__name__, moduleDef.name))
+        return scope
+
+    # Identifiers used in port connections without a declaration are 1 bit wires
+    def implicitNets(self, scope, node):
+        if node is None:
+            return
+        if isinstance(node, Identifier):
+            if node.name not in scope.nets and node.name not in scope.params:
+                self.declare(scope, node.name, None, False)
+            return
+        for child in node.children():
+            self.implicitNets(scope, child)
+
+    def connectInstance(self, parentScope, scope, instance):
+        for index, portArg in enumerate(instance.portlist):
+            portName = portArg.portname if portArg.portname is not None else scope.portOrder[index]
+            if portName not in scope.ports:
+                raise SimulationError("Module %s has no port '%s' (instance %s)"%(scope.moduleDef.name, portName, scope.prefix[:-1]))
+            if portArg.argname is None:
+                continue
+            port = scope.net(portName)
+            self.sink = None
+            if scope.ports[portName] == "input":
+                self.drive(port.bits, self.expression(parentScope, portArg.argname, len(port.bits)))
+                if isinstance(portArg.argname, Identifier):
+                    self.netAlias[port.name] = parentScope.net(portArg.argname.name).name
+            else:
+                targets = self.lvalue(parentScope, portArg.argname)
+                self.drive(targets, self.extend(port.bits, len(targets)))
+
+    # ---------------------------------------- Bit sliced expressions -----------------------------------------
+    # An expression is a list of atoms (LSB first) - "0" (all vectors 0), "M" (all vectors 1), a variable
+    # or a compound Python expression over atoms
+
+    @staticmethod
+    def isSimple(atom):
+        return atom in ("0", "M") or VARIABLE_PATTERN.fullmatch(atom) is not None
+
+    # Emits a temporary for a compound atom that is used more than once
+    def materialize(self, atom):
+        if self.isSimple(atom):
+            return atom
+        var = self.newVar("<temp>")
+        self.emit(var, atom)
+        return var
+
+    def emit(self, var, expression):
+        if self.sink is None:
+            self.combStatements[var] = expression
+        else:
+            self.sink.append((var, expression))
+
+    def bounded(self, atom):
+        return atom if len(atom) <= MAX_EXPRESSION else self.materialize(atom)
+
+    @staticmethod
+    def bNot(a):
+        return "M" if a == "0" else "0" if a == "M" else "(%s ^ M)"%(a)
+
+    def bAnd(self, a, b):
+        if a == "0" or b == "0":
+            return "0"
+        if a == "M":
+            return b
+        if b == "M":
+            return a
+        return self.bounded("(%s & %s)"%(a, b))
+
+    def bOr(self, a, b):
+        if a == "M" or b == "M":
+            return "M"
+        if a == "0":
+            return b
+        if b == "0":
+            return a
+        return self.bounded("(%s | %s)"%(a, b))
+
+    def bXor(self, a, b):
+        if a == "0":
+            return b
+        if b == "0":
+            return a
+        if a == "M":
+            return self.bNot(b)
+        if b == "M":
+            return self.bNot(a)
+        return self.bounded("(%s ^ %s)"%(a, b))
+
+    def bMux(self, select, a, b):
+        if select == "M" or a == b:
+            return a
+        if select == "0":
+            return b
+        return self.bOr(self.bAnd(select, a), self.bAnd(self.bNot(select), b))
+
+    @staticmethod
+    def extend(bits, width):
+        return list(bits[:width]) + ["0"] * (width - len(bits))
+
+    def reduceOr(self, bits):
+        result = "0"
+        for bit in bits:
+            result = self.bOr(result, bit)
+        return self.materialize(result)
+
+    def reduceAnd(self, bits):
+        result = "M"
+        for bit in bits:
+            result = self.bAnd(result, bit)
+        return self.materialize(result)
+
+    def reduceXor(self, bits):
+        result = "0"
+        for bit in bits:
+            result = self.bXor(result, bit)
+        return self.materialize(result)
+
+    # Returns (SUM, CARRY OUT) of a + b + carry
+    def add(self, a, b, carry):
+        bits = []
+        for left, right in zip(a, b):
+            left, right = self.materialize(left), self.materialize(right)
+            half = self.materialize(self.bXor(left, right))
+            bits.append(self.bXor(half, carry))
+            carry = self.materialize(self.bOr(self.bAnd(left, right), self.bAnd(carry, half)))
+        return bits, carry
+
+    # a < b (1 bit)
+    def lessThan(self, a, b):
+        lower = "0"
+        for left, right in zip(a, b):
+            left, right = self.materialize(left), self.materialize(right)
+            lower = self.materialize(self.bOr(self.bAnd(self.bNot(left), right), self.bAnd(self.bNot(self.bXor(left, right)), lower)))
+        return lower
+
+    def equal(self, a, b):
+        return self.reduceAnd([self.bNot(self.bXor(left, right)) for left, right in zip(a, b)])
+
+    # Shift by a variable amount - log2 stages of muxes
+    def barrelShift(self, bits, amount, left):
+        width = len(bits)
+        bits = [self.materialize(bit) for bit in bits]
+        for stage, select in enumerate(amount):
+            distance = 1 << stage
+            if distance >= width:
+                # Shifting out all bits
+                overflow = self.materialize(select)
+                bits = [self.materialize(self.bAnd(self.bNot(overflow), bit)) for bit in bits]
+                continue
+            select = self.materialize(select)
+            shifted = (["0"] * distance + bits[:width - distance]) if left else (bits[distance:] + ["0"] * distance)
+            bits = [self.materialize(self.bMux(select, after, before)) for after, before in zip(shifted, bits)]
+        return bits
+
+    # Self determined width of an expression
+    def selfWidth(self, scope, node):
+        if isinstance(node, (Rvalue, Lvalue)):
+            return self.selfWidth(scope, node.var)
+        if isinstance(node, IntConst):
+            return parseConstant(node.value)[0]
+        if isinstance(node, Identifier):
+            return len(scope.net(node.name).bits) if node.name in scope.nets else 32
+        if isinstance(node, Partselect):
+            return abs(self.constValue(node.msb, scope.params) - self.constValue(node.lsb, scope.params)) + 1
+        if isinstance(node, Pointer):
+            return 1
+        if isinstance(node, Concat):
+            return sum(self.selfWidth(scope, item) for item in node.list)
+        if isinstance(node, Repeat):
+            return self.constValue(node.times, scope.params) * self.selfWidth(scope, node.value)
+        if isinstance(node, Cond):
+            return max(self.selfWidth(scope, node.true_value), self.selfWidth(scope, node.false_value))
+        if isinstance(node, (Unot, Uminus, Uplus)):
+            return self.selfWidth(scope, node.right)
+        if isinstance(node, UnaryOperator):
+            return 1
+        if isinstance(node, (Eq, NotEq, Eql, NotEql, LessThan, GreaterThan, LessEq, GreaterEq, Land, Lor)):
+            return 1
+        if isinstance(node, (Sll, Srl, Sla, Sra, Power)):
+            return self.selfWidth(scope, node.left)
+        if isinstance(node, Operator):
+            return max(self.selfWidth(scope, node.left), self.selfWidth(scope, node.right))
+        raise SimulationError("Unsupported expression %s"%(type(node).__name__))
+
+    def netBits(self, scope, name):
+        if name in scope.params and name not in scope.nets:
+            value = scope.params[name]
+            return ["M" if (value >> bit) & 1 else "0" for bit in range(max(32, value.bit_length()))]
+        bits = scope.net(name).bits
+        if self.reads:
+            return [self.reads.get(bit, bit) for bit in bits]
+        return bits
+
+    # Compiles an expression in a context of <width> bits. Returns <width> atoms
+    def expression(self, scope, node, width):
+        if isinstance(node, (Rvalue, Lvalue)):
+            return self.expression(scope, node.var, width)
+        if isinstance(node, IntConst):
+            _, value = parseConstant(node.value)
+            return ["M" if (value >> bit) & 1 else "0" for bit in range(width)]
+        if isinstance(node, Identifier):
+            return self.extend(self.netBits(scope, node.name), width)
+        if isinstance(node, Partselect):
+            net = scope.net(node.var.name) if isinstance(node.var, Identifier) else None
+            if net is None:
+                raise SimulationError("Unsupported part select of %s"%(type(node.var).__name__))
+            msb, lsb = self.constValue(node.msb, scope.params), self.constValue(node.lsb, scope.params)
+            bits = self.netBits(scope, node.var.name)
+            first, last = net.position(lsb), net.position(msb)
+            step = 1 if last >= first else -1
+            return self.extend([bits[position] for position in range(first, last + step, step)], width)
+        if isinstance(node, Pointer):
+            if not isinstance(node.var, Identifier):
+                raise SimulationError("Unsupported bit select of %s"%(type(node.var).__name__))
+            net = scope.net(node.var.name)
+            bits = self.netBits(scope, node.var.name)
+            try:
+                index = self.constValue(node.ptr, scope.params)
+            except SimulationError:
+                index = None
+            if index is not None:
+                return self.extend([bits[net.position(index)]], width)
+            # Variable index - shift the net right by (index - lsb) and take bit 0
+            if net.msb < net.lsb:
+                raise SimulationError("Variable bit select of ascending range %s"%(net.name))
+            index = self.expression(scope, node.ptr, self.selfWidth(scope, node.ptr))
+            if net.lsb:
+                index, _ = self.add(index, self.constBits(-net.lsb, len(index)), "0")
+            return self.extend(self.barrelShift(bits, index, left = False)[:1], width)
+        if isinstance(node, Concat):
+            bits = []
+            for item in reversed(node.list):
+                bits.extend(self.expression(scope, item, self.selfWidth(scope, item)))
+            return self.extend(bits, width)
+        if isinstance(node, Repeat):
+            bits = self.expression(scope, node.value, self.selfWidth(scope, node.value)) * self.constValue(node.times, scope.params)
+            return self.extend(bits, width)
+        if isinstance(node, Cond):
+            select = self.reduceOr(self.expression(scope, node.cond, self.selfWidth(scope, node.cond)))
+            trueBits  = self.expression(scope, node.true_value, width)
+            falseBits = self.expression(scope, node.false_value, width)
+            return [self.bMux(select, a, b) for a, b in zip(trueBits, falseBits)]
+        if isinstance(node, UnaryOperator):
+            return self.unary(scope, node, width)
+        if isinstance(node, Operator):
+            return self.binary(scope, node, width)
+        raise SimulationError("Unsupported expression %s"%(type(node).__name__))
+
+    def constBits(self, value, width):
+        return ["M" if (value >> bit) & 1 else "0" for bit in range(width)]
+
+    def unary(self, scope, node, width):
+        if isinstance(node, Unot):
+            return [self.bNot(bit) for bit in self.expression(scope, node.right, width)]
+        if isinstance(node, Uplus):
+            return self.expression(scope, node.right, width)
+        if isinstance(node, Uminus):
+            bits, _ = self.add([self.bNot(bit) for bit in self.expression(scope, node.right, width)], self.constBits(1, width), "0")
+            return bits
+        operand = self.expression(scope, node.right, self.selfWidth(scope, node.right))
+        if isinstance(node, Uor):
+            bit = self.reduceOr(operand)
+        elif isinstance(node, Unor):
+            bit = self.bNot(self.reduceOr(operand))
+        elif isinstance(node, Ulnot):
+            bit = self.bNot(self.reduceOr(operand))
+        elif isinstance(node, Uand):
+            bit = self.reduceAnd(operand)
+        elif isinstance(node, Unand):
+            bit = self.bNot(self.reduceAnd(operand))
+        elif isinstance(node, Uxor):
+            bit = self.reduceXor(operand)
+        elif isinstance(node, Uxnor):
+            bit = self.bNot(self.reduceXor(operand))
+        else:
+            raise SimulationError("Unsupported operator %s"%(type(node).__name__))
+        return self.extend([bit], width)
+
+    def binary(self, scope, node, width):
+        if isinstance(node, (And, Or, Xor, Xnor)):
+            combine = {And: self.bAnd, Or: self.bOr, Xor: self.bXor, Xnor: lambda a, b: self.bNot(self.bXor(a, b))}[type(node)]
+            left, right = self.expression(scope, node.left, width), self.expression(scope, node.right, width)
+            return [combine(a, b) for a, b in zip(left, right)]
+        if isinstance(node, (Plus, Minus)):
+            left, right = self.expression(scope, node.left, width), self.expression(scope, node.right, width)
+            if isinstance(node, Minus):
+                bits, _ = self.add(left, [self.bNot(bit) for bit in right], "M")
+            else:
+                bits, _ = self.add(left, right, "0")
+            return bits
+        if isinstance(node, (Sll, Srl, Sla, Sra)):
+            bits = self.expression(scope, node.left, width)
+            left = isinstance(node, (Sll, Sla))
+            try:
+                distance = self.constValue(node.right, scope.params)
+            except SimulationError:
+                amount = self.expression(scope, node.right, self.selfWidth(scope, node.right))
+                return self.barrelShift(bits, amount, left)
+            if left:
+                return self.extend(["0"] * distance + bits, width)
+            return self.extend(bits[distance:], width)
+        if isinstance(node, (Land, Lor)):
+            left  = self.reduceOr(self.expression(scope, node.left, self.selfWidth(scope, node.left)))
+            right = self.reduceOr(self.expression(scope, node.right, self.selfWidth(scope, node.right)))
+            return self.extend([self.materialize(self.bAnd(left, right) if isinstance(node, Land) else self.bOr(left, right))], width)
+        if isinstance(node, (Eq, NotEq, Eql, NotEql, LessThan, GreaterThan, LessEq, GreaterEq)):
+            operandWidth = max(self.selfWidth(scope, node.left), self.selfWidth(scope, node.right))
+            left, right = self.expression(scope, node.left, operandWidth), self.expression(scope, node.right, operandWidth)
+            if isinstance(node, (Eq, Eql)):
+                bit = self.equal(left, right)
+            elif isinstance(node, (NotEq, NotEql)):
+                bit = self.bNot(self.equal(left, right))
+            elif isinstance(node, LessThan):
+                bit = self.lessThan(left, right)
+            elif isinstance(node, GreaterThan):
+                bit = self.lessThan(right, left)
+            elif isinstance(node, LessEq):
+                bit = self.bNot(self.lessThan(right, left))
+            else:
+                bit = self.bNot(self.lessThan(left, right))
+            return self.extend([bit], width)
+        # Constant operands only (e.g. parameter arithmetic)
+        try:
+            return self.constBits(self.constValue(node, scope.params), width)
+        except SimulationError:
+            raise SimulationError("Unsupported operator %s on non-constant operands"%(type(node).__name__))
+
+    # Returns the list of target bit variables of an lvalue (LSB first)
+    def lvalue(self, scope, node):
+        if isinstance(node, Lvalue):
+            return self.lvalue(scope, node.var)
+        if isinstance(node, Identifier):
+            return list(scope.net(node.name).bits)
+        if isinstance(node, Partselect):
+            net = scope.net(node.var.name)
+            first = net.position(self.constValue(node.lsb, scope.params))
+            last  = net.position(self.constValue(node.msb, scope.params))
+            step = 1 if last >= first else -1
+            return [net.bits[position] for position in range(first, last + step, step)]
+        if isinstance(node, Pointer):
+            net = scope.net(node.var.name)
+            return [net.bits[net.position(self.constValue(node.ptr, scope.params))]]
+        if isinstance(node, Concat):
+            targets = []
+            for item in reversed(node.list):
+                targets.extend(self.lvalue(scope, item))
+            return targets
+        raise SimulationError("Unsupported assignment target %s"%(type(node).__name__))
+
+    # Continuous drive of net bits
+    def drive(self, targets, atoms):
+        for target, atom in zip(targets, atoms):
+            if target in self.combStatements or target in self.nextState:
+                raise SimulationError("%s has multiple drivers"%(self.varNames[int(target[1:])]))
+            self.combStatements[target] = atom
+
+    def assign(self, scope, left, right):
+        targets = self.lvalue(scope, left)
+        width = max(len(targets), self.selfWidth(scope, right))
+        self.drive(targets, self.expression(scope, right, width))
+
+    # ---------------------------------------------- always blocks -------------------------------------------
+
+    def always(self, scope, item):
+        senses = item.sens_list.list
+        if not senses or any(sens.type != "posedge" for sens in senses) or len(senses) > 1:
+            raise SimulationError("Only always @(posedge <clk>) blocks are supported (module %s)"%(scope.moduleDef.name))
+        if isinstance(senses[0].sig, Identifier):
+            self.clockNets.add(scope.net(senses[0].sig.name).name)
+        self.sink  = self.seqStatements
+        self.reads = {}
+        nextState = {}
+        self.statement(scope, item.statement, self.reads, nextState)
+        # Regs written with blocking assignments keep their final value
+        for reg, atom in self.reads.items():
+            nextState.setdefault(reg, atom)
+        for reg, atom in nextState.items():
+            if reg in self.combStatements or reg in self.nextState:
+                raise SimulationError("%s has multiple drivers"%(self.varNames[int(reg[1:])]))
+            nextVar = self.newVar(self.varNames[int(reg[1:])] + "'")
+            self.sink.append((nextVar, atom))
+            self.nextState[reg] = nextVar
+        self.sink  = None
+        self.reads = None
+
+    # Symbolic execution - <reads> holds blocking assignment values, <nextState> non-blocking updates
+    def statement(self, scope, node, reads, nextState):
+        if node is None:
+            return
+        self.reads = reads
+        if isinstance(node, Block):
+            for statement in node.statements:
+                self.statement(scope, statement, reads, nextState)
+        elif isinstance(node, (NonblockingSubstitution, BlockingSubstitution)):
+            targets = self.lvalue(scope, node.left)
+            width = max(len(targets), self.selfWidth(scope, node.right))
+            atoms = [self.materialize(atom) for atom in self.expression(scope, node.right, width)[:len(targets)]]
+            updates = nextState if isinstance(node, NonblockingSubstitution) else reads
+            for target, atom in zip(targets, atoms):
+                updates[target] = atom
+        elif isinstance(node, IfStatement):
+            select = self.reduceOr(self.expression(scope, node.cond, self.selfWidth(scope, node.cond)))
+            self.branch(scope, select, node.true_statement, node.false_statement, reads, nextState)
+        elif isinstance(node, CaseStatement):
+            self.case(scope, node, list(node.caselist), reads, nextState)
+        else:
+            raise SimulationError("Unsupported statement %s in always block (module %s)"%(type(node).__name__, scope.moduleDef.name))
+        self.reads = reads
+
+    # Executes both branches and merges their updates with a mux on <select>
+    def branch(self, scope, select, trueStatement, falseStatement, reads, nextState, falseCallback = None):
+        trueReads, trueNext = dict(reads), dict(nextState)
+        self.statement(scope, trueStatement, trueReads, trueNext)
+        falseReads, falseNext = dict(reads), dict(nextState)
+        if falseCallback is not None:
+            falseCallback(falseReads, falseNext)
+        else:
+            self.statement(scope, falseStatement, falseReads, falseNext)
+        for merged, trueUpdates, falseUpdates, default in ((reads, trueReads, falseReads, lambda var: reads.get(var, var)),
+                                                           (nextState, trueNext, falseNext, lambda var: nextState.get(var, var))):
+            for var in set(trueUpdates) | set(falseUpdates):
+                trueAtom, falseAtom = trueUpdates.get(var, default(var)), falseUpdates.get(var, default(var))
+                merged[var] = trueAtom if trueAtom == falseAtom else self.materialize(self.bMux(select, trueAtom, falseAtom))
+        self.reads = reads
+
+    def case(self, scope, node, caseList, reads, nextState):
+        self.reads = reads
+        if not caseList:
+            return
+        item, rest = caseList[0], caseList[1:]
+        if item.cond is None:
+            self.statement(scope, item.statement, reads, nextState)
+            return
+        width = max([self.selfWidth(scope, node.comp)] + [self.selfWidth(scope, cond) for cond in item.cond])
+        comp = self.expression(scope, node.comp, width)
+        select = self.reduceOr([self.equal(comp, self.expression(scope, cond, width)) for cond in item.cond])
+        self.branch(scope, select, item.statement, None, reads, nextState,
+                    falseCallback = lambda falseReads, falseNext: self.case(scope, node, rest, falseReads, falseNext))
+
+    # ------------------------------------------------ Codegen ----------------------------------------------
+
+    # Orders the continuous statements so that every bit is computed after the bits it reads
+    def levelize(self):
+        statements = self.combStatements
+        dependents = {var: [] for var in statements}
+        pending = {}
+        for var, expression in statements.items():
+            deps = {dep for dep in VARIABLE_PATTERN.findall(expression) if dep in statements}
+            pending[var] = len(deps)
+            for dep in deps:
+                dependents[dep].append(var)
+        ready = [var for var, count in pending.items() if count == 0]
+        order = []
+        while ready:
+            var = ready.pop()
+            order.append(var)
+            for dependent in dependents[var]:
+                pending[dependent] -= 1
+                if pending[dependent] == 0:
+                    ready.append(dependent)
+        if len(order) != len(statements):
+            loop = sorted(self.varNames[int(var[1:])] for var, count in pending.items() if count and self.varNames[int(var[1:])] != "<temp>")
+            raise SimulationError("Combinational loop through %s"%(", ".join(loop[:8]) + (" ..." if len(loop) > 8 else "")))
+        return order
+
+    # Returns the source of the cycle function
+    def generate(self, inputBits, stateBits, outputBits):
+        lines = ["def cycle(M, state, inputs):"]
+        if inputBits:
+            lines.append("    %s, = inputs"%(", ".join(inputBits)))
+        if stateBits:
+            lines.append("    %s, = state"%(", ".join(stateBits)))
+        defined = set(inputBits) | set(stateBits) | set(self.combStatements) | {var for var, _ in self.seqStatements}
+        body = [(var, self.combStatements[var]) for var in self.levelize()] + self.seqStatements
+        undriven = sorted({dep for _, expression in body for dep in VARIABLE_PATTERN.findall(expression)} - defined | \
+                          (set(outputBits) - defined), key = lambda var: int(var[1:]))
+        if undriven:
+            logging.warning("Simulator: %d undriven net bit(s) are simulated as 0 (e.g. %s)"%(len(undriven), \
+                            ", ".join(self.varNames[int(var[1:])] for var in undriven[:4])))
+            lines.append("    %s = 0"%(" = ".join(undriven)))
+        lines.extend("    %s = %s"%(var, expression) for var, expression in body)
+        lines.append("    return (%s), (%s)"%("".join(self.nextState[var] + ", " for var in stateBits), "".join(var + ", " for var in outputBits)))
+        return "\n".join(lines) + "\n"
+
+
+# Compiled, bit-parallel simulation model of a design
+#   inputs/outputs - [(<PORT>, <WIDTH>)] of the top module (clock inputs and tied inputs excluded)
+class CompiledSimulator:
+    # -- ties : {<TOP INPUT>:<TOP OUTPUT>} inputs driven by outputs (e.g. control_port_out <- control_port_in)
+    def __init__(self, files, topModule, ties = None) -> None:
+        self.files     = files
+        self.topModule = topModule
+        moduleDefs = {}
+        with profiler.stage("simParse"):
+            for file in files:
+                for definition in VerilogParser.parseFile(file).description.definitions:
+                    if isinstance(definition, ModuleDef):
+                        moduleDefs.setdefault(definition.name, definition)
+        self.compile(moduleDefs, ties)
+
+    def compile(self, moduleDefs, ties):
+        startTime = time.perf_counter()
+        with profiler.stage("simCompile"):
+            compiler = SimulatorCompiler(moduleDefs, self.topModule, ties)
+            topScope = compiler.elaborate()
+            clocks = set()
+            for clockNet in compiler.clockNets:
+                while clockNet in compiler.netAlias:
+                    clockNet = compiler.netAlias[clockNet]
+                clocks.add(clockNet)
+            ties = ties if ties is not None else {}
+            self.inputs, self.outputs = [], []
+            inputBits, outputBits = [], []
+            for name in topScope.portOrder:
+                net = topScope.net(name)
+                if topScope.ports[name] == "output":
+                    self.outputs.append((name, len(net.bits)))
+                    outputBits.extend(net.bits)
+                elif name in ties:
+                    compiler.sink = None
+                    compiler.drive(net.bits, compiler.extend(topScope.net(ties[name]).bits, len(net.bits)))
+                elif net.name not in clocks:
+                    self.inputs.append((name, len(net.bits)))
+                    inputBits.extend(net.bits)
+            self.clocks = sorted(clocks)
+            stateBits = list(compiler.nextState)
+            self.stateWidth = len(stateBits)
+            self.source = compiler.generate(inputBits, stateBits, outputBits)
+            namespace = {}
+            exec(compile(self.source, "<%s cycle>"%(self.topModule), "exec"), namespace)
+            self.cycleFunction = namespace["cycle"]
+        logging.info("Simulator: compiled %s - %d net bit(s), %d state bit(s), %d statement(s) in %.3f s"%(self.topModule, \
+                     len(compiler.varNames), self.stateWidth, len(compiler.combStatements) + len(compiler.seqStatements), \
+                     time.perf_counter() - startTime))
+
+    def reset(self):
+        return (0,) * self.stateWidth
+
+    # One clock cycle over <vectors> packed stimulus vectors
+    #   inputBits - Flat tuple of input bit slices (self.inputs order, LSB first)
+    # Returns (NEXT STATE, OUTPUT BIT SLICES)
+    def cycle(self, mask, state, inputBits):
+        return self.cycleFunction(mask, state, inputBits)
+
+
+# Value of one vector (lane) of a bit sliced port
+def laneValue(bits, lane):
+    return sum(((bit >> lane) & 1) << position for position, bit in enumerate(bits))
+
+
+# Random stimulus equivalence of two designs over the inputs of <reference>
+class EquivalenceChecker:
+    def __init__(self, reference, candidate) -> None:
+        self.reference = reference
+        self.candidate = candidate
+        candidateInputs  = dict(candidate.inputs)
+        candidateOutputs = dict(candidate.outputs)
+        for name, width in reference.inputs:
+            if candidateInputs.get(name) != width:
+                raise SimulationError("Input %s[%d] of the reference design is missing from the candidate"%(name, width))
+        self.outputs = [(name, width) for name, width in reference.outputs if name in candidateOutputs]
+        for name, width in self.outputs:
+            if candidateOutputs[name] != width:
+                raise SimulationError("Output %s has width %d in the reference and %d in the candidate"%(name, width, candidateOutputs[name]))
+        missing = [name for name, _ in reference.outputs if name not in candidateOutputs]
+        if missing:
+            raise SimulationError("Outputs %s of the reference design are missing from the candidate"%(", ".join(missing)))
+        self.extraInputs = [(name, width) for name, width in candidate.inputs if name not in dict(reference.inputs)]
+
+    # Simulates <cycles> cycles of <vectors> random stimulus vectors from reset (extra candidate inputs are held 0)
+    # Returns (MISMATCHING VECTOR COUNT, [(CYCLE, OUTPUT, VECTOR, EXPECTED, ACTUAL)] for the first <maxReports> mismatches)
+    def run(self, vectors = 1024, cycles = 100, seed = 0, maxReports = 10):
+        rng = random.Random(seed)
+        mask = (1 << vectors) - 1
+        referenceState, candidateState = self.reference.reset(), self.candidate.reset()
+        referenceWidth = sum(width for _, width in self.reference.inputs)
+        candidateSlots = []
+        referenceNames = [name for name, _ in self.reference.inputs]
+        for name, width in self.candidate.inputs:
+            candidateSlots.append(("reference", referenceNames.index(name), width) if name in referenceNames else ("zero", 0, width))
+        referenceOffsets = []
+        offset = 0
+        for _, width in self.reference.inputs:
+            referenceOffsets.append(offset)
+            offset += width
+
+        outputSlices = []
+        for outputs in (self.reference.outputs, self.candidate.outputs):
+            slices, offset = {}, 0
+            for name, width in outputs:
+                slices[name] = (offset, offset + width)
+                offset += width
+            outputSlices.append(slices)
+
+        mismatched = 0
+        reports = []
+        with profiler.stage("simulate"):
+            for cycle in range(cycles):
+                referenceInputs = tuple(rng.getrandbits(vectors) for _ in range(referenceWidth))
+                candidateInputs = []
+                for source, index, width in candidateSlots:
+                    if source == "reference":
+                        candidateInputs.extend(referenceInputs[referenceOffsets[index]:referenceOffsets[index] + width])
+                    else:
+                        candidateInputs.extend((0,) * width)
+                referenceState, referenceOutputs = self.reference.cycle(mask, referenceState, referenceInputs)
+                candidateState, candidateOutputs = self.candidate.cycle(mask, candidateState, tuple(candidateInputs))
+                difference = 0
+                for name, _ in self.outputs:
+                    expected = referenceOutputs[slice(*outputSlices[0][name])]
+                    actual   = candidateOutputs[slice(*outputSlices[1][name])]
+                    outputDifference = 0
+                    for expectedBit, actualBit in zip(expected, actual):
+                        outputDifference |= expectedBit ^ actualBit
+                    outputDifference &= mask
+                    while outputDifference and len(reports) < maxReports:
+                        lane = (outputDifference & -outputDifference).bit_length() - 1
+                        reports.append((cycle, name, lane, laneValue(expected, lane), laneValue(actual, lane)))
+                        outputDifference &= outputDifference - 1
+                    difference |= outputDifference
+                mismatched |= difference
+        return bin(mismatched).count("1"), reports
+
+
+if __name__ == '__main__':
+    argParser = argparse.ArgumentParser(description = "Random stimulus equivalence of an original and a patched design")
+    argParser.add_argument("--filelist", default = "filelist.f", help = "Original design filelist")
+    argParser.add_argument("--patched", nargs = "*", help = "Patched design files (default - <file>_patch.v for the filelist)")
+    argParser.add_argument("--top", default = "Sample")
+    argParser.add_argument("--vectors", type = int, default = 1024, help = "# of stimulus vectors simulated in parallel")
+    argParser.add_argument("--cycles", type = int, default = 100)
+    argParser.add_argument("--seed", type = int, default = 0)
+    argParser.add_argument("--loopback", metavar = "OUTPUT:INPUT", default = "control_port_in:control_port_out",
+                           help = "Patched top output fed back to an input (FRU disabled)")
+    argParser.add_argument("--max-reports", type = int, default = 10)
+    args = argParser.parse_args()
+
+    with open(args.filelist, "r") as f:
+        files = [line.strip() for line in f if line.strip()]
+    patchedFiles = args.patched if args.patched else [file[:-2] + "_patch.v" if file.endswith(".v") else file + "_patch" for file in files]
+    loopbackOutput, _, loopbackInput = args.loopback.partition(":")
+    try:
+        reference = CompiledSimulator(files, args.top)
+        candidate = CompiledSimulator(patchedFiles, args.top, ties = {loopbackInput: loopbackOutput} if loopbackInput else None)
+        checker = EquivalenceChecker(reference, candidate)
+    except SimulationError as e:
+        logging.error("Simulator: %s"%(e))
+        exit(1)
+    startTime = time.perf_counter()
+    mismatched, reports = checker.run(args.vectors, args.cycles, args.seed, args.max_reports)
+    elapsed = time.perf_counter() - startTime
+    logging.info("Simulator: %d vector(s) x %d cycle(s) in %.3f s (%.0f vector-cycles/s)"%(args.vectors, args.cycles, elapsed, \
+                 args.vectors * args.cycles / max(elapsed, 1e-9)))
+    for cycle, output, lane, expected, actual in reports:
+        logging.error("Mismatch - cycle %d, vector %d: %s = %#x (original) vs %#x (patched)"%(cycle, lane, output, expected, actual))
+    if mismatched:
+        logging.error("Simulator: %d of %d vector(s) mismatch"%(mismatched, args.vectors))
+        exit(1)
+    logging.info("Simulator: original and patched designs are equivalent on all %d vector(s)"%(args.vectors))
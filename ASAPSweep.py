@@ -0,0 +1,269 @@
+import argparse
+import itertools
+import json
+import logging                                                       # logger
+import os
+from concurrent.futures import ProcessPoolExecutor                   # Worker pool for parameter points
+from SignalIndex import SignalResolutionError                        # Hierarchical signal path index errors
+from DesignDatabase import DesignDatabase                            # Serialized design database (insertion -> compiler)
+from ASAPBitstream import SmuConfigLayout, SmuImageCompiler, BitstreamError, clog2   # SMU configuration image
+from ASAPCompiler import ASAPSmuParser, SmuParseError, SequenceTimingError   # ASAP-SMU patch compiler
+from ASAPLog import addLoggingArguments, configureLogging            # Structured/asynchronous logging
+
+
+# ************************************** <ASAP DESIGN SPACE EXPLORATION> *************************************
+# Sweeps the SMU/FRU hardware parameters over a corpus of representative patches for an instrumented design
+# (design database) -
+#   SMU : N, K, M, SMU_SEGMENT_SIZE  --> A patch fits if it compiles to an SMU image (SmuImageCompiler) -
+#                                        at most M triggers, N patterns per sequence, signals below K and
+#                                        patterns within one segment
+#   FRU : F, S, C, FRU_SEGMENT_SIZE  --> The control port of the design fits if it is at most
+#                                        CONTROL_WIDTH = 2F + C + S bits (the design database has no control
+#                                        types, so the FSM/clock/signal split isn't checked)
+# Fit rate of a point = # of patches that fit / # of valid patches (0 if the control port doesn't fit).
+# Patches are parsed, resolved, scheduled and deduplicated once per worker. Only the image compilation runs
+# per point, and only per unique SMU point (FRU parameters don't change the SMU fit).
+#
+# Analytical area model (per parameter point, from smu.sv/fru.sv) -
+#   SMU config bits  = N * M * CFG_SMU_UNIT_SIZE
+#                      CFG_SMU_UNIT_SIZE = clog2(#SEGMENTS) + 2*SMU_SEGMENT_SIZE + 2 + clog2(N)
+#   Comparator bits  = M * SMU_SEGMENT_SIZE (one SMU_SEGMENT_SIZE bit comparator per smu_unit)
+#   FRU config bits  = CFG_WIDTH = 2F + S + CONTROL_WIDTH*clog2(M) + CONTROL_WIDTH*2**FRU_SEGMENT_SIZE
+#   PLA minterms     = CONTROL_WIDTH * 2**FRU_SEGMENT_SIZE
+#   Area             = Weighted sum of the above (AREA_WEIGHTS, --weight)
+# A point is Pareto optimal if no other point has a higher or equal fit rate with a lower or equal area
+# (and is better in one of them).
+# *************************************************************************************************************
+
+# Default sweep
+SWEEP_DEFAULTS = {"N"              : [2, 4, 8],          \
+                  "K"              : [],                 \
+                  "M"              : [2, 4, 6, 8],       \
+                  "segmentSize"    : [8, 16, 32, 64],    \
+                  "F"              : [12],               \
+                  "S"              : [20],               \
+                  "C"              : [5],                \
+                  "fruSegmentSize" : [2, 3]}
+
+SMU_PARAMS = ("N", "K", "M", "segmentSize")
+FRU_PARAMS = ("F", "S", "C", "fruSegmentSize")
+
+# Relative cost of a bit/minterm in the area estimate
+AREA_WEIGHTS = {"smuConfigBits": 1.0, "comparatorBits": 1.0, "fruConfigBits": 1.0, "plaMinterms": 1.0}
+
+
+# Analytical area of a parameter point - {<COMPONENT>:<COUNT>}
+def areaModel(point, weights = AREA_WEIGHTS):
+    smuLayout    = SmuConfigLayout(point["N"], point["K"], point["M"], point["segmentSize"])
+    controlWidth = 2 * point["F"] + point["C"] + point["S"]
+    plaMinterms  = controlWidth * (2 ** point["fruSegmentSize"])
+    area = {"smuConfigBits" : smuLayout.size,                                                              \
+            "comparatorBits": point["M"] * point["segmentSize"],                                           \
+            "fruConfigBits" : 2 * point["F"] + point["S"] + controlWidth * clog2(point["M"]) + plaMinterms, \
+            "plaMinterms"   : plaMinterms}
+    area["area"] = sum(weights[component] * area[component] for component in weights)
+    return area
+
+
+# Parses a patch and runs the parameter independent compiler passes. Returns (<PARSER>, <ERRORS>)
+def preparePatch(smuFile, signalIndex):
+    try:
+        smuParser = ASAPSmuParser(smuFile)
+        smuParser.resolveSignals(signalIndex)
+        smuParser.scheduleSequences()
+        smuParser.deduplicateSequences()
+        return smuParser, []
+    except SmuParseError as e:
+        return None, [str(diagnostic) for diagnostic in e.diagnostics]
+    except (SignalResolutionError, SequenceTimingError) as e:
+        return None, ["%s: %s"%(smuFile, e)]
+
+
+# Prepared corpus of a worker process - [<PARSER>] of the valid patches
+workerCorpus = None
+
+
+def initWorker(dbFile, smuFiles):
+    global workerCorpus
+    logging.disable(logging.WARNING)
+    with DesignDatabase(dbFile) as designDatabase:
+        signalIndex = designDatabase.signalIndex('observe')
+    workerCorpus = [smuParser for smuParser, _ in (preparePatch(smuFile, signalIndex) for smuFile in smuFiles)]
+
+
+# Returns the SMU fit of every patch of the corpus for an SMU point - [True/False/None (invalid patch)]
+def smuFits(corpus, smuPoint):
+    layout = SmuConfigLayout(*smuPoint)
+    fits = []
+    for smuParser in corpus:
+        if smuParser is None:
+            fits.append(None)
+            continue
+        try:
+            SmuImageCompiler(layout).compile(smuParser.sequenceList)
+            fits.append(True)
+        except BitstreamError:
+            fits.append(False)
+    return fits
+
+
+def workerSmuFits(smuPoint):
+    return smuFits(workerCorpus, smuPoint)
+
+
+class DesignSpaceSweep:
+    def __init__(self, dbFile, smuFiles, sweep = None, workers = 1, weights = None) -> None:
+        self.dbFile   = dbFile
+        self.smuFiles = list(smuFiles)
+        self.sweep    = dict(SWEEP_DEFAULTS)
+        self.sweep.update(sweep or {})
+        self.workers  = workers
+        self.weights  = dict(AREA_WEIGHTS)
+        self.weights.update(weights or {})
+        with DesignDatabase(dbFile) as designDatabase:
+            self.observeWidth = designDatabase.signalIndex('observe').width
+            self.controlWidth = designDatabase.signalIndex('control').width
+        if not self.sweep["K"]:
+            self.sweep["K"] = [self.observeWidth]
+
+    # All parameter points of the sweep - [{<PARAM>:<VALUE>}]
+    def points(self):
+        names = SMU_PARAMS + FRU_PARAMS
+        return [dict(zip(names, values)) for values in itertools.product(*(self.sweep[name] for name in names))]
+
+    # Returns {<SMU POINT>:[<FIT PER PATCH>]} for the unique SMU points (<corpus> - prepared patches of this process)
+    def evaluateSmu(self, smuPoints, corpus):
+        if self.workers > 1 and len(smuPoints) > 1:
+            logging.info("Evaluating %d SMU point(s) on %d workers..."%(len(smuPoints), self.workers))
+            with ProcessPoolExecutor(max_workers = min(self.workers, len(smuPoints)), initializer = initWorker, \
+                                     initargs = (self.dbFile, self.smuFiles)) as pool:
+                chunkSize = max(1, len(smuPoints) // (4 * self.workers))
+                return dict(zip(smuPoints, pool.map(workerSmuFits, smuPoints, chunksize = chunkSize)))
+        logging.disable(logging.WARNING)
+        try:
+            return {smuPoint: smuFits(corpus, smuPoint) for smuPoint in smuPoints}
+        finally:
+            logging.disable(logging.NOTSET)
+
+    # Runs the sweep. Returns {"design": {...}, "patches": {...}, "weights": {...}, "points": [...]}
+    def run(self):
+        # Patch errors are reported once (invalid patches are left out of the fit rate)
+        with DesignDatabase(self.dbFile) as designDatabase:
+            signalIndex = designDatabase.signalIndex('observe')
+        corpus = []
+        patchErrors = {}
+        logging.disable(logging.WARNING)
+        try:
+            for smuFile in self.smuFiles:
+                smuParser, errors = preparePatch(smuFile, signalIndex)
+                corpus.append(smuParser)
+                if errors:
+                    patchErrors[smuFile] = errors
+        finally:
+            logging.disable(logging.NOTSET)
+        for smuFile, errors in patchErrors.items():
+            for error in errors:
+                logging.error(error)
+            logging.error("Patch %s is invalid - left out of the sweep"%(smuFile))
+        validCount = len(self.smuFiles) - len(patchErrors)
+
+        points = self.points()
+        smuPoints = sorted({tuple(point[name] for name in SMU_PARAMS) for point in points})
+        logging.info("Sweeping %d parameter point(s) (%d unique SMU point(s)) over %d patch(es)"%(len(points), len(smuPoints), \
+                     validCount))
+        smuResults = self.evaluateSmu(smuPoints, corpus)
+
+        results = []
+        for point in points:
+            fits = smuResults[tuple(point[name] for name in SMU_PARAMS)]
+            controlFits = self.controlWidth <= 2 * point["F"] + point["C"] + point["S"]
+            fitCount = sum(1 for fit in fits if fit) if controlFits else 0
+            results.append({"params"     : point,                                                                      \
+                            "controlFits": controlFits,                                                                \
+                            "fits"       : fitCount,                                                                   \
+                            "fitRate"    : fitCount / validCount if validCount else 0.0,                               \
+                            "unfit"      : [smuFile for smuFile, fit in zip(self.smuFiles, fits) if fit is False],     \
+                            "area"       : areaModel(point, self.weights)})
+        self.markPareto(results)
+        return {"design" : {"database": self.dbFile, "observeWidth": self.observeWidth, "controlWidth": self.controlWidth}, \
+                "patches": {"total": len(self.smuFiles), "valid": validCount, "invalid": sorted(patchErrors)},             \
+                "weights": self.weights,                                                                                   \
+                "points" : results}
+
+    # Flags the Pareto optimal points (max fit rate, min area) - single pass over the points sorted by area
+    # Points with the same area and fit rate as the last Pareto point don't dominate each other and are flagged too
+    @staticmethod
+    def markPareto(results):
+        bestFitRate = -1.0
+        lastPareto  = None
+        for result in sorted(results, key = lambda result: (result["area"]["area"], -result["fitRate"])):
+            key = (result["area"]["area"], result["fitRate"])
+            result["pareto"] = result["fitRate"] > bestFitRate or key == lastPareto
+            if result["pareto"]:
+                lastPareto = key
+            bestFitRate = max(bestFitRate, result["fitRate"])
+
+    @staticmethod
+    def report(sweepResults):
+        lines = ["%-4s %-5s %-4s %-5s %-4s %-4s %-4s %-6s %8s %10s %10s %10s %10s %10s"%("N", "K", "M", "SEG", "F", "S", "C", "FSEG",   \
+                 "fit rate", "smu cfg", "cmp bits", "fru cfg", "minterms", "area")]
+        for result in sorted(sweepResults["points"], key = lambda result: result["area"]["area"]):
+            if not result["pareto"]:
+                continue
+            params, area = result["params"], result["area"]
+            lines.append("%-4d %-5d %-4d %-5d %-4d %-4d %-4d %-6d %7.1f%% %10d %10d %10d %10d %10.0f"%(params["N"], params["K"],      \
+                         params["M"], params["segmentSize"], params["F"], params["S"], params["C"], params["fruSegmentSize"],        \
+                         100 * result["fitRate"], area["smuConfigBits"], area["comparatorBits"], area["fruConfigBits"],              \
+                         area["plaMinterms"], area["area"]))
+        return "\n".join(lines)
+
+
+if __name__ == '__main__':
+    argParser = argparse.ArgumentParser(description = "Design space exploration of SMU/FRU parameters over a patch corpus")
+    argParser.add_argument("--db", default = "Sample.asap.db", help = "Design database of the instrumented design")
+    argParser.add_argument("--smu", nargs = "+", default = ["patch.asap.smu"], help = "Patch corpus - .asap.smu files or directories")
+    argParser.add_argument("--N", type = int, nargs = "+", default = SWEEP_DEFAULTS["N"])
+    argParser.add_argument("--K", type = int, nargs = "+", default = [], help = "(default - observe_port width)")
+    argParser.add_argument("--M", type = int, nargs = "+", default = SWEEP_DEFAULTS["M"])
+    argParser.add_argument("--segment-size", type = int, nargs = "+", default = SWEEP_DEFAULTS["segmentSize"], help = "SMU_SEGMENT_SIZE")
+    argParser.add_argument("--F", type = int, nargs = "+", default = SWEEP_DEFAULTS["F"])
+    argParser.add_argument("--S", type = int, nargs = "+", default = SWEEP_DEFAULTS["S"])
+    argParser.add_argument("--C", type = int, nargs = "+", default = SWEEP_DEFAULTS["C"])
+    argParser.add_argument("--fru-segment-size", type = int, nargs = "+", default = SWEEP_DEFAULTS["fruSegmentSize"], help = "FRU SEGMENT_SIZE")
+    argParser.add_argument("--weight", metavar = "COMPONENT=WEIGHT", action = "append", default = [],
+                           help = "Area weight of %s (repeatable)"%(", ".join(AREA_WEIGHTS)))
+    argParser.add_argument("--workers", type = int, default = 1, help = "# of worker processes (e.g. the # of CPUs for large sweeps)")
+    argParser.add_argument("--json", metavar = "REPORT_JSON", help = "Write all points (fit, area, Pareto flag)")
+    addLoggingArguments(argParser)
+    args = argParser.parse_args()
+    configureLogging(args)
+
+    smuFiles = []
+    for path in args.smu:
+        if os.path.isdir(path):
+            smuFiles.extend(sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(".asap.smu")))
+        else:
+            smuFiles.append(path)
+    weights = {}
+    for setting in args.weight:
+        component, _, weight = setting.partition("=")
+        if component not in AREA_WEIGHTS:
+            argParser.error("Unknown area component '%s'"%(component))
+        weights[component] = float(weight)
+    sweep = DesignSpaceSweep(args.db, smuFiles,                                            \
+                             sweep   = {"N"             : args.N,                          \
+                                        "K"             : args.K,                          \
+                                        "M"             : args.M,                          \
+                                        "segmentSize"   : args.segment_size,               \
+                                        "F"             : args.F,                          \
+                                        "S"             : args.S,                          \
+                                        "C"             : args.C,                          \
+                                        "fruSegmentSize": args.fru_segment_size},          \
+                             workers = args.workers,                                       \
+                             weights = weights)
+    sweepResults = sweep.run()
+    logging.info("Pareto optimal configurations -\n%s"%(DesignSpaceSweep.report(sweepResults)))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(sweepResults, f, indent = 2)
+        logging.info("Sweep report written to %s"%(args.json))
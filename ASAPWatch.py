@@ -0,0 +1,282 @@
+import argparse
+import logging                                                       # logger
+import os
+import pickle                                                        # In-memory AST snapshots
+import time
+from InsertionTool import VerilogParser, VerilogGenerator, InstantiationTree, moduleInstances
+from pyverilog.vparser.ast import ModuleDef                          # PyVerilog AST
+from ASAPCache import CompileCache                                   # Content addressed compile results
+from ASAPDriver import compilePatch, writeOutputs                    # Patch compilation and outputs of the pipeline driver
+from ASAPLog import addLoggingArguments, configureLogging            # Structured/asynchronous logging
+
+
+# ************************************** <ASAP WATCH MODE> **************************************************
+# Re-runs insertion and compilation while RTL and patches are being edited.
+#
+#   FileWatcher  --> Polls the files in the filelist, the filelist itself and the .asap.smu patch files.
+#                    A change is reported once the files have been quiet for <debounce> seconds, so an
+#                    editor save (or a burst of saves) triggers a single run.
+#   WatchSession --> Keeps the design state of the previous run in memory and re-runs only what a change
+#                    affects -
+#                      RTL file     : Pragma extraction, parse and pragma binding of that file, stage 1 of
+#                                     that file, stage 2 (linear in modules + instances), code generation of
+#                                     the files whose hooks changed, design database, patch resolution
+#                      Patch file   : Patch compilation only (resolution, scheduling, dedup, SMU image and
+#                                     compressed bitstream, written like ASAPDriver - <NAME>.smu.* in <outputDir>)
+#                      Filelist     : Full run
+# Unchanged files are never re-parsed. Pristine and post stage 1 ASTs are kept as pickles (insertion
+# modifies ASTs in place, unpickling is much cheaper than parsing). Compile results are kept in a CompileCache
+# keyed by the design database, so a patch is recompiled only when it or the instrumented design changed.
+# *************************************************************************************************************
+
+
+# Polls a set of files for changes (mtime/size)
+class FileWatcher:
+    def __init__(self, files, interval = 0.2, debounce = 0.3) -> None:
+        self.interval = interval
+        self.debounce = debounce
+        self.stamps   = {}
+        self.watch(files)
+
+    @staticmethod
+    def stamp(file):
+        try:
+            stat = os.stat(file)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    # Replaces the set of watched files (stamps of already watched files are kept)
+    def watch(self, files):
+        self.stamps = {file: self.stamps[file] if file in self.stamps else self.stamp(file) for file in files}
+
+    def changedFiles(self):
+        changed = set()
+        for file, stamp in self.stamps.items():
+            current = self.stamp(file)
+            if current != stamp:
+                self.stamps[file] = current
+                changed.add(file)
+        return changed
+
+    # Blocks until at least one file changed and no further change was seen for <debounce> seconds
+    # Returns the set of changed files
+    def waitForChanges(self):
+        changed = set()
+        lastChange = None
+        while True:
+            newChanges = self.changedFiles()
+            if newChanges:
+                changed |= newChanges
+                lastChange = time.monotonic()
+            elif changed and time.monotonic() - lastChange >= self.debounce:
+                return changed
+            time.sleep(self.interval)
+
+
+# VerilogGenerator whose stage 1 is served from the session cache for unchanged files
+# The ASTs are unpickled from the session (pristine or post stage 1) - filewiseAst starts out empty
+class IncrementalVerilogGenerator(VerilogGenerator):
+    session = None
+
+    def stageOneFileModifier(self, file, moduleToSignalToObserve, moduleToSignalToControl):
+        cached = self.session.stageOneCache.get(file)
+        if cached is not None:
+            self.filewiseAst[file] = pickle.loads(cached[0])
+            return cached[1]
+        self.filewiseAst[file] = pickle.loads(self.session.fileToPristine[file])
+        widths = super().stageOneFileModifier(file, moduleToSignalToObserve, moduleToSignalToControl)
+        self.session.stageOneCache[file] = (pickle.dumps(self.filewiseAst[file], protocol = pickle.HIGHEST_PROTOCOL), widths)
+        return widths
+
+
+class WatchSession:
+    def __init__(self, filelist, topModule, smuFiles, observePort = "observe_port", controlPortIn = "control_port_in", \
+                       controlPortOut = "control_port_out", observePipeline = None, pipelineClock = "clk",          \
+                       smuParams = None, runBits = 6, cacheDir = None, outputDir = ".") -> None:
+        self.filelist        = filelist
+        self.topModule       = topModule
+        self.smuFiles        = list(smuFiles)
+        self.observePort     = observePort
+        self.controlPortIn   = controlPortIn
+        self.controlPortOut  = controlPortOut
+        self.observePipeline = observePipeline if observePipeline is not None else {}
+        self.pipelineClock   = pipelineClock
+        self.smuParams       = dict(N = 2, K = None, M = 6, segmentSize = 64, decryptKey = 0xDEADBEEF)
+        self.smuParams.update(smuParams or {})
+        self.runBits         = runBits
+        self.outputDir       = outputDir
+        self.cache           = CompileCache(cacheDir)
+        self.dbFile          = topModule + ".asap.db"
+        self.reset()
+
+    # Drops all in-memory state (next run is a full run)
+    def reset(self):
+        self.parser            = None
+        self.files             = []
+        self.fileToPristine    = {}   # {<FILE>:<PICKLED AST>}
+        self.fileToInstances   = {}   # {<FILE>:{<MODULE>:[(<INSTANCE>, <MODULE>)]}}
+        self.fileToObserve     = {}   # {<FILE>:{<MODULE>:{<SIGNAL>:(START_INDEX, END_INDEX)}}}
+        self.fileToControl     = {}   # {<FILE>:{<MODULE>:{<SIGNAL>:(CONTROL_TYPE, START_INDEX, END_INDEX)}}}
+        self.stageOneCache     = {}   # {<FILE>:(<PICKLED AST AFTER STAGE 1>, (OBSERVE_WIDTHS, CONTROL_WIDTHS))}
+        self.moduleSignature   = {}   # {<MODULE>:(PORT WIDTHS, CHILD PORT WIDTHS, INSTRUMENTED)} of the last run
+        self.observeSignalIndex = None
+
+    def watchedFiles(self):
+        return [self.filelist] + self.files + self.smuFiles
+
+    # Parses and binds pragmas of a single RTL file
+    def loadFile(self, file):
+        self.parser.fileToPragma[file] = self.parser.pragmaExtractor.fileParser(file)
+        ast = self.parser.parseFile(file)
+        self.fileToObserve[file], self.fileToControl[file] = self.parser.signalToPragma(ast, self.parser.fileToPragma[file])
+        self.fileToInstances[file] = {definition.name: moduleInstances(definition) for definition in ast.description.definitions \
+                                      if isinstance(definition, ModuleDef)}
+        self.fileToPristine[file] = pickle.dumps(ast, protocol = pickle.HIGHEST_PROTOCOL)
+        self.stageOneCache.pop(file, None)
+
+    # Runs the affected stages for a set of changed files. Returns the list of regenerated files
+    def run(self, changed = None):
+        startTime = time.perf_counter()
+        fullRun = self.parser is None or changed is None or self.filelist in changed
+        if fullRun:
+            self.reset()
+            self.parser = VerilogParser(self.filelist, self.topModule, lowMemory = True)
+            self.files  = list(self.parser.fileToPragma)
+            rtlChanged  = set(self.files)
+        else:
+            rtlChanged  = {file for file in changed if file in self.fileToPristine}
+        smuChanged = fullRun or any(file in self.smuFiles for file in changed)
+
+        regenerated = []
+        if rtlChanged:
+            for file in self.files:
+                if file in rtlChanged:
+                    logging.info("Watch: loading %s"%(file))
+                    self.loadFile(file)
+            regenerated = self.insert(rtlChanged)
+        if rtlChanged or smuChanged:
+            self.compile()
+        logging.info("Watch: run complete in %.3f s (%d file(s) regenerated)"%(time.perf_counter() - startTime, len(regenerated)))
+        return regenerated
+
+    # Insertion over in-memory state. Stage 1 output of unchanged files is reused
+    def insert(self, rtlChanged):
+        moduleToInstances = {}
+        for file in self.files:
+            moduleToInstances.update(self.fileToInstances[file])
+        instanceTree = InstantiationTree(self.topModule, {}, moduleToInstances).instanceTree
+        generator = IncrementalVerilogGenerator({file: None for file in self.files}, \
+                                                instanceTree,                        \
+                                                self.topModule,                      \
+                                                self.fileToObserve,                  \
+                                                self.fileToControl,                  \
+                                                self.observePort,                    \
+                                                self.controlPortIn,                  \
+                                                self.controlPortOut,                 \
+                                                self.observePipeline,                \
+                                                self.pipelineClock)
+        generator.session = self
+        generator.astModifier()
+
+        # A module's hooks depend on its own source, its port widths and the port widths of its children
+        moduleSignature = {}
+        for moduleName, children in moduleToInstances.items():
+            moduleSignature[moduleName] = ((generator.moduleToObservePortWidth.get(moduleName, 0),                    \
+                                            generator.moduleToControlPortWidth.get(moduleName, 0)),                   \
+                                           tuple((generator.moduleToObservePortWidth.get(child, 0),                   \
+                                                  generator.moduleToControlPortWidth.get(child, 0)) for _, child in children), \
+                                           generator.isInstrumented(moduleName))
+        regenerated = []
+        for file in self.files:
+            affected = file in rtlChanged or any(moduleSignature.get(moduleName) != self.moduleSignature.get(moduleName) \
+                                                 for moduleName in self.fileToInstances[file])
+            if not affected:
+                continue
+            if generator.isFileTouched(generator.filewiseAst[file]):
+                generator.genModifiedVerilogFile(file, streaming = True)
+            else:
+                generator.copyUntouchedVerilogFile(file)
+            regenerated.append(file)
+        self.moduleSignature = moduleSignature
+        generator.writeDesignDatabase(self.dbFile)
+        self.observeSignalIndex = generator.observeSignalIndex
+        return regenerated
+
+    # Compiles the patch files against the in-memory observe signal index and writes their outputs
+    def compile(self):
+        if self.observeSignalIndex is None:
+            logging.warning("Watch: no instrumented design - patches not compiled")
+            return
+        designDigest = self.cache.fileDigest(self.dbFile)
+        for smuFile in self.smuFiles:
+            if not os.path.exists(smuFile):
+                logging.warning("Watch: patch file %s not found"%(smuFile))
+                continue
+            result, errors = compilePatch(smuFile, self.observeSignalIndex, self.smuParams, self.runBits, self.cache, None, designDigest)
+            if result is None:
+                for error in errors:
+                    logging.error("Watch: %s"%(error))
+                logging.error("Watch: patch %s failed to compile"%(smuFile))
+                continue
+            writeOutputs(smuFile, result, self.outputDir, self.smuParams["decryptKey"])
+            logging.info("Watch: patch %s compiled"%(smuFile))
+
+    # Runs once, then re-runs on every debounced change until interrupted
+    def watch(self, interval = 0.2, debounce = 0.3):
+        self.runSafely(None)
+        watcher = FileWatcher(self.watchedFiles(), interval, debounce)
+        logging.info("Watch: watching %d file(s) - Ctrl+C to stop"%(len(watcher.stamps)))
+        try:
+            while True:
+                changed = watcher.waitForChanges()
+                logging.info("Watch: change detected in %s"%(", ".join(sorted(changed))))
+                self.runSafely(changed)
+                watcher.watch(self.watchedFiles())
+        except KeyboardInterrupt:
+            logging.info("Watch: stopped")
+
+    # A failing run (e.g. a half-edited RTL file) is reported and the next change triggers a full run
+    def runSafely(self, changed):
+        try:
+            return self.run(changed)
+        except Exception as e:
+            logging.error("Watch: run failed - %s: %s"%(type(e).__name__, e))
+            self.parser = None
+            return []
+
+
+if __name__ == '__main__':
+    argParser = argparse.ArgumentParser(description = "Re-run ASAP insertion/compilation on RTL and patch changes")
+    argParser.add_argument("--filelist", default = "filelist.f")
+    argParser.add_argument("--top", default = "Sample")
+    argParser.add_argument("--smu", nargs = "*", default = ["patch.asap.smu"], help = "ASAP-SMU patch files")
+    argParser.add_argument("--interval", type = float, default = 0.2, help = "Polling interval (seconds)")
+    argParser.add_argument("--debounce", type = float, default = 0.3, help = "Quiet period before a run (seconds)")
+    argParser.add_argument("--pipeline-observe", metavar = "MODULE[:STAGES]", action = "append", default = [])
+    argParser.add_argument("--pipeline-clock", default = "clk")
+    argParser.add_argument("--N", type = int, default = 2, help = "Maximum # of cycles for observability")
+    argParser.add_argument("--K", type = int, help = "Maximum # of observable signal bits (default - observe_port width)")
+    argParser.add_argument("--M", type = int, default = 6, help = "Maximum # of triggers (parallel SMU units)")
+    argParser.add_argument("--segment-size", type = int, default = 64, help = "SMU_SEGMENT_SIZE")
+    argParser.add_argument("--decrypt-key", type = lambda key: int(key, 16), default = 0xDEADBEEF, help = "DECRYPT_KEY (hex)")
+    argParser.add_argument("--run-bits", type = int, default = 6, help = "Run length field of the compressed bitstream (RUN_BITS)")
+    argParser.add_argument("--cache-dir", help = "Compile cache directory")
+    argParser.add_argument("--output-dir", default = ".", help = "Directory for SMU images, bitstreams and reports")
+    addLoggingArguments(argParser)
+    args = argParser.parse_args()
+    configureLogging(args)
+
+    observePipeline = {}
+    for boundary in args.pipeline_observe:
+        moduleName, _, stages = boundary.partition(":")
+        observePipeline[moduleName] = int(stages) if stages else 1
+    WatchSession(args.filelist, args.top, args.smu,                                  \
+                 observePipeline = observePipeline,                                  \
+                 pipelineClock   = args.pipeline_clock,                              \
+                 smuParams       = dict(N = args.N, K = args.K, M = args.M,          \
+                                        segmentSize = args.segment_size,             \
+                                        decryptKey  = args.decrypt_key),             \
+                 runBits         = args.run_bits,                                    \
+                 cacheDir        = args.cache_dir,                                   \
+                 outputDir       = args.output_dir).watch(args.interval, args.debounce)
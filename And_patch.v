@@ -15,10 +15,12 @@ module And
   wire [1:0] control_port_out_int;
   wire [1:0] in_1_controlled;
   assign out = in_1_controlled & in_2;
-  assign control_port_in_int[1:0] = in_1[1:0];
-  assign in_1_controlled[1:0] = control_port_out_int[1:0];
-  assign observe_port_int[0:0] = in_1[0:0];
+  assign control_port_in_int = in_1[1:0];
+  assign in_1_controlled[1:0] = control_port_out_int;
+  assign observe_port_int = in_1[0:0];
   assign observe_port = observe_port_int;
+  assign control_port_in = control_port_in_int;
+  assign control_port_out_int = control_port_out;
 
 endmodule
 
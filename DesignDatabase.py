@@ -0,0 +1,253 @@
+import hashlib                                                       # Source content hashes
+import mmap                                                          # Zero-copy database reads
+import os
+import struct
+import sys
+from SignalIndex import SignalIndex                                  # Hierarchical signal path index
+
+
+# ************************************* <ASAP DESIGN DATABASE (<top>.asap.db)> *******************************
+# Insertion writes everything the compiler needs to know about the instrumented design into one
+# compact binary file, so that the mapping never has to be recovered by re-running pyverilog.
+#
+# Layout (all integers little-endian) -
+#   HEADER   : MAGIC(8) | VERSION(u16) | SECTION_COUNT(u16)
+#   SECTIONS : SECTION_COUNT x (TAG(4) | OFFSET(u64) | LENGTH(u64))
+#   PAYLOAD  : The sections, each 4-byte aligned
+#
+# Sections -
+#   STRS : String table        - COUNT(u32) | OFFSETS(u32 x COUNT+1) | UTF-8 BLOB
+#   META : Design info         - TOP | OBSERVE_PORT | CONTROL_PORT_IN | CONTROL_PORT_OUT   (string ids)
+#   MODS : Unique modules      - NAME | OBSERVE_WIDTH | CONTROL_WIDTH | FIRST_INST | INST_COUNT
+#   INST : Instance DAG edges  - INSTANCE_NAME | CHILD_MODULE (index into MODS)
+#   OBSV : Observe signal map  - PATH | OFFSET | MSB | LSB | LATENCY
+#   CTRL : Control signal map  - PATH | OFFSET | MSB | LSB | LATENCY
+#   FILE : Source files        - PATH | SHA256(32 bytes)
+# Every record field is a u32 (string ids index the STRS section) except the SHA256 digest
+# LATENCY is the # of register stages between a signal and the port (pipelined observe taps, version 2)
+# *************************************************************************************************************
+
+MAGIC      = b'ASAPDB\x00\x00'
+DB_VERSION = 2
+
+HEADER          = struct.Struct('<8sHH')
+SECTION         = struct.Struct('<4sQQ')
+FILE_RECORD     = struct.Struct('<I32s')
+MODULE_FIELDS   = 5
+INSTANCE_FIELDS = 2
+SIGNAL_FIELDS   = 5
+
+
+# Exception class for unreadable/incompatible design databases
+class DesignDatabaseError(Exception):
+    pass
+
+
+# Returns the SHA256 digest of a source file
+def fileDigest(file):
+    digest = hashlib.sha256()
+    with open(file, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.digest()
+
+
+# Helper to intern strings into the string table while writing
+class StringTable:
+    def __init__(self) -> None:
+        self.ids     = {}
+        self.strings = []
+
+    def intern(self, string):
+        stringId = self.ids.get(string)
+        if stringId is None:
+            stringId = len(self.strings)
+            self.ids[string] = stringId
+            self.strings.append(string)
+        return stringId
+
+    def pack(self):
+        blobs   = [string.encode('utf-8') for string in self.strings]
+        offsets = [0]
+        for blob in blobs:
+            offsets.append(offsets[-1] + len(blob))
+        return struct.pack('<I%dI'%(len(offsets)), len(self.strings), *offsets) + b''.join(blobs)
+
+
+class DesignDatabase:
+    # Writes the design database
+    #   instanceTree      - Instantiation tree - {(TOP, <TOP_MODULE>):{(<INSTANCE>, <MODULE>):{...}}}
+    #   moduleTo*Width    - {<MODULE>:<PORT_WIDTH>} after stage 2 insertion
+    #   *SignalIndex      - SignalIndex for observe_port / control_port_in
+    #   files             - Source files of the design (content hashes are stored)
+    @staticmethod
+    def write(dbFile, topModule, observePort, controlPortIn, controlPortOut,
+                      instanceTree, moduleToObservePortWidth, moduleToControlPortWidth,
+                      observeSignalIndex, controlSignalIndex, files):
+        strings = StringTable()
+        meta = [strings.intern(topModule), strings.intern(observePort), \
+                strings.intern(controlPortIn), strings.intern(controlPortOut)]
+
+        # Collapse the instantiation tree into a DAG of unique modules
+        moduleToChildren = {}
+        stack = [instanceTree]
+        while stack:
+            treeNode = stack.pop()
+            for (_, moduleName), children in treeNode.items():
+                if moduleName in moduleToChildren:
+                    continue
+                moduleToChildren[moduleName] = [] if children is None else [(instance, module) for instance, module in children]
+                if children is not None:
+                    stack.append(children)
+        moduleIndex = {moduleName: index for index, moduleName in enumerate(moduleToChildren)}
+        modules   = []
+        instances = []
+        for moduleName, children in moduleToChildren.items():
+            modules.extend((strings.intern(moduleName),                         \
+                            moduleToObservePortWidth.get(moduleName, 0),        \
+                            moduleToControlPortWidth.get(moduleName, 0),        \
+                            len(instances) // INSTANCE_FIELDS,                  \
+                            len(children)))
+            for instance, module in children:
+                instances.extend((strings.intern(instance), moduleIndex[module]))
+
+        signals = {}
+        for tag, signalIndex in ((b'OBSV', observeSignalIndex), (b'CTRL', controlSignalIndex)):
+            records = []
+            for path, entry in signalIndex.signals.items():
+                records.extend((strings.intern(path), entry.offset, entry.msb, entry.lsb, entry.latency))
+            signals[tag] = records
+
+        fileRecords = b''.join(FILE_RECORD.pack(strings.intern(file), fileDigest(file)) for file in files)
+
+        def u32Array(values):
+            return struct.pack('<%dI'%(len(values)), *values)
+
+        sections = [(b'META', u32Array(meta)),
+                    (b'MODS', u32Array(modules)),
+                    (b'INST', u32Array(instances)),
+                    (b'OBSV', u32Array(signals[b'OBSV'])),
+                    (b'CTRL', u32Array(signals[b'CTRL'])),
+                    (b'FILE', fileRecords),
+                    (b'STRS', strings.pack())]
+
+        # Lay out the sections after the header and section table (4-byte aligned)
+        offset = HEADER.size + SECTION.size * len(sections)
+        table  = []
+        for tag, payload in sections:
+            offset += -offset % 4
+            table.append((tag, offset, len(payload)))
+            offset += len(payload)
+
+        # Atomic write - readers never see a partially written database
+        tempFile = dbFile + '.tmp%d'%(os.getpid())
+        with open(tempFile, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, DB_VERSION, len(sections)))
+            for tag, sectionOffset, length in table:
+                f.write(SECTION.pack(tag, sectionOffset, length))
+            for (tag, payload), (_, sectionOffset, _) in zip(sections, table):
+                f.write(b'\x00' * (sectionOffset - f.tell()))
+                f.write(payload)
+        os.replace(tempFile, dbFile)
+
+    # Opens a design database. Only the header is decoded here - sections are
+    # exposed as zero-copy views on the memory mapped file and decoded on access
+    def __init__(self, dbFile) -> None:
+        self.dbFile = dbFile
+        with open(dbFile, 'rb') as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.buffer = memoryview(self.mmap)
+        if len(self.buffer) < HEADER.size:
+            self.close()
+            raise DesignDatabaseError("Design database %s is truncated"%(dbFile))
+        magic, version, sectionCount = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC:
+            self.close()
+            raise DesignDatabaseError("%s is not an ASAP design database"%(dbFile))
+        if version != DB_VERSION:
+            self.close()
+            raise DesignDatabaseError("Design database %s has version %d, expected %d - re-run insertion"%(dbFile, version, DB_VERSION))
+        self.sections = {}
+        for index in range(sectionCount):
+            tag, offset, length = SECTION.unpack_from(self.buffer, HEADER.size + index * SECTION.size)
+            self.sections[tag] = self.buffer[offset:offset + length]
+        self.version = version
+
+        stringCount       = struct.unpack_from('<I', self.sections[b'STRS'], 0)[0]
+        self.stringOffset = self.u32View(self.sections[b'STRS'][4:8 + 4 * stringCount])
+        self.stringBlob   = self.sections[b'STRS'][8 + 4 * stringCount:]
+        meta = self.u32(b'META')
+        self.topModule      = self.string(meta[0])
+        self.observePort    = self.string(meta[1])
+        self.controlPortIn  = self.string(meta[2])
+        self.controlPortOut = self.string(meta[3])
+        self.signalIndexes  = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    # Releases all views before unmapping the file
+    def close(self):
+        for view in list(getattr(self, 'sections', {}).values()) + \
+                    [getattr(self, 'stringOffset', None), getattr(self, 'stringBlob', None), self.buffer]:
+            if isinstance(view, memoryview):
+                view.release()
+        self.sections = {}
+        self.mmap.close()
+
+    # Returns a u32 view of a buffer (zero-copy on little-endian hosts)
+    @staticmethod
+    def u32View(view):
+        if sys.byteorder == 'little':
+            return view.cast('I')
+        return struct.unpack('<%dI'%(len(view) // 4), view)
+
+    def u32(self, tag):
+        return self.u32View(self.sections[tag])
+
+    def string(self, stringId):
+        return str(self.stringBlob[self.stringOffset[stringId]:self.stringOffset[stringId + 1]], 'utf-8')
+
+    # Unique modules - {<MODULE>:(OBSERVE_WIDTH, CONTROL_WIDTH)}
+    def portWidths(self):
+        modules = self.u32(b'MODS')
+        return {self.string(modules[index]): (modules[index + 1], modules[index + 2]) \
+                for index in range(0, len(modules), MODULE_FIELDS)}
+
+    # Instance DAG - {<MODULE>:[(<INSTANCE>, <CHILD_MODULE>)]}
+    def instanceDag(self):
+        modules   = self.u32(b'MODS')
+        instances = self.u32(b'INST')
+        names     = [self.string(modules[index]) for index in range(0, len(modules), MODULE_FIELDS)]
+        dag = {}
+        for moduleIndex, name in enumerate(names):
+            record     = moduleIndex * MODULE_FIELDS
+            firstInst  = modules[record + 3]
+            instCount  = modules[record + 4]
+            dag[name]  = [(self.string(instances[index * INSTANCE_FIELDS]), names[instances[index * INSTANCE_FIELDS + 1]]) \
+                          for index in range(firstInst, firstInst + instCount)]
+        return dag
+
+    # Source files - {<FILE>:<SHA256_DIGEST>}
+    def fileHashes(self):
+        section = self.sections[b'FILE']
+        return {self.string(stringId): bytes(digest) for stringId, digest in FILE_RECORD.iter_unpack(section)}
+
+    # Returns the list of source files whose content changed since insertion
+    def staleFiles(self):
+        return [file for file, digest in self.fileHashes().items() \
+                if not os.path.exists(file) or fileDigest(file) != digest]
+
+    # SignalIndex for observe_port ('observe') or control_port_in ('control'). Built on first access
+    def signalIndex(self, kind = 'observe'):
+        if kind not in self.signalIndexes:
+            records = self.u32({'observe': b'OBSV', 'control': b'CTRL'}[kind])
+            signalIndex = SignalIndex()
+            for index in range(0, len(records), SIGNAL_FIELDS):
+                signalIndex.addSignal(self.string(records[index]), records[index + 1], records[index + 2], records[index + 3], \
+                                      records[index + 4])
+            self.signalIndexes[kind] = signalIndex
+        return self.signalIndexes[kind]
@@ -1,11 +1,23 @@
 from __future__ import absolute_import
 from __future__ import print_function
 import os
+import pickle                                                        # AST spilling in low-memory mode
+import shutil
+import tempfile
+import argparse                                                      # Command line options
+import bisect                                                        # Line number index searches
 import logging                                                       # logger
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor                   # Worker pool for parallel stage 1/code generation
 import pyfiglet                                                      # ASCII formatter (Just for tooling fun :) :))
-from pyverilog.vparser.parser import VerilogCodeParser               # PyVerilog Parser
+from pyverilog.vparser.parser import VerilogParser as PyVerilogParser  # PyVerilog Parser
+from pyverilog.vparser.preprocessor import VerilogPreprocessor       # PyVerilog (iverilog) preprocessor
 from pyverilog.vparser.ast import *                                  # PyVerilog AST
 from pyverilog.ast_code_generator.codegen import ASTCodeGenerator    # Pyverilog AST to verilog code generator
+from SignalIndex import SignalIndex                                  # Hierarchical signal path index
+from DesignDatabase import DesignDatabase                            # Serialized design database (insertion -> compiler)
+from ASAPProfiler import profiler, peakRss                           # Stage timers/memory/counters (disabled by default)
+from ASAPLog import logEvent, addLoggingArguments, configureLogging, collectLogRecords, replayLogRecords   # Structured/asynchronous logging
 
 #--------------------------------------------- LOGGER SETUP----------------------------------------#
 # Configure logging - Done at file top so that all classes have it accessible
@@ -16,6 +28,9 @@ formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
 fileHandler.setFormatter(formatter)
 logging.getLogger().addHandler(fileHandler)
 logging.info("Started Automatic, Scalable And Programmable (ASAP) tool for Hardware Patching...\n\n " + pyfiglet.figlet_format("ASAP  INSERTION"))
+# Per-signal/per-module records of the insertion stages (structured, see ASAPLog)
+stageOneLog = logging.getLogger("asap.insertion.stageOne")
+stageTwoLog = logging.getLogger("asap.insertion.stageTwo")
 #--------------------------------------------------------------------------------------------------#
 
 # Exception class for pragma parsing
@@ -23,6 +38,11 @@ class PragmaParsingError(Exception):
     pass
 
 
+# Exception class for hook insertion (e.g. a pipelined module without a clock port)
+class HookInsertionError(Exception):
+    pass
+
+
 # Class to create structured log prints of complex objects
 class LogStructuring:
     def __init__(self) -> None:
@@ -121,28 +141,156 @@ class PragmaExtractor(LogStructuring):
         return {file: self.fileParser(file) for file in files}
 
 
+# Returns the instances in a module definition - [(<INSTANCE>, <MODULE>)] in source order
+def moduleInstances(moduleDef):
+    instances = []
+    for item in moduleDef.items:
+        if isinstance(item, InstanceList):
+            for instance in item.instances:
+                instances.append((instance.name, instance.module))
+    return instances
+
+
+# Returns the unique modules of an instantiation tree in post-order, i.e. every module after all the
+# modules it instantiates - [(<MODULE>, [(<INSTANCE>, <MODULE>)])]
+# Iterative, so the hierarchy depth is not bounded by the recursion limit
+# -- moduleFilter : Optional predicate on module names - modules failing it (and their subtrees) are skipped
+def modulePostOrder(instanceTree, moduleFilter = None):
+    order = []
+    done  = set()
+    stack = [(moduleNode[1], children, False) for moduleNode, children in instanceTree.items() \
+             if moduleFilter is None or moduleFilter(moduleNode[1])]
+    while stack:
+        moduleName, children, expanded = stack.pop()
+        if moduleName in done:
+            continue
+        if expanded:
+            done.add(moduleName)
+            order.append((moduleName, list(children) if children is not None else []))
+        else:
+            stack.append((moduleName, children, True))
+            if children is not None:
+                stack.extend((child[1], grandChildren, False) for child, grandChildren in reversed(list(children.items())) \
+                             if child[1] not in done and (moduleFilter is None or moduleFilter(child[1])))
+    return order
+
+
+# Pragma reachability over all module definitions -
+# {<MODULE>: True if the module or any module it (transitively) instantiates carries an observe/control pragma}
+# -- moduleToInstances : {<MODULE>:[(<INSTANCE>, <MODULE>)]}
+# -- moduleToSignalTo* : Module-wise pragma maps from pragma binding
+# Instances of modules that are not defined in the filelist are treated as pragma free
+def pragmaReachability(moduleToInstances, moduleToSignalToObserve, moduleToSignalToControl):
+    moduleHasPragma = {}
+    for rootModule in moduleToInstances:
+        stack = [(rootModule, False)]
+        while stack:
+            moduleName, expanded = stack.pop()
+            if moduleName in moduleHasPragma:
+                continue
+            children = moduleToInstances[moduleName]
+            if expanded:
+                moduleHasPragma[moduleName] = bool(moduleToSignalToObserve.get(moduleName)) or \
+                                              bool(moduleToSignalToControl.get(moduleName)) or \
+                                              any(moduleHasPragma.get(child, False) for _, child in children)
+            else:
+                stack.append((moduleName, True))
+                stack.extend((child, False) for _, child in children if child in moduleToInstances and child not in moduleHasPragma)
+    return moduleHasPragma
+
+
+# Declaration nodes that pragmas bind to
+DECLARATION_TYPES = (Input, Output, Reg, Wire)
+
+
+# Line number index of the declarations of a parsed source file, joined against the (sparse) pragma map
+# Modules of a file and items of a module are in source order, so module item <i> covers the lines from
+# its own line up to the line of item <i+1> (the port list covers the lines before the first item). A
+# pragma line is mapped to its module and covering item by binary search, and only the covering items
+# are walked (once each) for Input/Output/Reg/Wire nodes - pragma binding scales with the # of pragmas,
+# and modules without pragma lines are never walked.
+# A module whose item lines are not in order (e.g. items without line numbers) is walked as a whole.
+class DeclarationLineIndex:
+    def __init__(self, ast) -> None:
+        self.moduleDefs   = [definition for definition in ast.description.definitions if isinstance(definition, ModuleDef)]
+        self.moduleDefs.sort(key = lambda moduleDef: moduleDef.lineno)
+        self.moduleLines  = [moduleDef.lineno for moduleDef in self.moduleDefs]
+        self.moduleItems  = {}   # {<MODULE INDEX>:([<LINE>], [<COVERING NODE>])}, built on first use
+        self.walked       = set()
+        self.lineToDeclarations = {}   # {<LINE>:[<DECLARATION NODE>]} of the walked nodes, in AST order
+
+    def coveringNodes(self, moduleIndex):
+        items = self.moduleItems.get(moduleIndex)
+        if items is None:
+            moduleDef = self.moduleDefs[moduleIndex]
+            lines = [moduleDef.lineno] + [item.lineno for item in moduleDef.items]
+            if all(lines[i] <= lines[i + 1] for i in range(len(lines) - 1)):
+                items = (lines, [moduleDef.portlist] + list(moduleDef.items))
+            else:
+                items = ([moduleDef.lineno], [moduleDef])
+            self.moduleItems[moduleIndex] = items
+        return items
+
+    # Records the declaration nodes of a subtree by line (iterative, in AST order)
+    def walk(self, node):
+        stack = [node]
+        while stack:
+            astNode = stack.pop()
+            if astNode is None:
+                continue
+            if profiler.enabled:
+                profiler.count("astNodesVisited")
+            if isinstance(astNode, DECLARATION_TYPES):
+                self.lineToDeclarations.setdefault(int(astNode.lineno), []).append(astNode)
+            stack.extend(reversed(astNode.children()))
+
+    # Returns {<MODULE>:[(<DECLARATION NODE>, (<OBSERVE>, <CONTROL>))]} - the declarations on pragma lines, in source order
+    def join(self, lineToPragma):
+        moduleToDeclarations = {}
+        for line in sorted(lineToPragma):
+            moduleIndex = bisect.bisect_right(self.moduleLines, line) - 1
+            if moduleIndex < 0:
+                continue
+            lines, nodes = self.coveringNodes(moduleIndex)
+            node = nodes[bisect.bisect_right(lines, line) - 1]
+            if id(node) not in self.walked:
+                self.walked.add(id(node))
+                self.walk(node)
+            for declaration in self.lineToDeclarations.get(line, ()):
+                moduleToDeclarations.setdefault(self.moduleDefs[moduleIndex].name, []).append((declaration, lineToPragma[line]))
+        return moduleToDeclarations
+
+
 # Class to identify module instantiation hierarchy to perform various insertion operations
 # The class expects top-module and a hash map of module to AST for tree population
+# (or, when ASTs are not held in memory, a hash map of module to its instances - {<MODULE>:[(<INSTANCE>, <MODULE>)]})
 class InstantiationTree:
-    def __init__(self, topModule, moduleToAst):
+    def __init__(self, topModule, moduleToAst, moduleToInstances = None):
         self.topModule = topModule
         self.moduleToAst = moduleToAst
-        self.instanceTree = self.populateTree(moduleToAst[topModule], \
-                          isTopModule=True)
-
-    # Method used to recursively populate the instantiation tree
-    def populateTree(self, ast, isTopModule = False):
-        treeNode = {}
-        if isTopModule:
-            treeNode.update({("TOP", self.topModule):  \
-                              self.populateTree(ast)})
-        else:
-            for item in ast.items:
-                if isinstance(item, InstanceList):
-                    for instance in item.instances:
-                        treeNode.update({(instance.name, instance.module): \
-                                        self.populateTree(self.moduleToAst[instance.module])})
-        return treeNode if treeNode else None
+        if moduleToInstances is None:
+            moduleToInstances = {moduleName: moduleInstances(ast) for moduleName, ast in moduleToAst.items()}
+        self.moduleToInstances = moduleToInstances
+        self.instanceTree = self.populateTree()
+
+    # Method used to populate the instantiation tree
+    # Iterative post-order over the unique modules - the subtree of a module is built once and shared
+    # by all of its instances
+    def populateTree(self):
+        moduleToSubtree = {}
+        stack = [(self.topModule, False)]
+        while stack:
+            moduleName, expanded = stack.pop()
+            if moduleName in moduleToSubtree:
+                continue
+            instances = self.moduleToInstances[moduleName]
+            if expanded:
+                treeNode = {instance: moduleToSubtree[instance[1]] for instance in instances}
+                moduleToSubtree[moduleName] = treeNode if treeNode else None
+            else:
+                stack.append((moduleName, True))
+                stack.extend((instance[1], False) for instance in instances if instance[1] not in moduleToSubtree)
+        return {("TOP", self.topModule): moduleToSubtree[self.topModule]}
     
     def populateSignalList(self, treeNode, moduleToObserveSignal, moduleToControlSignal, observeIndex = 0, controlIndex = 0):
         if treeNode is not None:
@@ -170,18 +318,29 @@ class InstantiationTree:
           
 
 # Class to parse the filelist
+# -- lowMemory = True : Only the pragmas are extracted up front. ASTs are parsed one file at a time
+#                      with parseFile() and are not held by the parser (see LowMemoryVerilogGenerator)
 class VerilogParser(LogStructuring):
-    def __init__(self, filelist, topModule) -> None:
+    def __init__(self, filelist, topModule, lowMemory = False) -> None:
         super().__init__()  # LogStructuring constructor
         self.filelist        = filelist
         logging.info("Parser initialized with %s"%(self.filelist))
-        self.pragmaExtractor = PragmaExtractor(self.filelist)
-        self.fileToPragma    = self.pragmaExtractor.filelistParse()
-        self.fileToAst       = self.fileWiseAst()
-        logging.info("File to AST hash map generated")
-        self.moduleToAst     = self.moduleWiseAst()
-        logging.info("Module to AST hash map generated")
-        self.tree            = InstantiationTree(topModule, self.moduleToAst).instanceTree
+        with profiler.stage("parse"):
+            with profiler.stage("pragmaExtraction"):
+                self.pragmaExtractor = PragmaExtractor(self.filelist)
+                self.fileToPragma    = self.pragmaExtractor.filelistParse()
+            if lowMemory:
+                self.fileToAst   = {}
+                self.moduleToAst = {}
+                self.tree        = None
+                return
+            with profiler.stage("fileAst"):
+                self.fileToAst       = self.fileWiseAst()
+            logging.info("File to AST hash map generated")
+            self.moduleToAst     = self.moduleWiseAst()
+            logging.info("Module to AST hash map generated")
+            with profiler.stage("instantiationTree"):
+                self.tree            = InstantiationTree(topModule, self.moduleToAst).instanceTree
         logging.info("Instantiation tree generated \n %s"%(self.logTreeInfo(self.tree)))
         #print(str(self.tree))
 
@@ -200,65 +359,59 @@ class VerilogParser(LogStructuring):
         assert os.path.exists(self.filelist), "Filelist %s doesn't exist"%(self.filelist)
         files = [filename.strip() for filename in open(self.filelist, 'r') if filename.strip()]
         assert all(os.path.exists(file) for file in files), "Not all files in the filelist are valid"
-        fileToAst = {file: VerilogCodeParser([file]).parse() for file in files}
+        fileToAst = {}
+        for file in files:
+            fileToAst[file] = self.parseFile(file)
         if all(value is not None for value in fileToAst.values()):
             logging.info("Filewise AST generated")
         else:
             logging.warning("Invalid ASTs found during fileToAst generation")
         return fileToAst
     
-    # Recursive method for AST traversal
-    # This method finds Ports/Decl and check if there is a corresponding pragma
-    # In effect: For a given file, find the
-    # signal associated with each pragma and segregate the signals 
-    # into signalToControl and signalToObserve maps.
-    # signalToObserve - {<SIGNAL>:(START_INDEX, END_INDEX)}
-    # signalToControl - {<SIGNAL>:(CONTROL_TYPE, START_INDEX, END_INDEX)}
-    def traverseAst(self, astNode, lineToPragma, signalToControl, signalToObserve):
-        if astNode is not None:
-            childNodes = astNode.children()
-            if isinstance(astNode, Input)  or  \
-               isinstance(astNode, Output) or  \
-               isinstance(astNode, Reg)    or  \
-               isinstance(astNode, Wire): 
-                # Check if the line has a pragma
-                if astNode.lineno in lineToPragma:
-                    # Check if there is an observe and control pragma
-                    if lineToPragma[int(astNode.lineno)][0] and lineToPragma[int(astNode.lineno)][1]:
-                        signalToObserve.update({astNode.name:(lineToPragma[int(astNode.lineno)][0][0],   \
-                                                              lineToPragma[int(astNode.lineno)][0][1])})  
-                        signalToControl.update({astNode.name:(lineToPragma[int(astNode.lineno)][1][0],   \
-                                                              lineToPragma[int(astNode.lineno)][1][1],   \
-                                                              lineToPragma[int(astNode.lineno)][1][2])}) 
-                    # Check if there is only an observe pragma
-                    elif lineToPragma[int(astNode.lineno)][0]:
-                        signalToObserve.update({astNode.name:(lineToPragma[int(astNode.lineno)][0][0],   \
-                                                              lineToPragma[int(astNode.lineno)][0][1])})  
-                    
-                    # Given pragma is exception protected, this one should be control pragma
-                    else:
-                        signalToControl.update({astNode.name:(lineToPragma[int(astNode.lineno)][1][0],   \
-                                                              lineToPragma[int(astNode.lineno)][1][1],   \
-                                                              lineToPragma[int(astNode.lineno)][1][2])}) 
-            for childNode in childNodes:
-                self.traverseAst(childNode, lineToPragma, signalToControl, signalToObserve)
-        return 
-
-    # For a given file, performs AST traversal on all modules to extract
+    # pyverilog builds its LALR tables whenever a parser is created (about a second per file with
+    # VerilogCodeParser). One parser is built per process and reused for every file
+    codeParser = None
+
+    # Parses a single source file to an AST
+    # The preprocessor output goes to a temporary file that is removed even if preprocessing or parsing fails.
+    # The lexer line counter is reset per file so that the AST line numbers (used for pragma binding) match the source
+    @staticmethod
+    def parseFile(file):
+        with profiler.stage("file:%s"%(file)):
+            if VerilogParser.codeParser is None:
+                VerilogParser.codeParser = PyVerilogParser(outputdir = ".", debug = False)
+            fd, preprocessOutput = tempfile.mkstemp(prefix = "asap_preprocess_", suffix = ".v")
+            os.close(fd)
+            try:
+                VerilogPreprocessor([file], preprocessOutput).preprocess()
+                with open(preprocessOutput, "r") as f:
+                    text = f.read()
+                VerilogParser.codeParser.lexer.lexer.lineno = 1
+                return VerilogParser.codeParser.parse(text)
+            finally:
+                os.remove(preprocessOutput)
+
+    # For a given file, binds the pragmas to the declared signals of all modules
+    # (DeclarationLineIndex - only the module items on pragma lines are walked)
     # signalToObserve - {<MODULE> : {<SIGNAL>:(START_INDEX, END_INDEX)}}
     # signalToControl - {<MODULE> : {<SIGNAL>:(CONTROL_TYPE, START_INDEX, END_INDEX)}}
     def signalToPragma(self, ast, lineToPragma):
-        moduleDefs = ast.description.definitions
+        moduleToDeclarations = DeclarationLineIndex(ast).join(lineToPragma)
         moduleToSignalToControl = {}
         moduleToSignalToObserve = {}
-        for moduleDef in moduleDefs:
+        for moduleDef in ast.description.definitions:
             if isinstance(moduleDef, ModuleDef):
                 signalToControlPerModule = {}
                 signalToObservePerModule = {}
-                self.traverseAst(moduleDef,                 \
-                                 lineToPragma,              \
-                                 signalToControlPerModule,  \
-                                 signalToObservePerModule)
+                declarations = moduleToDeclarations.get(moduleDef.name)
+                if declarations:
+                    for declaration, (observe, control) in declarations:
+                        if observe:
+                            signalToObservePerModule[declaration.name] = observe
+                        if control:
+                            signalToControlPerModule[declaration.name] = control
+                elif profiler.enabled:
+                    profiler.count("pragmaFreeModulesSkipped")
                 moduleToSignalToControl.update({moduleDef.name:signalToControlPerModule})
                 moduleToSignalToObserve.update({moduleDef.name:signalToObservePerModule})
         return moduleToSignalToObserve, moduleToSignalToControl
@@ -273,7 +426,8 @@ class VerilogParser(LogStructuring):
         # For all files populates signals and appropriate observe/control properties
         for file in self.fileToAst:
             logging.info("Scanning AST of file - %s for observable/controllable signals"%(file))
-            moduleToSignalToObserve, moduleToSignalToControl = self.signalToPragma(self.fileToAst[file], self.fileToPragma[file])
+            with profiler.stage("pragmaBinding"), profiler.stage("file:%s"%(file)):
+                moduleToSignalToObserve, moduleToSignalToControl = self.signalToPragma(self.fileToAst[file], self.fileToPragma[file])
             if bool(moduleToSignalToObserve) | bool(moduleToSignalToControl):
                 logging.info("AST traversal complete: Observable/Controllable signals found in file - %s"%(str(file)))
             else:
@@ -284,7 +438,98 @@ class VerilogParser(LogStructuring):
 
 
 
+# Stage 1 inputs of the worker pool - [(<MODULE AST>, <SIGNAL TO OBSERVE>, <SIGNAL TO CONTROL>)]
+# Set before the workers are forked, so they inherit the module ASTs instead of receiving pickled copies
+stageOneShards = None
+
+
+# Stage 1 of a single module in a worker process (VerilogGenerator.parallelStageOneModifier)
+# -- ports : (OBSERVE_PORT, CONTROL_PORT_IN, CONTROL_PORT_OUT) - stage 1 depends on nothing else of the generator
+# -- shard    : Index into stageOneShards (forked workers) or the shard itself
+# -- profiled : The parent profiler is enabled - the module stage and counters are collected for profiler.merge
+# Returns (<MODIFIED MODULE AST>, OBSERVE_WIDTH, CONTROL_WIDTH, <LOG RECORDS>, <PROFILE>)
+def stageOneModuleWorker(ports, shard, profiled = False):
+    moduleDef, signalToObserve, signalToControl = stageOneShards[shard] if isinstance(shard, int) else shard
+    generator = VerilogGenerator({}, None, None, {}, {}, *ports)
+    with collectLogRecords() as records, profiler.collect(profiled) as profile:
+        with profiler.stage("module:%s"%(moduleDef.name)):
+            observeWidth, controlWidth = generator.stageOneModule(moduleDef, signalToObserve, signalToControl)
+    return moduleDef, observeWidth, controlWidth, records, profile
+
+
+#--------------------------------------------- CODE GENERATION -----------------------------------#
+# Output file of a source file
+def patchFilename(file):
+    return os.path.splitext(file)[0] + "_patch.v"
+
+
+# Renders the AST of a source file to <file>_patch.v
+# -- streaming = False : The whole file is rendered into a single string before the write
+# -- streaming = True  : Modules are rendered and written one at a time. Only one module worth
+#                        of verilog code is held in memory at any point.
+# The output is written to a temporary file and renamed, so an interrupted run never leaves
+# a truncated _patch.v behind. This is a module level function so that it can be shipped to
+# worker processes.
+def renderVerilogFile(file, ast, streaming = False):
+    codegen = ASTCodeGenerator()
+    newFilename = patchFilename(file)
+    tempFilename = newFilename + ".tmp%d"%(os.getpid())
+    try:
+        with open(tempFilename, "w") as f:
+            if streaming:
+                # Same layout as the Source/Description templates of ASTCodeGenerator -
+                # "\n" + "\n\n".join(<modules>) + "\n"
+                f.write("\n")
+                for index, definition in enumerate(ast.description.definitions):
+                    if index:
+                        f.write("\n\n")
+                    f.write(str(codegen.visit(definition)))
+                f.write("\n")
+            else:
+                f.write(str(codegen.visit(ast)))
+        os.replace(tempFilename, newFilename)
+    finally:
+        if os.path.exists(tempFilename):
+            os.remove(tempFilename)
+    return newFilename
+
+
+# Code generation inputs of the worker pool - [(<FILE>, <AST>)]
+# Set before the workers are forked, so they inherit the file ASTs instead of receiving pickled copies
+codegenShards = None
+
+
+# Code generation of a single file in a worker process (VerilogGenerator.generateVerilog)
+# -- shard    : Index into codegenShards (forked workers) or the shard itself
+# -- profiled : The parent profiler is enabled - the file stage is collected for profiler.merge
+# Returns (<OUTPUT FILE>, <PROFILE>)
+def renderVerilogFileWorker(shard, streaming, profiled = False):
+    file, ast = codegenShards[shard] if isinstance(shard, int) else shard
+    with profiler.collect(profiled) as profile, profiler.stage("file:%s"%(file)):
+        newFilename = renderVerilogFile(file, ast, streaming)
+    return newFilename, profile
+
+
+# Files without patch hooks are copied through to <file>_patch.v (no code generation), so every filelist
+# entry has a current _patch.v - a file that lost its pragmas never leaves a stale one from an earlier run
+def copyVerilogFile(file):
+    newFilename = patchFilename(file)
+    tempFilename = newFilename + ".tmp%d"%(os.getpid())
+    try:
+        shutil.copyfile(file, tempFilename)
+        os.replace(tempFilename, newFilename)
+    finally:
+        if os.path.exists(tempFilename):
+            os.remove(tempFilename)
+    return newFilename
+#--------------------------------------------------------------------------------------------------#
+
+
 # Class to generate modified verilog code based on added pragmas
+# -- observePipeline : {<MODULE>:<STAGES>} - hierarchy boundaries (module observe ports) that get register stages
+#                      on the observe bus. Every signal observed through such a module reaches the SMU <STAGES>
+#                      cycles later; the latency is recorded in the signal index/design database.
+# -- pipelineClock   : Clock port used by the observe pipeline registers (must exist in pipelined modules)
 class VerilogGenerator(LogStructuring):
     def __init__(self, filewiseAst, 
                        instanceTree, 
@@ -293,8 +538,11 @@ class VerilogGenerator(LogStructuring):
                        fileToModuleToSignalToControl,  
                        observePort, 
                        controlPortIn, 
-                       controlPortOut) -> None:
+                       controlPortOut,
+                       observePipeline = None,
+                       pipelineClock   = "clk") -> None:
         self.filewiseAst           = filewiseAst
+        self.files                 = list(filewiseAst)
         self.fileToModuleToSignalToObserve = fileToModuleToSignalToObserve
         self.fileToModuleToSignalToControl = fileToModuleToSignalToControl
         self.observePort                   = observePort
@@ -304,6 +552,14 @@ class VerilogGenerator(LogStructuring):
         self.topModule                     = topModule
         self.moduleToObservePortWidth      = {}
         self.moduleToControlPortWidth      = {} 
+        self.moduleToSignalToObserve       = {}
+        self.moduleToSignalToControl       = {}
+        self.observeSignalIndex            = None
+        self.controlSignalIndex            = None
+        self.moduleToAst                   = None
+        self.moduleHasPragma               = {}
+        self.observePipeline               = observePipeline if observePipeline is not None else {}
+        self.pipelineClock                 = pipelineClock
     
     # Create necessary tap (assignment )logic for observe signals to propagate to SMU
     #                         <Observation of controlled signals>
@@ -316,71 +572,66 @@ class VerilogGenerator(LogStructuring):
     #                      |
     #                  ObservePort
     #                (SMU Observe Tap)   
-    def createInternalObserveTaps(self, signalToObserve, sruDriverList):
+    def createInternalObserveTaps(self, signalToObserve, sruDriverList, moduleName = None):
         assignmentList = []
         observePortIndexLastInt = 0
+        # Signals that feed the SRU - set for O(1) membership checks
+        sruDrivers = {controlSignal[0] for controlSignal in sruDriverList}
+        # Taps in observe port order (LSB first) - (<SIGNAL>, OBSERVE_START, OBSERVE_END)
+        taps = []
         for signal in signalToObserve:
+            counterPart = self.signalCounterPart(signal)
             # If the observed signal is in SRU driver list:
-            # -- assign <observePortInt[<range>]> = <signal[OBSERVE_START:OBSERVE_END]> 
-            if any(signal == controlSignal[0] for controlSignal in sruDriverList):
-                logging.info("Observed port '%s' also found to be a controlled input. Tapping in to '%s' for observation" %(signal, \
-                                                                                                                            signal))
-                signalRangeLhs = signalToObserve[signal][0]
-                signalRangeRhs = signalToObserve[signal][1]
-                observePortRangeLhs = observePortIndexLastInt + (signalRangeLhs - signalRangeRhs)
-                observePortRangeRhs = observePortIndexLastInt
-                Lhs = Partselect(Identifier(self.observePort + "_int"),  \
-                                IntConst(observePortRangeLhs), \
-                                IntConst(observePortRangeRhs))
-                Rhs = Partselect(Identifier(signal),  \
-                                IntConst(signalRangeLhs), \
-                                IntConst(signalRangeRhs))
-                assignmentList.append(Assign(Lhs, Rhs))
-                observePortIndexLastInt += (signalRangeLhs - signalRangeRhs) + 1
+            # -- tap <signal[OBSERVE_START:OBSERVE_END]> 
+            if signal in sruDrivers:
+                stageOneLog.info("Observed port '%s' also found to be a controlled input. Tapping in to '%s' for observation", signal, signal, \
+                                 extra = logEvent(module = moduleName, signal = signal, action = "observe", tap = signal))
+                tappedSignal = signal
             # If the counter part (+/- "_controlled") of observed signal is in SRU sriver list as well,
             # -- we should observe this as the original observed signal would be the patched version
-            # -- assign <observePortInt[<range>]> = <couterPart(signal)[OBSERVE_START:OBSERVE_END]> 
-            elif any(self.signalCounterPart(signal) == controlSignal[0] for controlSignal in sruDriverList):
-                logging.info("Observed port '%s' also found to be a controlled reg/wire/output. Tapping in to '%s' for observation" %(signal,  \
-                                                                                                               self.signalCounterPart(signal)))
-                signalRangeLhs = signalToObserve[signal][0]
-                signalRangeRhs = signalToObserve[signal][1]
-                observePortRangeLhs = observePortIndexLastInt + (signalRangeLhs - signalRangeRhs)
-                observePortRangeRhs = observePortIndexLastInt
-                Lhs = Partselect(Identifier(self.observePort + "_int"),  \
-                                IntConst(observePortRangeLhs), \
-                                IntConst(observePortRangeRhs))
-                Rhs = Partselect(Identifier(self.signalCounterPart(signal)),  \
-                                IntConst(signalRangeLhs), \
-                                IntConst(signalRangeRhs))
-                assignmentList.append(Assign(Lhs, Rhs))
-                observePortIndexLastInt += (signalRangeLhs - signalRangeRhs) + 1
+            # -- tap <couterPart(signal)[OBSERVE_START:OBSERVE_END]> 
+            elif counterPart in sruDrivers:
+                stageOneLog.info("Observed port '%s' also found to be a controlled reg/wire/output. Tapping in to '%s' for observation", \
+                                 signal, counterPart, extra = logEvent(module = moduleName, signal = signal, action = "observe", tap = counterPart))
+                tappedSignal = counterPart
             # If the observed signal of the counterPart is not in SRU driver list,
             # it is not controlled and we can safely observe the original signal
             else:
-                logging.info("Observed port '%s' or '%s' doesn't exist in SRU LoadList, Tapping in to '%s' for observation" %(signal,  \
-                                                                                                     self.signalCounterPart(signal), \
-                                                                                                                            signal))
-                signalRangeLhs = signalToObserve[signal][0]
-                signalRangeRhs = signalToObserve[signal][1]
-                observePortRangeLhs = observePortIndexLastInt + (signalRangeLhs - signalRangeRhs)
-                observePortRangeRhs = observePortIndexLastInt
-                Lhs = Partselect(Identifier(self.observePort + "_int"),  \
-                                IntConst(observePortRangeLhs), \
-                                IntConst(observePortRangeRhs))
-                Rhs = Partselect(Identifier(signal),  \
-                                IntConst(signalRangeLhs), \
-                                IntConst(signalRangeRhs))
-                assignmentList.append(Assign(Lhs, Rhs))
-                observePortIndexLastInt += (signalRangeLhs - signalRangeRhs) + 1
+                stageOneLog.info("Observed port '%s' or '%s' doesn't exist in SRU LoadList, Tapping in to '%s' for observation", \
+                                 signal, counterPart, signal, extra = logEvent(module = moduleName, signal = signal, action = "observe", tap = signal))
+                tappedSignal = signal
+            signalRangeLhs = signalToObserve[signal][0]
+            signalRangeRhs = signalToObserve[signal][1]
+            taps.append((tappedSignal, signalRangeLhs, signalRangeRhs))
+            observePortIndexLastInt += (signalRangeLhs - signalRangeRhs) + 1
+        # The taps fill <observePort>_int back to back -
+        # -- assign <observePortInt> = {<signalN[OBSERVE_START:OBSERVE_END]>, ..., <signal1[OBSERVE_START:OBSERVE_END]>}
+        if taps:
+            assignmentList.append(Assign(Identifier(self.observePort + "_int"), self.coalesceTaps(taps)))
+        profiler.count("assignsEmitted", len(assignmentList))
         return assignmentList, observePortIndexLastInt - 1
     
     def signalCounterPart(self, signal):
-        if "controlled" in signal:
-            return signal[0:signal.index("_controlled")-1]
+        if signal.endswith("_controlled"):
+            return signal[:-len("_controlled")]
         else:
             return signal + "_controlled"
 
+    # Coalesces taps that sit back to back on a port into a single expression
+    # -- taps : [(<SIGNAL>, START, END)] in port order (LSB first)
+    # Adjacent slices of the same signal are merged into one part select. Returns the part select, or the
+    # concatenation of part selects (most significant first), covering the port
+    def coalesceTaps(self, taps):
+        slices = []
+        for signal, signalRangeLhs, signalRangeRhs in taps:
+            if slices and slices[-1][0] == signal and slices[-1][1] + 1 == signalRangeRhs:
+                slices[-1][1] = signalRangeLhs
+            else:
+                slices.append([signal, signalRangeLhs, signalRangeRhs])
+        parts = [Partselect(Identifier(signal), IntConst(signalRangeLhs), IntConst(signalRangeRhs)) \
+                 for signal, signalRangeLhs, signalRangeRhs in reversed(slices)]
+        return parts[0] if len(parts) == 1 else Concat(parts)
+
 
     # Create necessary tap (assignment) logic for control signals to propagate to and from SRU   
     #                                         ________
@@ -391,48 +642,35 @@ class VerilogGenerator(LogStructuring):
         assignmentList = []
         controlPortInIndexLastInt  = 0
         controlPortOutIndexLastInt = 0
-        # Internal input tap assignment - assign <controlPortInInt[range]]> = <signal[START:END]>;
+        # Internal input tap assignment - assign <controlPortInInt> = {..., <signal[START:END]>};
         for signalNode in sruDriverList:
-            signalRangeLhs = signalNode[1]
-            signalRangeRhs = signalNode[2]
-            controlPortRangeLhs = controlPortInIndexLastInt + (signalRangeLhs - signalRangeRhs)
-            controlPortRangeRhs = controlPortInIndexLastInt
-            Lhs = Partselect(Identifier(self.controlPortIn + "_int"), \
-                            IntConst(controlPortRangeLhs),            \
-                            IntConst(controlPortRangeRhs))
-            Rhs = Partselect(Identifier(signalNode[0]),               \
-                            IntConst(signalRangeLhs),                 \
-                            IntConst(signalRangeRhs))
-            assignmentList.append(Assign(Lhs, Rhs))
-            controlPortInIndexLastInt +=  (signalRangeLhs - signalRangeRhs) + 1
-
-        # Internal output tap assignment - assign <signal'[START:END]> = <controlPortOutInt[range]]>
+            controlPortInIndexLastInt +=  (signalNode[1] - signalNode[2]) + 1
+        if sruDriverList:
+            assignmentList.append(Assign(Identifier(self.controlPortIn + "_int"), self.coalesceTaps(sruDriverList)))
+
+        # Internal output tap assignment - assign {..., <signal'[START:END]>} = <controlPortOutInt>
         # FIXME (Not implemented)          assign <signal'[rest]> = <signal[rest]>
         for signalNode in sruLoadList:
-            signalRangeLhs = signalNode[1]
-            signalRangeRhs = signalNode[2]
-            controlPortRangeLhs = controlPortOutIndexLastInt + (signalRangeLhs - signalRangeRhs)
-            controlPortRangeRhs = controlPortOutIndexLastInt
-            Lhs = Partselect(Identifier(signalNode[0]),                    \
-                            IntConst(signalRangeLhs),                      \
-                            IntConst(signalRangeRhs))
-            Rhs = Partselect(Identifier(self.controlPortOut + "_int"),     \
-                            IntConst(controlPortRangeLhs),                 \
-                            IntConst(controlPortRangeRhs))
-            assignmentList.append(Assign(Lhs, Rhs))
-            controlPortOutIndexLastInt += ((signalRangeLhs - signalRangeRhs)) + 1
+            controlPortOutIndexLastInt += ((signalNode[1] - signalNode[2])) + 1
+        if sruLoadList:
+            assignmentList.append(Assign(self.coalesceTaps(sruLoadList), Identifier(self.controlPortOut + "_int")))
         
         assert (controlPortOutIndexLastInt == controlPortInIndexLastInt), "Control port in/out cannot be of different size"
+        profiler.count("assignsEmitted", len(assignmentList))
         return assignmentList, controlPortInIndexLastInt - 1, controlPortOutIndexLastInt - 1
     
     # This method recursively traverses the AST to modify all drivers of a signal
     def traverseAstToModifyLHS(self, astNode, signal):
         # traverse the node if the nod is valid and it is not branching to an RHS assignment
         if astNode is not None and not isinstance(astNode, Rvalue):
+            if profiler.enabled:
+                profiler.count("astNodesVisited")
             childNodes = astNode.children()
             if isinstance(astNode, Identifier):
                 if astNode.name == signal:
                     astNode.name = astNode.name  + "_controlled"
+                    if profiler.enabled:
+                        profiler.count("renamesApplied")
             for child in childNodes:
                 self.traverseAstToModifyLHS(child, signal)
         return
@@ -441,10 +679,14 @@ class VerilogGenerator(LogStructuring):
     def traverseAstToModifyRHS(self, astNode, signal):
         # traverse the node if the nod is valid and it is not branching to an RHS assignment
         if astNode is not None and not isinstance(astNode, Lvalue):
+            if profiler.enabled:
+                profiler.count("astNodesVisited")
             childNodes = astNode.children()
             if isinstance(astNode, Identifier):
                 if astNode.name == signal:
                     astNode.name = astNode.name  + "_controlled"
+                    if profiler.enabled:
+                        profiler.count("renamesApplied")
             for child in childNodes:
                 self.traverseAstToModifyRHS(child, signal)
         return
@@ -469,14 +711,16 @@ class VerilogGenerator(LogStructuring):
             # -- Change all loads (RHS) of A to A_controlled 
             if isinstance(port.second, Wire) and isinstance(port.first, Input):
                 newPorts.append(port)
-                print(port.first.name)
                 if port.first.name in signalToControl:
-                    logging.info("-- Bits [%s:%s] of Input port '%s' found as '%s' controlled"%(signalToControl[port.first.name][1],  \
-                                                                                            signalToControl[port.first.name][2],  \
-                                                                                            port.first.name,                      \
-                                                                                            signalToControl[port.first.name][0]))
-                    logging.info("--- Bypassing load of '%s' via '%s' for SRU control"%(port.first.name,                          \
-                                                                                      port.second.name + "_controlled"))
+                    stageOneLog.info("-- Bits [%s:%s] of Input port '%s' found as '%s' controlled", signalToControl[port.first.name][1], \
+                                     signalToControl[port.first.name][2], \
+                                     port.first.name, \
+                                     signalToControl[port.first.name][0])
+                    stageOneLog.info("--- Bypassing load of '%s' via '%s' for SRU control", port.first.name, \
+                                     port.second.name + "_controlled", \
+                                     extra = logEvent(module = moduleDef.name, signal = port.first.name, action = "control", kind = "input", \
+                                                      controlType = signalToControl[port.first.name][0], bypass = port.second.name + "_controlled", \
+                                                      widths = {"msb": signalToControl[port.first.name][1], "lsb": signalToControl[port.first.name][2]}))
                     newWire  = Decl((Wire(name = port.second.name + "_controlled", \
                                           width = port.second.width,               \
                                           signed = port.second.signed,             \
@@ -504,12 +748,15 @@ class VerilogGenerator(LogStructuring):
             elif isinstance(port.second, Wire) and isinstance(port.first, Output):
                 newPorts.append(port)
                 if port.first.name in signalToControl:
-                    logging.info("-- Bits [%s:%s] of Output (wire) port '%s' found as '%s' controlled"%(signalToControl[port.first.name][1], \
-                                                                                                    signalToControl[port.first.name][2], \
-                                                                                                    port.first.name,                     \
-                                                                                                    signalToControl[port.first.name][0]))
-                    logging.info("--- Bypassing driver of '%s' via '%s' for SRU control"%(port.first.name,                               \
-                                                                                          port.second.name + "_controlled"))
+                    stageOneLog.info("-- Bits [%s:%s] of Output (wire) port '%s' found as '%s' controlled", signalToControl[port.first.name][1], \
+                                     signalToControl[port.first.name][2], \
+                                     port.first.name, \
+                                     signalToControl[port.first.name][0])
+                    stageOneLog.info("--- Bypassing driver of '%s' via '%s' for SRU control", port.first.name, \
+                                     port.second.name + "_controlled", \
+                                     extra = logEvent(module = moduleDef.name, signal = port.first.name, action = "control", kind = "outputWire", \
+                                                      controlType = signalToControl[port.first.name][0], bypass = port.second.name + "_controlled", \
+                                                      widths = {"msb": signalToControl[port.first.name][1], "lsb": signalToControl[port.first.name][2]}))
                     newWire  = Decl((Wire(name = port.second.name + "_controlled", \
                                           width = port.second.width,               \
                                           signed = port.second.signed,             \
@@ -536,12 +783,15 @@ class VerilogGenerator(LogStructuring):
             # -- Change all drivers of A to A_controlled 
             elif isinstance(port.second, Reg) and isinstance(port.first, Output):
                 if port.first.name in signalToControl:
-                    logging.info("--Bits [%s:%s] of Output (reg) port '%s' found as '%s' controlled"%(signalToControl[port.first.name][1], \
-                                                                                                  signalToControl[port.first.name][2], \
-                                                                                                  port.first.name,                     \
-                                                                                                  signalToControl[port.first.name][0]))
-                    logging.info("--- Bypassing driver of '%s' via register '%s' for SRU control"%(port.first.name,                    \
-                                                                                                   port.second.name + "_controlled"))
+                    stageOneLog.info("-- Bits [%s:%s] of Output (reg) port '%s' found as '%s' controlled", signalToControl[port.first.name][1], \
+                                     signalToControl[port.first.name][2], \
+                                     port.first.name, \
+                                     signalToControl[port.first.name][0])
+                    stageOneLog.info("--- Bypassing driver of '%s' via register '%s' for SRU control", port.first.name, \
+                                     port.second.name + "_controlled", \
+                                     extra = logEvent(module = moduleDef.name, signal = port.first.name, action = "control", kind = "outputReg", \
+                                                      controlType = signalToControl[port.first.name][0], bypass = port.second.name + "_controlled", \
+                                                      widths = {"msb": signalToControl[port.first.name][1], "lsb": signalToControl[port.first.name][2]}))
                     newReg   = Decl((Reg(name = port.second.name + "_controlled",  \
                                          width = port.second.width,                \
                                          signed = port.second.signed,
@@ -591,12 +841,15 @@ class VerilogGenerator(LogStructuring):
                 if isinstance(item.list[0], Reg):   # NOTE: item.list is a tuple
                     regDecl = item.list[0]
                     if regDecl.name in signalToControl:
-                        logging.info("--Bits [%s:%s] of Register '%s' found as '%s' controlled"%(signalToControl[regDecl.name][1], \
-                                                                                           signalToControl[regDecl.name][2],   \
-                                                                                           regDecl.name,                       \
-                                                                                           signalToControl[regDecl.name][0]))
-                        logging.info("--- Bypassing driver of '%s' via register '%s' for SRU control"%(regDecl.name,           \
-                                                                                                       regDecl.name,+ "_controlled"))
+                        stageOneLog.info("-- Bits [%s:%s] of Register '%s' found as '%s' controlled", signalToControl[regDecl.name][1], \
+                                         signalToControl[regDecl.name][2], \
+                                         regDecl.name, \
+                                         signalToControl[regDecl.name][0])
+                        stageOneLog.info("--- Bypassing driver of '%s' via register '%s' for SRU control", regDecl.name, \
+                                         regDecl.name + "_controlled", \
+                                         extra = logEvent(module = moduleDef.name, signal = regDecl.name, action = "control", kind = "reg", \
+                                                          controlType = signalToControl[regDecl.name][0], bypass = regDecl.name + "_controlled", \
+                                                          widths = {"msb": signalToControl[regDecl.name][1], "lsb": signalToControl[regDecl.name][2]}))
                         # Making a Declaration node passed with list (tuple) of the new register - A_controlled
                         newReg =  Decl((Reg(name = regDecl.name + "_controlled",   \
                                             width = regDecl.width,                 \
@@ -632,12 +885,15 @@ class VerilogGenerator(LogStructuring):
                 elif isinstance(item.list[0], Wire):
                     wireDecl = item.list[0]
                     if wireDecl.name in signalToControl:
-                        logging.info("--Bits [%s:%s] of Wire '%s' found as '%s' controlled"%(signalToControl[wireDecl.name][1], \
-                                                                                         signalToControl[wireDecl.name][2], \
-                                                                                         wireDecl.name,                     \
-                                                                                         signalToControl[wireDecl.name][0]))
-                        logging.info("--- Bypassing driver of '%s' via wire '%s' for SRU control"%(wireDecl.name,       \
-                                                                                                       wireDecl.name + "_controlled"))
+                        stageOneLog.info("-- Bits [%s:%s] of Wire '%s' found as '%s' controlled", signalToControl[wireDecl.name][1], \
+                                         signalToControl[wireDecl.name][2], \
+                                         wireDecl.name, \
+                                         signalToControl[wireDecl.name][0])
+                        stageOneLog.info("--- Bypassing driver of '%s' via wire '%s' for SRU control", wireDecl.name, \
+                                         wireDecl.name + "_controlled", \
+                                         extra = logEvent(module = moduleDef.name, signal = wireDecl.name, action = "control", kind = "wire", \
+                                                          controlType = signalToControl[wireDecl.name][0], bypass = wireDecl.name + "_controlled", \
+                                                          widths = {"msb": signalToControl[wireDecl.name][1], "lsb": signalToControl[wireDecl.name][2]}))
                         # Making a Declaration node passed with list (tuple) of the new wire - A_controlled
                         newWire = Decl((Wire(name = wireDecl.name + "_controlled",  \
                                             width = wireDecl.width,                 \
@@ -690,7 +946,7 @@ class VerilogGenerator(LogStructuring):
 
     # This method modifies the module AST node to add observe ports and assignments
     def addModuleWiseLogicForObservation(self, moduleNode, signalToObserve, sruDriverList):
-        assignmentList, observePortIndexLastInt = self.createInternalObserveTaps(signalToObserve, sruDriverList)
+        assignmentList, observePortIndexLastInt = self.createInternalObserveTaps(signalToObserve, sruDriverList, moduleNode.name)
         if observePortIndexLastInt  >= 0:
             observePortIntWidth = Width(msb=IntConst(observePortIndexLastInt), lsb=IntConst(0))
             observePortWireInt = Decl((Wire(self.observePort + "_int", width = observePortIntWidth),))
@@ -709,27 +965,266 @@ class VerilogGenerator(LogStructuring):
         moduleDefs = ast.description.definitions
         for moduleDef in moduleDefs:
             if isinstance(moduleDef, ModuleDef):
-                logging.info("Inserting control hooks in module - '%s'" %(moduleDef.name))
-                sruDriverList, ControlWidth = self.addModuleWiseLogicForControl(moduleDef, moduleToSignalToControl[moduleDef.name])
-                moduleToControlWidth.update({moduleDef.name:ControlWidth})
-                logging.info("Control hooks insertion in module '%s' complete"%(moduleDef.name))
-                logging.info("Inserting observation hooks in module - '%s'"%(moduleDef.name))
-                observeWidth = self.addModuleWiseLogicForObservation(moduleDef, moduleToSignalToObserve[moduleDef.name], sruDriverList)
+                with profiler.stage("module:%s"%(moduleDef.name)):
+                    observeWidth, controlWidth = self.stageOneModule(moduleDef,                                  \
+                                                                     moduleToSignalToObserve[moduleDef.name],    \
+                                                                     moduleToSignalToControl[moduleDef.name])
                 moduleToObserveWidth.update({moduleDef.name:observeWidth})
-                logging.info("Observation hooks insertion in module '%s' complete"%(moduleDef.name))
+                moduleToControlWidth.update({moduleDef.name:controlWidth})
         return moduleToObserveWidth, moduleToControlWidth
+
+    # Intra module hooks of a single module (independent of all other modules). Returns (OBSERVE_WIDTH, CONTROL_WIDTH)
+    def stageOneModule(self, moduleDef, signalToObserve, signalToControl):
+        stageOneLog.info("Inserting control hooks in module - '%s'", moduleDef.name)
+        sruDriverList, controlWidth = self.addModuleWiseLogicForControl(moduleDef, signalToControl)
+        stageOneLog.info("Control hooks insertion in module '%s' complete", moduleDef.name, \
+                         extra = logEvent(module = moduleDef.name, action = "controlHooks", widths = {"control": controlWidth}))
+        stageOneLog.info("Inserting observation hooks in module - '%s'", moduleDef.name)
+        observeWidth = self.addModuleWiseLogicForObservation(moduleDef, signalToObserve, sruDriverList)
+        stageOneLog.info("Observation hooks insertion in module '%s' complete", moduleDef.name, \
+                         extra = logEvent(module = moduleDef.name, action = "observeHooks", widths = {"observe": observeWidth}))
+        return observeWidth, controlWidth
     
+    # Module to AST hash map - built on first use (the first definition of a module wins)
+    def moduleMap(self):
+        if self.moduleToAst is None:
+            self.moduleToAst = {}
+            for file in self.fileToModuleToSignalToObserve:
+                ast = self.filewiseAst[file]
+                for definition in ast.description.definitions:
+                    if isinstance(definition, ModuleDef):
+                        self.moduleToAst.setdefault(definition.name, definition)
+        return self.moduleToAst
+
     # Returns AST for a module (if it exists): Else returns None
     def getAstForModule(self, moduleName):
-        for file in self.fileToModuleToSignalToObserve:
-            ast = self.filewiseAst[file]
-            for definition in ast.description.definitions:
-                if isinstance(definition, ModuleDef):
-                    if definition.name == moduleName:
-                        return definition
-        return None
+        return self.moduleMap().get(moduleName)
+
+    # Instances of every defined module - {<MODULE>:[(<INSTANCE>, <MODULE>)]}
+    def moduleInstanceMap(self):
+        return {moduleName: moduleInstances(moduleDef) for moduleName, moduleDef in self.moduleMap().items()}
+
+    # Computes the pragma reachability bit of every module (Must run after stage 1)
+    # Pragma free subtrees are skipped by stage 2 and signal map generation, their files are copied through by code generation
+    def computePragmaReachability(self):
+        self.moduleHasPragma = pragmaReachability(self.moduleInstanceMap(),       \
+                                                  self.moduleToSignalToObserve,   \
+                                                  self.moduleToSignalToControl)
+        logging.info("Pragma reachability - %d of %d modules have observe/control pragmas in their subtree"%(sum(self.moduleHasPragma.values()), \
+                                                                                                           len(self.moduleHasPragma)))
+
+    # Observe pipeline latency per module - {<MODULE>:<STAGES>} for pipelined modules with an observe port
+    def observeLatency(self):
+        return {moduleName: stages for moduleName, stages in self.observePipeline.items() \
+                if stages > 0 and self.moduleToObservePortWidth.get(moduleName, 0) > 0}
+
+    # Returns False for modules whose subtree carries no pragma (True if reachability is not computed yet)
+    def isInstrumented(self, moduleName):
+        return self.moduleHasPragma.get(moduleName, True)
+
+    # A file is regenerated only if one of its modules is instrumented (directly or through its instances)
+    def isFileTouched(self, ast):
+        return any(self.isInstrumented(definition.name) for definition in ast.description.definitions \
+                   if isinstance(definition, ModuleDef))
+    
+    # Drives the observe port of a module from <rhs>
+    # -- Default         : assign <observePort> = <rhs>
+    # -- Pipelined module: <rhs> passes through the configured # of register stages on the pipeline clock -
+    #                      always @(posedge <clk>) begin
+    #                        <observePort>_pipe_1 <= <rhs>; ... <observePort>_pipe_<S> <= <observePort>_pipe_<S-1>;
+    #                      end
+    #                      assign <observePort> = <observePort>_pipe_<S>
+    def driveObservePort(self, moduleDef, items, rhs, width):
+        stages = self.observePipeline.get(moduleDef.name, 0)
+        if stages > 0:
+            portNames = [port.first.name if isinstance(port, Ioport) else port.name for port in moduleDef.portlist.ports]
+            if self.pipelineClock not in portNames:
+                logging.error("Module '%s' has no clock port '%s' to pipeline the observe port"%(moduleDef.name, self.pipelineClock))
+                raise HookInsertionError("Cannot pipeline observe port of module '%s': no clock port '%s'"%(moduleDef.name, \
+                                                                                                          self.pipelineClock))
+            stageTwoLog.info("-- Pipelining observe port of module '%s' with %d register stage(s)", moduleDef.name, stages)
+            pipeWidth = Width(msb = IntConst(width - 1), lsb = IntConst(0))
+            declarations  = []
+            substitutions = []
+            for stage in range(1, stages + 1):
+                declarations.append(Decl((Reg(self.observePort + "_pipe_%d"%(stage), width = pipeWidth),)))
+                substitutions.append(NonblockingSubstitution(Lvalue(Identifier(self.observePort + "_pipe_%d"%(stage))), Rvalue(rhs)))
+                rhs = Identifier(self.observePort + "_pipe_%d"%(stage))
+            items[0:0] = declarations
+            items.append(Always(SensList([Sens(Identifier(self.pipelineClock), "posedge")]), Block(substitutions)))
+        items.append(Assign(Identifier(self.observePort), rhs))
+        profiler.count("assignsEmitted")
+
+    # Hooks up the observe/control ports of a single module - instance port maps, <port>_inst wires,
+    # <port> assignments and the module IO ports. The final port widths of all child modules must
+    # already be known (self.moduleTo*PortWidth). Updates the port widths of this module.
+    def insertModuleHooks(self, moduleDef, childModules, moduleToObserveWidth, moduleToControlWidth):
+        moduleName = moduleDef.name
+        # Tracker for width of observe/control ports hooked up in each instance within the module
+        controlPortInstIndex = 0
+        observePortInstIndex = 0
+        # Get the AST for the current module being processed
+        items = list(moduleDef.items)
+        ports = list(moduleDef.portlist.ports)
+        if childModules:  # Check if this is not a leaf module
+            # Non-leaf module operations - a single pass over the items hooks up all child instances
+            # (in source order, which is the instance order of the tree)
+            instanceToModule = dict(childModules)
+            for item in items:
+                if isinstance(item, InstanceList):
+                    instances = item.instances
+                    for instance in instances:
+                        if isinstance(instance, Instance) and instance.name in instanceToModule:
+                            childModule = (instance.name, instanceToModule[instance.name])
+                            stageTwoLog.info("--- Adding instance hooks for child module instance '%s(%s)' of module '%s'", childModule[0], \
+                                             childModule[1], moduleName)
+                            # Pragma free children are not in the port width maps
+                            childObserveWidth = self.moduleToObservePortWidth.get(childModule[1], 0)
+                            childControlWidth = self.moduleToControlPortWidth.get(childModule[1], 0)
+                            # Ports in the instance portlist
+                            instancePorts = list(instance.portlist)
+                            if childObserveWidth > 0:
+                                # Port-Mapping for observe port
+                                lhs = self.observePort
+                                Rhs = Partselect(Identifier(self.observePort + "_inst"),                                                      \
+                                                 msb = IntConst(observePortInstIndex + childObserveWidth - 1),    \
+                                                 lsb = IntConst(observePortInstIndex))
+                                
+                                instancePorts.append(PortArg(lhs,Rhs))
+                                observePortInstIndex += childObserveWidth
+                            if childControlWidth > 0:
+                                # Port-Mapping for ControlIn port
+                                lhs = self.controlPortIn
+                                Rhs = Partselect(Identifier(self.controlPortIn + "_inst"),                                                    \
+                                                 msb = IntConst(controlPortInstIndex + childControlWidth - 1),    \
+                                                 lsb = IntConst(controlPortInstIndex))
+                                instancePorts.append(PortArg(lhs,Rhs))
+                                # Port-Mapping for ControlOut port
+                                lhs = self.controlPortOut
+                                Rhs = Partselect(Identifier(self.controlPortOut + "_inst"),                                                   \
+                                                 msb = IntConst(controlPortInstIndex + childControlWidth - 1),    \
+                                                 lsb = IntConst(controlPortInstIndex))
+                                instancePorts.append(PortArg(lhs,Rhs))
+                                controlPortInstIndex += childControlWidth
+                            instance.portlist = tuple(instancePorts)
+        # The mmodule has both internal and instance-wise observe ports
+        if observePortInstIndex > 0 and moduleToObserveWidth[moduleName] > 0:
+            stageTwoLog.info("-- Module '%s' has both internal and instance-wise observe hooks - Concatenating them to the module observe port", moduleName)
+            # Declare <observePort>_inst wire
+            observePortInstWidth = Width(msb = IntConst(observePortInstIndex - 1), lsb = IntConst(0))
+            items.insert(0, Decl((Wire(self.observePort + "_inst", width = observePortInstWidth),)))
+            # Add assignment: assign <observePort> = {<obervePort>_int, <observePort>_inst}
+            concatWireOne = Identifier(self.observePort + "_int")
+            concatWireTwo = Identifier(self.observePort + "_inst")
+            rhs = Concat([concatWireOne, concatWireTwo])
+            self.driveObservePort(moduleDef, items, rhs, observePortInstIndex + moduleToObserveWidth[moduleName])
+        # The module has instance-wise but no internal observe ports
+        elif observePortInstIndex > 0 and moduleToObserveWidth[moduleName] == 0:
+            stageTwoLog.info("-- Module '%s' has only observe hooks from instances - Assigning them to the module observe port", moduleName)
+            # Declare <observePort>_inst wire
+            observePortInstWidth = Width(msb = IntConst(observePortInstIndex - 1), lsb = IntConst(0))
+            items.insert(0, Decl((Wire(self.observePort + "_inst", width = observePortInstWidth),)))
+            # Add assignment: assign <observePort> = <observePort>_inst
+            rhs = Identifier(self.observePort + "_inst")
+            self.driveObservePort(moduleDef, items, rhs, observePortInstIndex + moduleToObserveWidth[moduleName])
+
+        # The module has internal but no instance-wise observe ports
+        elif observePortInstIndex == 0 and moduleToObserveWidth[moduleName] > 0:
+            stageTwoLog.info("-- Module '%s' has only internal observe hooks - Assigning them to the module observe port", moduleName)
+            # Add assignment: assign <observePort> = <observePort>_int
+            rhs = Identifier(self.observePort + "_int")
+            self.driveObservePort(moduleDef, items, rhs, observePortInstIndex + moduleToObserveWidth[moduleName])
+
+        else:
+            stageTwoLog.info("-- Module '%s' has neither internal not instance-wise observe hooks", moduleName)
+
+        # The module has both internal and instance-wise control ports
+        if controlPortInstIndex > 0 and moduleToControlWidth[moduleName] > 0:
+            stageTwoLog.info("-- Module '%s' has both internal and instance-wise control hooks - Concatenating them to the module control port", moduleName)
+            # Declare wire <controlPortIn_inst>
+            controlPortInstWidth = Width(msb = IntConst(controlPortInstIndex - 1), lsb = IntConst(0))
+            items.insert(0, Decl((Wire(self.controlPortIn + "_inst", width = controlPortInstWidth),)))
+            # Add assignment assign <controlPortIn> = {<controlPortIn>_int, <controlPortIn>_inst}
+            lhs = Identifier(self.controlPortIn)
+            concatWireOne = Identifier(self.controlPortIn + "_int")
+            concatWireTwo = Identifier(self.controlPortIn + "_inst")
+            rhs = Concat([concatWireOne, concatWireTwo])
+            items.append(Assign(lhs, rhs))
+            profiler.count("assignsEmitted")
+            # Declare wire <controlPortOut_inst>
+            items.insert(0, Decl((Wire(self.controlPortOut + "_inst", width = controlPortInstWidth),)))
+            # Add assignment assign {<controlPortOut>_int, <controlPortOut>_inst} = <controlPortOut>
+            concatWireOne = Identifier(self.controlPortOut + "_int")
+            concatWireTwo = Identifier(self.controlPortOut + "_inst")
+            lhs = Concat([concatWireOne, concatWireTwo])
+            rhs = Identifier(self.controlPortOut)
+            items.append(Assign(lhs, rhs))
+            profiler.count("assignsEmitted")
+
+        # The module has instance-wise but no internal control ports
+        elif controlPortInstIndex > 0 and moduleToControlWidth[moduleName] == 0:
+            stageTwoLog.info("-- Module '%s' has only control hooks from instances - Assigning them to the module control port", moduleName)
+            # Declare wire <controlPortIn_inst>
+            controlPortInstWidth = Width(msb = IntConst(controlPortInstIndex - 1), lsb = IntConst(0))
+            items.insert(0, Decl((Wire(self.controlPortIn + "_inst", width = controlPortInstWidth),)))
+            # Add assignment assign <controlPortIn> = <controlPortIn>_inst
+            lhs = Identifier(self.controlPortIn)
+            rhs = Identifier(self.controlPortIn + "_inst")
+            items.append(Assign(lhs, rhs))
+            profiler.count("assignsEmitted")
+            # Declare wire <controlPortOut_inst>
+            items.insert(0, Decl((Wire(self.controlPortOut + "_inst", width = controlPortInstWidth),)))
+            # Add assignment assign <controlPortOut>_inst = <controlPortOut>
+            lhs = Identifier(self.controlPortOut + "_inst")
+            rhs = Identifier(self.controlPortOut)
+            items.append(Assign(lhs, rhs))
+            profiler.count("assignsEmitted")
+
+        # The module has internal but no instance-wise control ports
+        elif controlPortInstIndex == 0 and moduleToControlWidth[moduleName] > 0:
+            stageTwoLog.info("-- Module '%s' has only internal control hooks - Assigning them to the module control port", moduleName)
+            # Add assignment assign <controlPortIn> = <controlPortIn>_int
+            lhs = Identifier(self.controlPortIn)
+            rhs = Identifier(self.controlPortIn + "_int")
+            items.append(Assign(lhs, rhs))
+            profiler.count("assignsEmitted")
+            # Add assignment assign <controlPortOut> = <controlPortOut>_int
+            lhs = Identifier(self.controlPortOut + "_int")
+            rhs = Identifier(self.controlPortOut)
+            items.append(Assign(lhs, rhs))
+            profiler.count("assignsEmitted")
+        else:
+            stageTwoLog.info("-- Module '%s' has neither internal nor instance-wise control hooks", moduleName)
+
+        moduleDef.items = tuple(items)
+
+        # Final observe/control port width     
+        self.moduleToObservePortWidth[moduleName] = observePortInstIndex + moduleToObserveWidth[moduleName]
+        self.moduleToControlPortWidth[moduleName] = controlPortInstIndex + moduleToControlWidth[moduleName]
+        stageTwoLog.info("Module '%s' hooks - observe port %d bits, control port %d bits", moduleName,             \
+                         self.moduleToObservePortWidth[moduleName], self.moduleToControlPortWidth[moduleName],    \
+                         extra = logEvent(module = moduleName, action = "moduleHooks",                           \
+                                          widths = {"observe"        : self.moduleToObservePortWidth[moduleName], \
+                                                    "control"        : self.moduleToControlPortWidth[moduleName], \
+                                                    "observeInternal": moduleToObserveWidth[moduleName],          \
+                                                    "controlInternal": moduleToControlWidth[moduleName]}))
+        
+        # IO Port declaration for the current module
+        if observePortInstIndex != 0 or moduleToObserveWidth[moduleName] != 0: 
+            stageTwoLog.info("-- Inserting primary observe port in module '%s'", moduleName)
+            observePortTotalWidth = Width(msb = IntConst(self.moduleToObservePortWidth[moduleName]-1), lsb = IntConst(0))
+            observePortOutput = Ioport(Output(self.observePort, width = observePortTotalWidth))
+            ports.append(observePortOutput)
+            moduleDef.portlist.ports = tuple(ports)
+        if  controlPortInstIndex != 0 or moduleToControlWidth[moduleName] != 0:
+            stageTwoLog.info("-- Inserting primary control port in module '%s'", moduleName)
+            controlPortTotalWidth = Width(msb = IntConst(self.moduleToControlPortWidth[moduleName]-1), lsb = IntConst(0))
+            controlPortOutput = Ioport(Output(self.controlPortIn, width =controlPortTotalWidth))
+            controlPortInput  = Ioport(Input(self.controlPortOut, width =controlPortTotalWidth))
+            ports.extend([controlPortOutput, controlPortInput])
+            moduleDef.portlist.ports = tuple(ports)
     
-    # Recursive method to insert control/observe hooks in the instantiation hierarchy
+    # Inserts control/observe hooks in the instantiation hierarchy
     # Sample Instance Tree - {(TOP, Sample):{(inst1, Or):None, (inst2, And):None}}
     #            (TOP, Sample)     
     #                 /\
@@ -740,181 +1235,17 @@ class VerilogGenerator(LogStructuring):
     #            None    None
     # In the above tree, top-module Sample has an instance each of Or and And modules, which are leaf instances
     # Node with value - None indicates a leaf module
-    def insertInterModuleHooks(self, moduleNode, treeNode, 
-                                                 moduleToObserveWidth,  \
-                                                 moduleToControlWidth):   
-        if moduleNode is not None:
-            # The moduleNode is the current module being processed
-            # The value of treeNode[moduleNode] are the instances of other modules within that module
-            childModules = treeNode[moduleNode]
-            # Tracker for width of observe/control ports hooked up in each instance within the module
-            controlPortInstIndex = 0
-            observePortInstIndex = 0
-            # Get the AST for the current module being processed
-            items = list(self.getAstForModule(moduleNode[1]).items)
-            ports = list(self.getAstForModule(moduleNode[1]).portlist.ports)
-            if childModules is not None:  # Check if this is not a leaf module
-                # Non-leaf module operations
-                for childModule in childModules:
-                    logging.info("--- Adding instance hooks for child module instance '%s(%s)' of module '%s'" %(childModule[0], childModule[1], \
-                                                                                                                 moduleNode[1]))
-                    # Recurse through child instances before hooking up ports (only if it has not been traversed before
-                    # no prevent duplicate hooks)
-                    # This would update the controlPortWidth and observePortWidth 
-                    if childModule[1] not in self.moduleToControlPortWidth and \
-                       childModule[1] not in self.moduleToObservePortWidth:
-                        self.insertInterModuleHooks(childModule, {childModule: treeNode[moduleNode][childModule]},  \
-                                                                  moduleToObserveWidth,                             \
-                                                                  moduleToControlWidth)
-
-                    for item in items:
-                        if isinstance(item, InstanceList):
-                            instances = item.instances
-                            for instance in instances:
-                                if isinstance(instance, Instance):
-                                    # Ports in the instance portlist
-                                    instancePorts = list(instance.portlist)
-                                    if instance.name == childModule[0] and self.moduleToObservePortWidth[childModule[1]] > 0:
-                                        # Port-Mapping for observe port
-                                        lhs = self.observePort
-                                        Rhs = Partselect(Identifier(self.observePort + "_inst"),                                                      \
-                                                         msb = IntConst(observePortInstIndex + self.moduleToObservePortWidth[childModule[1]] - 1),    \
-                                                         lsb = IntConst(observePortInstIndex))
-                                        
-                                        instancePorts.append(PortArg(lhs,Rhs))
-                                        observePortInstIndex += self.moduleToObservePortWidth[childModule[1]]
-                                    if instance.name == childModule[0] and self.moduleToControlPortWidth[childModule[1]] > 0:
-                                        # Port-Mapping for ControlIn port
-                                        lhs = self.controlPortIn
-                                        Rhs = Partselect(Identifier(self.controlPortIn + "_inst"),                                                    \
-                                                         msb = IntConst(controlPortInstIndex + self.moduleToControlPortWidth[childModule[1]] - 1),    \
-                                                         lsb = IntConst(controlPortInstIndex))
-                                        instancePorts.append(PortArg(lhs,Rhs))
-                                        # Port-Mapping for ControlOut port
-                                        lhs = self.controlPortOut
-                                        Rhs = Partselect(Identifier(self.controlPortOut + "_inst"),                                                   \
-                                                         msb = IntConst(controlPortInstIndex + self.moduleToControlPortWidth[childModule[1]] - 1),    \
-                                                         lsb = IntConst(controlPortInstIndex))
-                                        instancePorts.append(PortArg(lhs,Rhs))
-                                        controlPortInstIndex += self.moduleToControlPortWidth[childModule[1]]
-                                    instance.portlist = tuple(instancePorts)
-            # The mmodule has both internal and instance-wise observe ports
-            if observePortInstIndex > 0 and moduleToObserveWidth[moduleNode[1]] > 0:
-                logging.info("-- Module '%s' has both internal and instance-wise observe hooks - Concatenating them to the module observe port" %(moduleNode[1]))
-                # Declare <observePort>_inst wire
-                observePortInstWidth = Width(msb = IntConst(observePortInstIndex - 1), lsb = IntConst(0))
-                items.insert(0, Decl((Wire(self.observePort + "_inst", width = observePortInstWidth),)))
-                # Add assignment: assign <observePort> = {<obervePort>_int, <observePort>_inst}
-                lhs = Identifier(self.observePort)
-                concatWireOne = Identifier(self.observePort + "_int")
-                concatWireTwo = Identifier(self.observePort + "_inst")
-                rhs = Concat([concatWireOne, concatWireTwo])
-                items.append(Assign(lhs, rhs))
-                self.getAstForModule(moduleNode[1]).items = tuple(items)
-            # The module has instance-wise but no internal observe ports
-            elif observePortInstIndex > 0 and moduleToObserveWidth[moduleNode[1]] == 0:
-                logging.info("-- Module '%s' has only observe hooks from instances - Assigning them to the module observe port" %(moduleNode[1]))
-                # Declare <observePort>_inst wire
-                observePortInstWidth = Width(msb = IntConst(observePortInstIndex - 1), lsb = IntConst(0))
-                items.insert(0, Decl((Wire(self.observePort + "_inst", width = observePortInstWidth),)))
-                # Add assignment: assign <observePort> = <observePort>_inst
-                lhs = Identifier(self.observePort)
-                rhs = Identifier(self.observePort + "_inst")
-                items.append(Assign(lhs, rhs))
-                self.getAstForModule(moduleNode[1]).items = tuple(items)
-
-            # The module has internal but no instance-wise observe ports
-            elif observePortInstIndex == 0 and moduleToObserveWidth[moduleNode[1]] > 0:
-                logging.info("-- Module '%s' has only internal observe hooks - Assigning them to the module observe port" %(moduleNode[1]))
-                # Add assignment: assign <observePort> = <observePort>_int
-                lhs = Identifier(self.observePort)
-                rhs = Identifier(self.observePort + "_int")
-                items.append(Assign(lhs, rhs))  
-                self.getAstForModule(moduleNode[1]).items = tuple(items)  
-
-            else:
-                logging.info("-- Module '%s' has neither internal not instance-wise observe hooks" %(moduleNode[1]))
-
-            # The module has both internal and instance-wise control ports
-            if controlPortInstIndex > 0 and moduleToControlWidth[moduleNode[1]] > 0:
-                logging.info("-- Module '%s' has both internal and instance-wise control hooks - Concatenating them to the module control port" %(moduleNode[1]))
-                # Declare wire <controlPortIn_inst>
-                controlPortInstWidth = Width(msb = IntConst(controlPortInstIndex - 1), lsb = IntConst(0))
-                items.insert(0, Decl((Wire(self.controlPortIn + "_inst", width = controlPortInstWidth),)))
-                # Add assignment assign <controlPortIn> = {<controlPortIn>_int, <controlPortIn>_inst}
-                lhs = Identifier(self.controlPortIn)
-                concatWireOne = Identifier(self.controlPortIn + "_int")
-                concatWireTwo = Identifier(self.controlPortIn + "_inst")
-                rhs = Concat([concatWireOne, concatWireTwo])
-                items.append(Assign(lhs, rhs))
-                # Declare wire <controlPortOut_inst>
-                items.insert(0, Decl((Wire(self.controlPortOut + "_inst", width = controlPortInstWidth),)))
-                # Add assignment assign {<controlPortOut>_int, <controlPortOut>_inst} = <controlPortOut>
-                concatWireOne = Identifier(self.controlPortOut + "_int")
-                concatWireTwo = Identifier(self.controlPortOut + "_inst")
-                lhs = Concat([concatWireOne, concatWireTwo])
-                rhs = Identifier(self.controlPortOut)
-                items.append(Assign(lhs, rhs))
-                self.getAstForModule(moduleNode[1]).items = tuple(items)
-
-            # The module has instance-wise but no internal control ports
-            elif controlPortInstIndex > 0 and moduleToControlWidth[moduleNode[1]] == 0:
-                logging.info("-- Module '%s' has only control hooks from instances - Assigning them to the module control port" %(moduleNode[1]))
-                # Declare wire <controlPortIn_inst>
-                controlPortInstWidth = Width(msb = IntConst(controlPortInstIndex - 1), lsb = IntConst(0))
-                items.insert(0, Decl((Wire(self.controlPortIn + "_inst", width = controlPortInstWidth),)))
-                # Add assignment assign <controlPortIn> = <controlPortIn>_inst
-                lhs = Identifier(self.controlPortIn)
-                rhs = Identifier(self.controlPortIn + "_inst")
-                items.append(Assign(lhs, rhs))
-                # Add assignment assign <controlPortOut> = <controlPortOut>_inst
-                lhs = Identifier(self.controlPortOut + "_inst")
-                rhs = Identifier(self.controlPortOut)
-                items.append(Assign(lhs, rhs))
-
-            # The module has internal but no instance-wise control ports
-            elif controlPortInstIndex == 0 and moduleToControlWidth[moduleNode[1]] > 0:
-                logging.info("-- Module '%s' has only internal control hooks - Assigning them to the module control port" %(moduleNode[1]))
-                # Add assignment assign <controlPortIn> = <controlPortIn>_int
-                lhs = Identifier(self.controlPortIn)
-                rhs = Identifier(self.controlPortIn + "_int")
-                items.append(Assign(lhs, rhs))
-                # Add assignment assign <controlPortOut> = <controlPortOut>_int
-                lhs = Identifier(self.controlPortOut + "_int")
-                rhs = Identifier(self.controlPortOut)
-                items.append(Assign(lhs, rhs))
-            else:
-                logging.info("-- Module '%s' has neither internal nor instance-wise control hooks" %(moduleNode[1]))
-
-            # Final observe/control port width     
-            self.moduleToObservePortWidth[moduleNode[1]] = observePortInstIndex + moduleToObserveWidth[moduleNode[1]]
-            self.moduleToControlPortWidth[moduleNode[1]] = controlPortInstIndex + moduleToControlWidth[moduleNode[1]]
-            
-            # IO Port declaration for the current module
-            if observePortInstIndex != 0 or moduleToObserveWidth[moduleNode[1]] != 0: 
-                logging.info("-- Inserting primary observe port in module '%s'" %(moduleNode[1]))
-                observePortTotalWidth = Width(msb = IntConst(self.moduleToObservePortWidth[moduleNode[1]]-1), lsb = IntConst(0))
-                observePortOutput = Ioport(Output(self.observePort, width = observePortTotalWidth))
-                ports.append(observePortOutput)
-                self.getAstForModule(moduleNode[1]).portlist.ports = tuple(ports)
-            if  controlPortInstIndex != 0 or moduleToControlWidth[moduleNode[1]] != 0:
-                logging.info("-- Inserting primary control port in module '%s'" %(moduleNode[1]))
-                controlPortTotalWidth = Width(msb = IntConst(self.moduleToControlPortWidth[moduleNode[1]]-1), lsb = IntConst(0))
-                controlPortOutput = Ioport(Output(self.controlPortIn, width =controlPortTotalWidth))
-                controlPortInput  = Ioport(Input(self.controlPortOut, width =controlPortTotalWidth))
-                ports.extend([controlPortOutput, controlPortInput])
-                self.getAstForModule(moduleNode[1]).portlist.ports = tuple(ports)
-            
-        else:
-            return
-    
+    # Modules are wired up once each, children before parents (the port widths of a module depend on the
+    # final port widths of the modules it instantiates), so the pass is linear in modules + instances
+    # Subtrees without pragmas are not visited - they get no hooks
     def stageTwoFileModifier(self, moduleToObserveWidth, moduleToControlWidth):
-        # Top module node in instance tree
-        topModuleNode = ("TOP", self.topModule)
-        self.insertInterModuleHooks(moduleNode           = topModuleNode,        \
-                                    treeNode             = self.instanceTree,    \
-                                    moduleToControlWidth = moduleToControlWidth, \
-                                    moduleToObserveWidth = moduleToObserveWidth)
+        with profiler.stage("stageTwo"):
+            self.computePragmaReachability()
+            for moduleName, childModules in modulePostOrder(self.instanceTree, self.isInstrumented):
+                self.insertModuleHooks(self.getAstForModule(moduleName), \
+                                       childModules,                      \
+                                       moduleToObserveWidth,              \
+                                       moduleToControlWidth)
         
     # Method to generate the observe/control signal list  
     # This list is used by ASAP compiler to generate bitstream  
@@ -925,17 +1256,13 @@ class VerilogGenerator(LogStructuring):
             observeSignals = moduleToObserveSignal[currentModule[1]]
             controlSignals = moduleToControlSignal[currentModule[1]]
 
-            # First: Update the list with all the signals in the current module being processed
-            for signal in observeSignals:
-                observeSignalList.update({signal:[observeSignals[signal][0] - observeSignals[signal][1] + observeIndex, observeIndex]})
-                observeIndex +=  observeSignals[signal][0] - observeSignals[signal][1] + 1
-            for signal in controlSignals:
-                controlSignalList.update({signal:[controlSignals[signal][1] - controlSignals[signal][2] + controlIndex, controlIndex]})
-                controlIndex +=  controlSignals[signal][1] - controlSignals[signal][2] + 1
-            
-            # Second: Update the list with signals of internal instances sequentially (use recursion)
+            # First: Update the list with signals of internal instances sequentially (use recursion)
+            # Instance hooks occupy the lower bits of a module port - <port> = {<port>_int, <port>_inst}
             if treeNode[currentModule] is not None:
                 for child in treeNode[currentModule]:
+                    # Pragma free subtrees contribute no signals
+                    if not self.isInstrumented(child[1]):
+                        continue
                     observeChild, controlChild,                                              \
                     observeIndex, controlIndex = self.getSignalList(treeNode[currentModule], \
                                                                     child,                   \
@@ -945,6 +1272,14 @@ class VerilogGenerator(LogStructuring):
                                                                     controlIndex)
                     observeSignalList.update(observeChild)
                     controlSignalList.update(controlChild)
+
+            # Second: Update the list with all the signals in the current module being processed
+            for signal in observeSignals:
+                observeSignalList.update({signal:[observeSignals[signal][0] - observeSignals[signal][1] + observeIndex, observeIndex]})
+                observeIndex +=  observeSignals[signal][0] - observeSignals[signal][1] + 1
+            for signal in controlSignals:
+                controlSignalList.update({signal:[controlSignals[signal][1] - controlSignals[signal][2] + controlIndex, controlIndex]})
+                controlIndex +=  controlSignals[signal][1] - controlSignals[signal][2] + 1
             return {currentModule[0]:observeSignalList}, {currentModule[0]:controlSignalList}, observeIndex, controlIndex
         else:
             return None, None
@@ -960,21 +1295,13 @@ class VerilogGenerator(LogStructuring):
     #
     # Stage 1: Intra module insertion inserts patch hooks for signal observed/controlled within module
     # Stage 2: Inter module insertion connects up patch hooks between module hierarchies
-    def astModifier(self):
-        moduleToObserveWidth = {}
-        moduleToControlWidth = {}
-        consolidatedModuletoSignalToObserve = {}
-        consolidatedModuletoSignalToControl = {}
+    # -- workers : # of worker processes for stage 1 (modules are fanned out across them)
+    def astModifier(self, workers = 1):
         # STAGE - 1 (Intra module hook insertion)
-        for file in self.fileToModuleToSignalToObserve :
-            logging.info("Stage 1 AST modification: Inserting internal observe/control hooks in file - %s" %(file))
-            moduleToObserveWidthPerFile, moduleToControlWidthPerFile =  self.stageOneFileModifier(file, self.fileToModuleToSignalToObserve[file], 
-                                                                                                        self.fileToModuleToSignalToControl[file])
-            logging.info("Stage 1 AST modification complete")
-            moduleToObserveWidth.update(moduleToObserveWidthPerFile)
-            moduleToControlWidth.update(moduleToControlWidthPerFile)
-            consolidatedModuletoSignalToObserve.update(self.fileToModuleToSignalToObserve[file])
-            consolidatedModuletoSignalToControl.update(self.fileToModuleToSignalToControl[file])
+        if workers > 1:
+            moduleToObserveWidth, moduleToControlWidth = self.parallelStageOneModifier(workers)
+        else:
+            moduleToObserveWidth, moduleToControlWidth = self.stageOneModifier()
 
         # STAGE - 2 (Inter module hook insertion)   
         logging.info("Stage 2 AST modification: Connecting cross-module observe/control hooks")
@@ -983,52 +1310,367 @@ class VerilogGenerator(LogStructuring):
         logging.info("Stage 2 AST modification complete")
 
         # Generate signalMap
-        observeSignalList, controlSignalList, observeWidth, controlWidth = self.getSignalList(self.instanceTree,                    \
-                                                                                              ("TOP", self.topModule),              \
-                                                                                              consolidatedModuletoSignalToObserve,  \
-                                                                                              consolidatedModuletoSignalToControl)
-        logging.info("Net width of control signal = %d"%(controlWidth))
-        logging.info("Net width of observe signal = %d"%(observeWidth))
-        return observeSignalList, controlSignalList
+        return self.generateSignalMap()
 
-    def genModifiedVerilogFile(self, file):
+    # Stage 1 over all files in the filelist
+    # Returns the module-wise internal observe/control widths consumed by stage 2 and consolidates
+    # the module-wise pragma maps (across files) used for signal map generation
+    def stageOneModifier(self):
+        moduleToObserveWidth = {}
+        moduleToControlWidth = {}
+        self.moduleToSignalToObserve = {}
+        self.moduleToSignalToControl = {}
+        for file in self.fileToModuleToSignalToObserve :
+            logging.info("Stage 1 AST modification: Inserting internal observe/control hooks in file - %s" %(file))
+            with profiler.stage("stageOne"), profiler.stage("file:%s"%(file)):
+                moduleToObserveWidthPerFile, moduleToControlWidthPerFile =  self.stageOneFileModifier(file, self.fileToModuleToSignalToObserve[file], 
+                                                                                                            self.fileToModuleToSignalToControl[file])
+            logging.info("Stage 1 AST modification complete")
+            moduleToObserveWidth.update(moduleToObserveWidthPerFile)
+            moduleToControlWidth.update(moduleToControlWidthPerFile)
+            self.moduleToSignalToObserve.update(self.fileToModuleToSignalToObserve[file])
+            self.moduleToSignalToControl.update(self.fileToModuleToSignalToControl[file])
+        return moduleToObserveWidth, moduleToControlWidth
+
+    # Stage 1 over all files on a worker pool, sharded by module
+    # Each worker gets a module AST and its pragma maps, and returns the modified module AST, its internal
+    # observe/control widths, its log records and its profile. The modifications are copied into the original
+    # module nodes (references to them stay valid) and the results are consumed in file/module order, so the
+    # ASTs, widths, logs and profiler stages/counters are identical to stageOneModifier.
+    # Pickling dominates the cost of an AST round trip, so only modules with pragmas are sent to the workers
+    # (pragma free modules get no hooks and run in place), and forked workers inherit their input ASTs.
+    def parallelStageOneModifier(self, workers):
+        fileToModuleDefs = {file: [definition for definition in self.filewiseAst[file].description.definitions \
+                                   if isinstance(definition, ModuleDef)] for file in self.fileToModuleToSignalToObserve}
+        shards = [(moduleDef, self.fileToModuleToSignalToObserve[file][moduleDef.name], self.fileToModuleToSignalToControl[file][moduleDef.name]) \
+                  for file, moduleDefs in fileToModuleDefs.items() for moduleDef in moduleDefs                                                        \
+                  if self.fileToModuleToSignalToObserve[file][moduleDef.name] or self.fileToModuleToSignalToControl[file][moduleDef.name]]
+        if len(shards) < 2:
+            return self.stageOneModifier()
+        parallelModules = {id(moduleDef) for moduleDef, _, _ in shards}
+        moduleToObserveWidth = {}
+        moduleToControlWidth = {}
+        self.moduleToSignalToObserve = {}
+        self.moduleToSignalToControl = {}
+        ports = (self.observePort, self.controlPortIn, self.controlPortOut)
+        fork = "fork" in multiprocessing.get_all_start_methods()
+        global stageOneShards
+        stageOneShards = shards
+        logging.info("Stage 1 AST modification on %d workers (%d modules with pragmas)"%(workers, len(shards)))
+        try:
+            with profiler.stage("stageOne"), ProcessPoolExecutor(max_workers = min(workers, len(shards)),                   \
+                                                                 mp_context  = multiprocessing.get_context("fork") if fork else None) as pool:
+                results = pool.map(stageOneModuleWorker,                                                 \
+                                   [ports] * len(shards),                                                \
+                                   range(len(shards)) if fork else shards,                               \
+                                   [profiler.enabled] * len(shards),                                     \
+                                   chunksize = max(1, len(shards) // (4 * workers)))
+                for file, moduleDefs in fileToModuleDefs.items():
+                    logging.info("Stage 1 AST modification: Inserting internal observe/control hooks in file - %s" %(file))
+                    with profiler.stage("file:%s"%(file)):
+                        for moduleDef in moduleDefs:
+                            if id(moduleDef) in parallelModules:
+                                modifiedModuleDef, observeWidth, controlWidth, records, profile = next(results)
+                                replayLogRecords(records)
+                                profiler.merge(profile)
+                                moduleDef.__dict__.update(modifiedModuleDef.__dict__)
+                            else:
+                                with profiler.stage("module:%s"%(moduleDef.name)):
+                                    observeWidth, controlWidth = self.stageOneModule(moduleDef,                                                  \
+                                                                                     self.fileToModuleToSignalToObserve[file][moduleDef.name],   \
+                                                                                     self.fileToModuleToSignalToControl[file][moduleDef.name])
+                            moduleToObserveWidth.update({moduleDef.name:observeWidth})
+                            moduleToControlWidth.update({moduleDef.name:controlWidth})
+                    logging.info("Stage 1 AST modification complete")
+                    self.moduleToSignalToObserve.update(self.fileToModuleToSignalToObserve[file])
+                    self.moduleToSignalToControl.update(self.fileToModuleToSignalToControl[file])
+        finally:
+            stageOneShards = None
+        return moduleToObserveWidth, moduleToControlWidth
+
+    # Generates the observe/control signal lists and signal indexes (Must run after stage 1)
+    def generateSignalMap(self):
+        with profiler.stage("signalMap"):
+            observeSignalList, controlSignalList, observeWidth, controlWidth = self.getSignalList(self.instanceTree,                    \
+                                                                                                  ("TOP", self.topModule),              \
+                                                                                                  self.moduleToSignalToObserve,         \
+                                                                                                  self.moduleToSignalToControl)
+            logging.info("Net width of control signal = %d"%(controlWidth))
+            logging.info("Net width of observe signal = %d"%(observeWidth))
+
+            # Generate hierarchical path index for patch variable resolution
+            # signalToObserve - {<SIGNAL>:(START_INDEX, END_INDEX)}
+            # signalToControl - {<SIGNAL>:(CONTROL_TYPE, START_INDEX, END_INDEX)}
+            self.observeSignalIndex = SignalIndex.fromInstanceTree(self.instanceTree,                     \
+                                                                   ("TOP", self.topModule),               \
+                                                                   self.moduleToSignalToObserve,          \
+                                                                   lambda observe: (observe[0], observe[1]), \
+                                                                   moduleFilter  = self.isInstrumented,   \
+                                                                   moduleLatency = self.observeLatency())
+            self.controlSignalIndex = SignalIndex.fromInstanceTree(self.instanceTree,                     \
+                                                                   ("TOP", self.topModule),               \
+                                                                   self.moduleToSignalToControl,          \
+                                                                   lambda control: (control[1], control[2]), \
+                                                                   moduleFilter = self.isInstrumented)
+            logging.info("Signal index generated - %d observable and %d controllable signals"%(len(self.observeSignalIndex), \
+                                                                                              len(self.controlSignalIndex)))
+            return observeSignalList, controlSignalList
+
+    def genModifiedVerilogFile(self, file, streaming = False):
         logging.info("Generating modified verilog files...")
-        codegen = ASTCodeGenerator()
-        newFilename = os.path.splitext(file)[0] + "_patch.v"
-        verilogCode = codegen.visit(self.filewiseAst[file])
-        with open(newFilename, "w") as f:
-            f.write(str(verilogCode))
-        logging.info("File write completed.")
+        with profiler.stage("codegen"), profiler.stage("file:%s"%(file)):
+            newFilename = renderVerilogFile(file, self.filewiseAst[file], streaming)
+        logging.info("File write completed - %s"%(newFilename))
+
+    def copyUntouchedVerilogFile(self, file):
+        newFilename = copyVerilogFile(file)
+        logging.info("No patch hooks in file - %s. Skipping code generation (source copied to %s)"%(file, newFilename))
     
     # This method generates new verilog code for each file in the filelist
-    def generateVerilog(self):
+    # -- workers   : # of worker processes used for stage 1 (modules) and code generation (files)
+    # -- streaming : Render and write one module at a time instead of one string per file
+    def generateVerilog(self, workers = 1, streaming = False):
         logging.info("Starting cross-module patch hook insertion.....")
-        observeSignalList, controlSignalList = self.astModifier()
+        observeSignalList, controlSignalList = self.astModifier(workers)
         logging.info("Cross module patch hook insertion complete")
+        files = []
         for file in self.fileToModuleToSignalToObserve:
-            self.genModifiedVerilogFile(file)
+            if self.isFileTouched(self.filewiseAst[file]):
+                files.append(file)
+            else:
+                self.copyUntouchedVerilogFile(file)
+        if workers > 1 and len(files) > 1:
+            logging.info("Generating modified verilog files on %d workers..."%(workers))
+            shards = [(file, self.filewiseAst[file]) for file in files]
+            fork = "fork" in multiprocessing.get_all_start_methods()
+            global codegenShards
+            codegenShards = shards
+            try:
+                with profiler.stage("codegen"), ProcessPoolExecutor(max_workers = min(workers, len(files)),                  \
+                                                                    mp_context  = multiprocessing.get_context("fork") if fork else None) as pool:
+                    for newFilename, profile in pool.map(renderVerilogFileWorker,                  \
+                                                         range(len(shards)) if fork else shards,   \
+                                                         [streaming] * len(shards),                \
+                                                         [profiler.enabled] * len(shards)):
+                        profiler.merge(profile)
+                        logging.info("File write completed - %s"%(newFilename))
+            finally:
+                codegenShards = None
+        else:
+            for file in files:
+                self.genModifiedVerilogFile(file, streaming)
         return observeSignalList, controlSignalList 
 
+    # This method writes the design database consumed by the ASAP compiler
+    # Must be called after generateVerilog (needs final port widths and signal indexes)
+    def writeDesignDatabase(self, dbFile):
+        logging.info("Writing design database - %s"%(dbFile))
+        DesignDatabase.write(dbFile,                                                    \
+                             topModule                = self.topModule,                 \
+                             observePort              = self.observePort,               \
+                             controlPortIn            = self.controlPortIn,             \
+                             controlPortOut           = self.controlPortOut,            \
+                             instanceTree             = self.instanceTree,              \
+                             moduleToObservePortWidth = self.moduleToObservePortWidth,  \
+                             moduleToControlPortWidth = self.moduleToControlPortWidth,  \
+                             observeSignalIndex       = self.observeSignalIndex,        \
+                             controlSignalIndex       = self.controlSignalIndex,        \
+                             files                    = self.files)
+        logging.info("Design database write completed.")
+
+
+
+# ****************************************** <LOW MEMORY INSERTION> *****************************************
+# For designs whose ASTs do not fit in memory together. At most one file's AST is resident at a time -
+#   Stage 1 : Parse -> pragma binding -> intra module insertion, one file at a time. Per module only the
+#             internal port widths, the tap lists (pragma maps) and the instance list are kept. The
+#             modified AST is spilled to disk and released.
+#   Stage 2 : Final port widths are computed on the module instance DAG (no AST needed).
+#   Codegen : Each spilled AST is reloaded, its modules are hooked up (stage 2 edits are module local
+#             once the child port widths are known), the file is rendered and the AST is released.
+# The generated verilog and signal maps are identical to VerilogGenerator.
+# *************************************************************************************************************
+class LowMemoryVerilogGenerator(VerilogGenerator):
+    # -- parser   : VerilogParser created with lowMemory = True
+    # -- spillDir : Directory for spilled ASTs (a temporary directory is used and removed if None)
+    # -- observePipeline, pipelineClock : See VerilogGenerator
+    def __init__(self, parser,
+                       topModule,
+                       observePort,
+                       controlPortIn,
+                       controlPortOut,
+                       spillDir        = None,
+                       observePipeline = None,
+                       pipelineClock   = "clk") -> None:
+        super().__init__({}, None, topModule, {}, {}, observePort, controlPortIn, controlPortOut, observePipeline, pipelineClock)
+        self.parser               = parser
+        self.files                = list(parser.fileToPragma)
+        self.spillDir             = spillDir
+        self.fileToSpill          = {}
+        self.moduleToFile         = {}   # {<MODULE>:<FILE>}
+        self.fileToModules        = {}   # {<FILE>:[<MODULE>]}
+        self.moduleToInstances    = {}   # {<MODULE>:[(<INSTANCE>, <MODULE>)]}
+        self.moduleToObserveWidth = {}   # Internal (stage 1) observe width per module
+        self.moduleToControlWidth = {}   # Internal (stage 1) control width per module
+
+    # Writes the AST of a file to the spill directory
+    def spillAst(self, file, ast):
+        spillFile = os.path.join(self.spillDir, "%d.ast"%(len(self.fileToSpill)))
+        with open(spillFile, "wb") as f:
+            pickle.dump(ast, f, protocol = pickle.HIGHEST_PROTOCOL)
+        self.fileToSpill[file] = spillFile
+
+    # Reads back (and removes) the spilled AST of a file
+    def reloadAst(self, file):
+        spillFile = self.fileToSpill.pop(file)
+        with open(spillFile, "rb") as f:
+            ast = pickle.load(f)
+        os.remove(spillFile)
+        return ast
+
+    # Stage 1, file by file. Only one AST is held at any time
+    def stageOneModifier(self):
+        moduleToObserveWidth = {}
+        moduleToControlWidth = {}
+        for file in self.files:
+            logging.info("Stage 1 AST modification (low memory): Inserting internal observe/control hooks in file - %s" %(file))
+            with profiler.stage("parse"):
+                ast = self.parser.parseFile(file)
+            with profiler.stage("pragmaBinding"), profiler.stage("file:%s"%(file)):
+                moduleToSignalToObserve, moduleToSignalToControl = self.parser.signalToPragma(ast, self.parser.fileToPragma.pop(file))
+            self.filewiseAst = {file: ast}
+            with profiler.stage("stageOne"), profiler.stage("file:%s"%(file)):
+                moduleToObserveWidthPerFile, moduleToControlWidthPerFile = self.stageOneFileModifier(file, moduleToSignalToObserve, \
+                                                                                                           moduleToSignalToControl)
+            moduleToObserveWidth.update(moduleToObserveWidthPerFile)
+            moduleToControlWidth.update(moduleToControlWidthPerFile)
+            self.moduleToSignalToObserve.update(moduleToSignalToObserve)
+            self.moduleToSignalToControl.update(moduleToSignalToControl)
+            self.fileToModules[file] = []
+            for definition in ast.description.definitions:
+                if isinstance(definition, ModuleDef):
+                    self.fileToModules[file].append(definition.name)
+                    self.moduleToFile.setdefault(definition.name, file)
+                    self.moduleToInstances.setdefault(definition.name, moduleInstances(definition))
+            self.spillAst(file, ast)
+            self.filewiseAst = {}
+            del ast
+        self.instanceTree = InstantiationTree(self.topModule, {}, self.moduleToInstances).instanceTree
+        logging.info("Instantiation tree generated \n %s"%(self.logTreeInfo(self.instanceTree)))
+        return moduleToObserveWidth, moduleToControlWidth
+
+    # Stage 2 port widths on the instance DAG - <width> = <internal width> + sum(<child module width>)
+    # The AST edits are deferred to code generation (see generateVerilog)
+    def stageTwoFileModifier(self, moduleToObserveWidth, moduleToControlWidth):
+        self.moduleToObserveWidth = moduleToObserveWidth
+        self.moduleToControlWidth = moduleToControlWidth
+        with profiler.stage("stageTwo"):
+            self.computePragmaReachability()
+            for moduleName, children in modulePostOrder(self.instanceTree, self.isInstrumented):
+                self.moduleToObservePortWidth[moduleName] = moduleToObserveWidth[moduleName] + \
+                                                            sum(self.moduleToObservePortWidth.get(child, 0) for _, child in children)
+                self.moduleToControlPortWidth[moduleName] = moduleToControlWidth[moduleName] + \
+                                                            sum(self.moduleToControlPortWidth.get(child, 0) for _, child in children)
+
+    # Instances recorded in stage 1 (no ASTs are resident)
+    def moduleInstanceMap(self):
+        return self.moduleToInstances
+
+    # Inserts hooks, spills and regenerates verilog for each file in the filelist
+    # Files are processed one at a time, so workers is not used in this mode
+    def generateVerilog(self, workers = 1, streaming = True):
+        createdSpillDir = self.spillDir is None
+        if createdSpillDir:
+            self.spillDir = tempfile.mkdtemp(prefix = "asap_spill_")
+        else:
+            os.makedirs(self.spillDir, exist_ok = True)
+        try:
+            logging.info("Starting cross-module patch hook insertion (low memory).....")
+            observeSignalList, controlSignalList = self.astModifier()
+            for file in self.files:
+                if not any(self.isInstrumented(moduleName) for moduleName in self.fileToModules[file]):
+                    self.copyUntouchedVerilogFile(file)
+                    os.remove(self.fileToSpill.pop(file))
+                    continue
+                ast = self.reloadAst(file)
+                with profiler.stage("stageTwo"), profiler.stage("file:%s"%(file)):
+                    for definition in ast.description.definitions:
+                        if isinstance(definition, ModuleDef) and definition.name in self.moduleToObservePortWidth and \
+                           self.moduleToFile[definition.name] == file:
+                            self.insertModuleHooks(definition,                                  \
+                                                   self.moduleToInstances[definition.name],     \
+                                                   self.moduleToObserveWidth,                   \
+                                                   self.moduleToControlWidth)
+                self.filewiseAst = {file: ast}
+                self.genModifiedVerilogFile(file, streaming)
+                self.filewiseAst = {}
+                del ast
+        finally:
+            if createdSpillDir:
+                shutil.rmtree(self.spillDir, ignore_errors = True)
+                self.spillDir = None
+        return observeSignalList, controlSignalList
+
 
 if __name__ == '__main__':
+    argParser = argparse.ArgumentParser(description = "ASAP patch hook insertion")
+    argParser.add_argument("--profile", metavar = "REPORT_JSON", help = "Write a per-stage time/memory/counter report")
+    argParser.add_argument("--trace-memory", action = "store_true", help = "Track per-stage memory with tracemalloc")
+    argParser.add_argument("--cprofile", metavar = "PROFILE_FILE", help = "Dump a cProfile of the run")
+    argParser.add_argument("--low-memory", action = "store_true", help = "Hold one file's AST at a time (ASTs are spilled to disk)")
+    argParser.add_argument("--spill-dir", help = "Directory for spilled ASTs in low-memory mode (default: temporary directory)")
+    argParser.add_argument("--pipeline-observe", metavar = "MODULE[:STAGES]", action = "append", default = [],
+                           help = "Register the observe port of MODULE with STAGES (default 1) pipeline stages (repeatable)")
+    argParser.add_argument("--pipeline-clock", default = "clk", help = "Clock port used by observe pipeline registers")
+    argParser.add_argument("--workers", type = int, default = 1, help = "# of worker processes (stage 1, code generation)")
+    addLoggingArguments(argParser)
+    args = argParser.parse_args()
+    configureLogging(args)
+    if args.profile or args.cprofile:
+        profiler.enable(traceMemory = args.trace_memory, cProfileFile = args.cprofile)
+
     filelist = "filelist.f"
     logging.info("Verilog signal parsing started for filelist %s"%(filelist))
     TOP_MODULE = "Sample"
-    parser = VerilogParser(filelist, TOP_MODULE)
-    fileToModuleToSignalToObserve, fileToModuleToSignalToControl = parser.fileToModuleToSignalToPragma()
-    filewiseAst = parser.fileToAst
     OBSERVE_PORT_NAME = "observe_port"
     CONTROL_PORT_IN_NAME = "control_port_in"
     CONTROL_PORT_OUT_NAME = "control_port_out"
-    TOP_MODULE = "Sample"
-    verilogGenerator = VerilogGenerator(filewiseAst,              \
-                                        parser.tree,              \
-                                        TOP_MODULE,               \
-                                        fileToModuleToSignalToObserve,    \
-                                        fileToModuleToSignalToControl,    \
-                                        OBSERVE_PORT_NAME,        \
-                                        CONTROL_PORT_IN_NAME,     \
-                                        CONTROL_PORT_OUT_NAME)
-    observeSignalList, controlSignalList = verilogGenerator.generateVerilog()
+    observePipeline = {}
+    for boundary in args.pipeline_observe:
+        moduleName, _, stages = boundary.partition(":")
+        observePipeline[moduleName] = int(stages) if stages else 1
+    if args.low_memory:
+        parser = VerilogParser(filelist, TOP_MODULE, lowMemory = True)
+        verilogGenerator = LowMemoryVerilogGenerator(parser,                   \
+                                                     TOP_MODULE,               \
+                                                     OBSERVE_PORT_NAME,        \
+                                                     CONTROL_PORT_IN_NAME,     \
+                                                     CONTROL_PORT_OUT_NAME,    \
+                                                     spillDir        = args.spill_dir,         \
+                                                     observePipeline = observePipeline,        \
+                                                     pipelineClock   = args.pipeline_clock)
+    else:
+        parser = VerilogParser(filelist, TOP_MODULE)
+        fileToModuleToSignalToObserve, fileToModuleToSignalToControl = parser.fileToModuleToSignalToPragma()
+        filewiseAst = parser.fileToAst
+        verilogGenerator = VerilogGenerator(filewiseAst,              \
+                                            parser.tree,              \
+                                            TOP_MODULE,               \
+                                            fileToModuleToSignalToObserve,    \
+                                            fileToModuleToSignalToControl,    \
+                                            OBSERVE_PORT_NAME,        \
+                                            CONTROL_PORT_IN_NAME,     \
+                                            CONTROL_PORT_OUT_NAME,    \
+                                            observePipeline = observePipeline,  \
+                                            pipelineClock   = args.pipeline_clock)
+    observeSignalList, controlSignalList = verilogGenerator.generateVerilog(workers = args.workers)
+    with profiler.stage("designDatabase"):
+        verilogGenerator.writeDesignDatabase(TOP_MODULE + ".asap.db")
+    profiler.disable()
+    if args.profile:
+        profiler.writeReport(args.profile)
+        logging.info("Profile report written to %s"%(args.profile))
+    if peakRss() is not None:
+        logging.info("Peak resident memory - %.1f MiB"%(peakRss() / (1 << 20)))
     print(observeSignalList)
     print(controlSignalList)
\ No newline at end of file
@@ -70,20 +70,9 @@ module Sample
     out3_controlled <= test_wire_3;
   end
 
-  assign control_port_in_int[1:0] = A[1:0];
-  assign control_port_in_int[3:2] = out_controlled[1:0];
-  assign control_port_in_int[5:4] = out2_controlled[1:0];
-  assign control_port_in_int[6:6] = out3_controlled[0:0];
-  assign control_port_in_int[8:7] = test_wire_2_controlled[1:0];
-  assign A_controlled[1:0] = control_port_out_int[1:0];
-  assign out[1:0] = control_port_out_int[3:2];
-  assign out2[1:0] = control_port_out_int[5:4];
-  assign out3[0:0] = control_port_out_int[6:6];
-  assign test_wire_2[1:0] = control_port_out_int[8:7];
-  assign observe_port_int[0:0] = A[0:0];
-  assign observe_port_int[1:1] = B[0:0];
-  assign observe_port_int[2:2] = out2_controlled[0:0];
-  assign observe_port_int[4:3] = test_wire_3[1:0];
+  assign control_port_in_int = { test_wire_2_controlled[1:0], out3_controlled[0:0], out2_controlled[1:0], out_controlled[1:0], A[1:0] };
+  assign { test_wire_2[1:0], out3[0:0], out2[1:0], out[1:0], A_controlled[1:0] } = control_port_out_int;
+  assign observe_port_int = { test_wire_3[1:0], out2_controlled[0:0], B[0:0], A[0:0] };
   assign observe_port = { observe_port_int, observe_port_inst };
   assign control_port_in = { control_port_in_int, control_port_in_inst };
   assign { control_port_out_int, control_port_out_inst } = control_port_out;
@@ -104,7 +93,7 @@ module Or
   wire [1:0] inter;
   assign inter = ~in_1;
   assign out = inter | in_2;
-  assign observe_port_int[1:0] = inter[1:0];
+  assign observe_port_int = inter[1:0];
   assign observe_port = observe_port_int;
 
 endmodule
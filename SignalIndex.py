@@ -0,0 +1,161 @@
+from typing import Dict, List, Optional, Tuple
+
+
+# ************************************* <HIERARCHICAL SIGNAL INDEX> ******************************************
+# Insertion produces the observe/control port maps as nested per-instance dicts -
+#   {'TOP': {'A': [0, 0], 'inst1': {'inter': [6, 5]}}}
+# Resolving a patch variable such as TOP.inst1.inter[1:0] against that structure means walking the
+# dicts on every lookup. The SignalIndex flattens the hierarchy once into -
+#   (1) A hash map from full hierarchical path to a SignalEntry -> O(1) lookups
+#   (2) A trie over the path components                         -> prefix queries ("all signals under TOP.inst1")
+#
+# Example for the observe port of Sample.v -
+#   TOP.A           --> SignalEntry(offset = 5, width = 1, msb = 0, lsb = 0)
+#   TOP.inst1.inter --> SignalEntry(offset = 0, width = 2, msb = 1, lsb = 0)
+# *************************************************************************************************************
+
+
+# Exception class for failed signal resolution (unknown path / part select out of bounds)
+class SignalResolutionError(Exception):
+    pass
+
+
+# A SignalEntry describes where the tapped bits of a signal live on the port
+#   offset   - Port bit carrying signal bit <lsb>
+#   width    - # of tapped bits (msb - lsb + 1)
+#   msb, lsb - Tapped range of the signal, as declared by the pragma
+#   latency  - # of register stages between the signal and the port (pipelined observe taps)
+class SignalEntry:
+    __slots__ = ('offset', 'width', 'msb', 'lsb', 'latency')
+
+    def __init__(self, offset:int, width:int, msb:int, lsb:int, latency:int = 0):
+        self.offset  = offset
+        self.width   = width
+        self.msb     = msb
+        self.lsb     = lsb
+        self.latency = latency
+
+    def __repr__(self):
+        return f'SignalEntry(offset = {self.offset}, width = {self.width}, msb = {self.msb}, lsb = {self.lsb}, latency = {self.latency})'
+
+
+class SignalIndex:
+    # Key used in trie nodes to hold the SignalEntry of a complete path
+    ENTRY = None
+
+    def __init__(self, separator = '.') -> None:
+        self.separator = separator
+        self.signals   = {}   # {<PATH>:SignalEntry}
+        self.trie      = {}   # {<COMPONENT>:{<COMPONENT>:{... ENTRY:SignalEntry}}}
+        self.width     = 0    # Net port width covered by the index
+
+    def __len__(self):
+        return len(self.signals)
+
+    def __contains__(self, path):
+        return path in self.signals
+
+    def __repr__(self):
+        return f'SignalIndex({self.signals})'
+
+    # Adds a signal to both the hash map and the trie
+    def addSignal(self, path, offset, msb, lsb, latency = 0):
+        if msb < lsb:
+            raise SignalResolutionError("Signal '%s' has an inverted range [%d:%d]"%(path, msb, lsb))
+        entry = SignalEntry(offset  = offset,           \
+                            width   = msb - lsb + 1,    \
+                            msb     = msb,              \
+                            lsb     = lsb,              \
+                            latency = latency)
+        self.signals[path] = entry
+        node = self.trie
+        for component in path.split(self.separator):
+            node = node.setdefault(component, {})
+        node[self.ENTRY] = entry
+        self.width = max(self.width, offset + entry.width)
+        return entry
+
+    # O(1) lookup of a full hierarchical path. Returns None for unknown paths
+    def lookup(self, path) -> Optional[SignalEntry]:
+        return self.signals.get(path)
+
+    # Resolves <path>[msb:lsb] to the absolute (msb, lsb) range on the port
+    # Raises SignalResolutionError if the path is unknown or the part select is not within the tapped range
+    def resolve(self, path, msb, lsb) -> Tuple[int, int]:
+        entry = self.signals.get(path)
+        if entry is None:
+            raise SignalResolutionError("Signal '%s' is not observable/controllable in the instrumented design"%(path))
+        if msb < lsb:
+            raise SignalResolutionError("Part select %s[%d:%d] has an inverted range"%(path, msb, lsb))
+        if lsb < entry.lsb or msb > entry.msb:
+            raise SignalResolutionError("Part select %s[%d:%d] is out of the tapped range [%d:%d]"%(path, msb, lsb, \
+                                                                                                    entry.msb, entry.lsb))
+        return entry.offset + (msb - entry.lsb), entry.offset + (lsb - entry.lsb)
+
+    # Returns the trie node for a hierarchical prefix (None if no signal lives under it)
+    def prefixNode(self, prefix):
+        node = self.trie
+        if prefix:
+            for component in prefix.split(self.separator):
+                node = node.get(component)
+                if node is None:
+                    return None
+        return node
+
+    # Returns {<PATH>:SignalEntry} for all signals under a hierarchical prefix - e.g. "TOP.inst1"
+    def signalsUnder(self, prefix) -> Dict[str, SignalEntry]:
+        node = self.prefixNode(prefix)
+        signals = {}
+        if node is None:
+            return signals
+        # Iterative DFS (hierarchies can be deeper than the recursion limit)
+        stack = [(prefix, node)]
+        while stack:
+            path, node = stack.pop()
+            for component, child in node.items():
+                if component is self.ENTRY:
+                    signals[path] = child
+                else:
+                    stack.append((path + self.separator + component if path else component, child))
+        return signals
+
+    # Returns the possible next path components after a prefix (for tooling/autocomplete)
+    # e.g. complete("TOP.inst") --> ['inst1', 'inst2', 'inst3']
+    def complete(self, prefix) -> List[str]:
+        parent, _, partial = prefix.rpartition(self.separator)
+        node = self.prefixNode(parent)
+        if node is None:
+            return []
+        return sorted(component for component in node if component is not self.ENTRY and component.startswith(partial))
+
+    # Builds the index from the instantiation tree and the module-wise pragma maps
+    # The walk mirrors the port layout created by insertion, i.e. <port> = {<port>_int, <port>_inst} -
+    #   -- Instance hooks occupy the lower bits, in instance order
+    #   -- Module internal taps sit above them, in pragma order
+    # rangeOf(pragmaValue) returns the (msb, lsb) tapped range for a module's signal map entry
+    # moduleFilter(moduleName), if given, prunes instances of modules that carry no signals in their subtree
+    # moduleLatency - {<MODULE>:<STAGES>} register stages on the port of a module. The latency of a signal
+    # is the sum of the stages of all modules from its own module up to the top module
+    @classmethod
+    def fromInstanceTree(cls, instanceTree, topNode, moduleToSignal, rangeOf, separator = '.', moduleFilter = None, \
+                              moduleLatency = None):
+        signalIndex = cls(separator)
+        moduleLatency = moduleLatency if moduleLatency is not None else {}
+        offset = 0
+        # Iterative post-order walk - (treeNode, moduleNode, hierarchical path, latency, children expanded?)
+        stack = [(instanceTree, topNode, topNode[0], moduleLatency.get(topNode[1], 0), False)]
+        while stack:
+            treeNode, moduleNode, path, latency, expanded = stack.pop()
+            children = treeNode[moduleNode]
+            if not expanded:
+                stack.append((treeNode, moduleNode, path, latency, True))
+                if children is not None:
+                    for child in reversed(list(children)):
+                        if moduleFilter is None or moduleFilter(child[1]):
+                            stack.append((children, child, path + separator + child[0], latency + moduleLatency.get(child[1], 0), False))
+                continue
+            for signal, pragmaValue in moduleToSignal.get(moduleNode[1], {}).items():
+                msb, lsb = rangeOf(pragmaValue)
+                signalIndex.addSignal(path + separator + signal, offset, msb, lsb, latency)
+                offset += msb - lsb + 1
+        return signalIndex
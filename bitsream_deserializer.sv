@@ -1,27 +1,73 @@
 module bitstream_deserializer #(
-    parameter CFG_SIZE = 100            // Number of bits to store
+    parameter CFG_SIZE   = 100,         // Number of bits to store
+    parameter FRAME_SIZE = 32,          // Number of bits per addressable frame (frame write mode)
+    parameter CHUNK_SIZE = 32,          // Number of bits per chunk from bitstream_decompressor
+
+    localparam NUM_FRAMES = (CFG_SIZE + FRAME_SIZE - 1)/FRAME_SIZE,
+    localparam ADDR_BITS  = (NUM_FRAMES > 1) ? $clog2(NUM_FRAMES) : 1,
+    localparam FRAME_BITS = ADDR_BITS + FRAME_SIZE      // Stream bits per frame write - {Address, Data}
 )(
     input  logic SerialIn,              // Single-bit input to stream data
-    input  logic StreamValid            // Valid bit indicating input stream is valid
+    input  logic StreamValid,           // Valid bit indicating input stream is valid
+    input  logic [CHUNK_SIZE-1:0] ChunkIn,     // Decompressed chunk - shifted in as a whole (full load only)
+    input  logic ChunkValid,            // Valid bit indicating ChunkIn is valid
+    input  logic FrameMode,             // 0 - Full load   : CFG_SIZE bits, MSB first
+                                        // 1 - Frame write : {Address, Data} records of FRAME_BITS bits, MSB first.
+                                        //                   Data overwrites ParallelOut[Address*FRAME_SIZE +: FRAME_SIZE]
+                                        //                   and the rest of the configuration is retained (delta load)
     input  logic clk,                   // Clock input
     input  logic rst,                   // Reset input
     output logic [CFG_SIZE-1:0] ParallelOut,   // Output register to store N bits
 
     output logic CfgDone                // Signal to indicate that bit-stream has been completely loaded.
-                                        // For correct programming, CongigDoneOut should always match is 
+                                        // For correct programming, CongigDoneOut should always match is
+                                        // In frame write mode, CfgDone is low while a frame record is being shifted in
 );
 
-    logic [$clog2(N)-1:0] StreamBitCount;      // Register used to count valid bits in bitstream during cfg
-    logic [$clog2(N)-1:0] StreamBitCountNext;  
-    logic [N-1:0]         ParallelOutNext;
+    logic [$clog2(CFG_SIZE+1)-1:0] StreamBitCount;      // Register used to count valid bits in bitstream during cfg
+    logic [$clog2(CFG_SIZE+1)-1:0] StreamBitCountNext;
+    logic [NUM_FRAMES*FRAME_SIZE-1:0] ParallelOutNext;  // Padded to a whole # of frames
+    logic [NUM_FRAMES*FRAME_SIZE-1:0] CfgReg;
+
+    logic [FRAME_BITS-1:0]         FrameShift;          // Frame record shift register - {Address, Data}
+    logic [FRAME_BITS-1:0]         FrameShiftNext;
+    logic [$clog2(FRAME_BITS)-1:0] FrameBitCount;       // Register used to count valid bits of the current frame record
+    logic [$clog2(FRAME_BITS)-1:0] FrameBitCountNext;
+    logic                          FrameComplete;
+    logic [CFG_SIZE-1:0]           ChunkShift;          // CfgReg shifted left by a chunk, ChunkIn at the LSBs
+
+    // Frame record is complete with the current bit
+    assign FrameComplete  = StreamValid & (FrameBitCount == FRAME_BITS-1);
+    assign FrameShiftNext = { FrameShift[FRAME_BITS-2:0], SerialIn };
+
+    // A configuration of up to one chunk is a single chunk load (smaller ones have no whole chunk and
+    // are streamed as raw bits)
+    generate
+        if (CFG_SIZE > CHUNK_SIZE) begin : g_chunk_shift
+            assign ChunkShift = { CfgReg[CFG_SIZE-CHUNK_SIZE-1:0], ChunkIn };
+        end else begin : g_chunk_load
+            assign ChunkShift = ChunkIn[CFG_SIZE-1:0];
+        end
+    endgenerate
 
     // Deserialization logic
-    always_comb @(posedge clk) begin
+    always_comb begin
         if (rst) begin
             ParallelOutNext = 0; // Reset the register
         end else begin
-            // If stream is valid: Shift the existing data to the left and store the new bit at the LSB
-            ParallelOutNext =  StreamValid ? { ParallelOut[CFG_SIZE-2:0], SerialIn } : ParallelOut;
+            ParallelOutNext = CfgReg;
+            if (FrameMode) begin
+                // Frame write: Overwrite the addressed frame once its record is complete
+                if (FrameComplete) begin
+                    ParallelOutNext[FrameShiftNext[FRAME_BITS-1:FRAME_SIZE]*FRAME_SIZE +: FRAME_SIZE] = FrameShiftNext[FRAME_SIZE-1:0];
+                end
+            end else if (ChunkValid) begin
+                // Decompressed chunk: Shift the existing data to the left by a chunk
+                ParallelOutNext[CFG_SIZE-1:0] = ChunkShift;
+            end else if (StreamValid) begin
+                // If stream is valid: Shift the existing data to the left and store the new bit at the LSB
+                ParallelOutNext[CFG_SIZE-1:0] = { CfgReg[CFG_SIZE-2:0], SerialIn };
+            end
         end
     end
 
@@ -29,19 +75,28 @@ module bitstream_deserializer #(
     always_comb  begin
         if (rst) begin
             StreamBitCountNext = 1'b0;
+            FrameBitCountNext  = 1'b0;
         end
         else  begin
-            StreamBitCountNext = StreamValid ? StreamBitCount + $bits(StreamBitCount)'(1'b1) : StreamBitCount;
+            StreamBitCountNext = FrameMode   ? StreamBitCount :
+                                 ChunkValid  ? StreamBitCount + $bits(StreamBitCount)'(CHUNK_SIZE) :
+                                 StreamValid ? StreamBitCount + $bits(StreamBitCount)'(1'b1) : StreamBitCount;
+            FrameBitCountNext  = (StreamValid &  FrameMode) ? (FrameComplete ? '0 : FrameBitCount + $bits(FrameBitCount)'(1'b1)) : FrameBitCount;
         end
     end
 
     // Memory logic for BitStreamCount and ParallelBitstream output
-    always_ff (@posedge clk) begin
+    always_ff @(posedge clk) begin
         StreamBitCount <= StreamBitCountNext;
-        ParallelOut    <= ParallelOutNext;
+        FrameBitCount  <= FrameBitCountNext;
+        FrameShift     <= (StreamValid & FrameMode) ? FrameShiftNext : FrameShift;
+        CfgReg         <= ParallelOutNext;
     end
 
+    assign ParallelOut = CfgReg[CFG_SIZE-1:0];
+
     // CfgDone indicates that bitstream loading is complete
-    assign CfgDone = (StreamBitCount == CFG_SIZE);
+    // Frame writes patch an already loaded configuration - it is complete between frame records
+    assign CfgDone = FrameMode ? (FrameBitCount == 0) : (StreamBitCount == CFG_SIZE);
 
 endmodule
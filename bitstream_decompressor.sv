@@ -0,0 +1,88 @@
+module bitstream_decompressor #(
+    parameter CFG_SIZE    = 100,             // Number of configuration bits (bitstream_deserializer CFG_SIZE)
+    parameter CHUNK_SIZE  = 32,              // Chunk size - must be $bits(DECRYPT_KEY)
+    parameter RUN_BITS    = 6,               // Run length field of a zero-run token (runs of 1 to 2**RUN_BITS chunks)
+    parameter DECRYPT_KEY = 32'hDEAD_BEEF,   // Decryption key - a plain zero chunk is a key chunk in the encrypted image
+
+    localparam LEAD_BITS  = CFG_SIZE % CHUNK_SIZE,
+    localparam LEAD_COUNT_BITS = (LEAD_BITS > 0) ? $clog2(LEAD_BITS+1) : 1   // CFG_SIZE multiple of CHUNK_SIZE - no lead bits
+)(
+    // Compressed stream (one bit per clk, MSB first) -
+    //   LEAD_BITS raw bits (image bits above the last whole chunk), followed by tokens for the chunks (MSB chunk first)
+    //     {1'b1, CHUNK}             --> Literal chunk
+    //     {1'b0, RUN_LENGTH - 1}    --> RUN_LENGTH plain zero chunks (emitted as DECRYPT_KEY)
+    input  logic                   SerialIn,
+    input  logic                   StreamValid,
+    input  logic                   Bypass,          // Pass SerialIn through unchanged (uncompressed stream/frame writes)
+    input  logic                   clk,
+    input  logic                   rst,
+    output logic                   StreamReady,     // Low while a decoded token waits for the chunk expander - hold the stream
+
+    // To bitstream_deserializer
+    output logic                   SerialOut,
+    output logic                   SerialValid,
+    output logic [CHUNK_SIZE-1:0]  ChunkOut,        // One decompressed chunk per clk
+    output logic                   ChunkValid
+);
+
+    logic [LEAD_COUNT_BITS-1:0]      LeadCount;     // # of raw lead bits passed through
+    logic                            LeadDone;
+    logic [CHUNK_SIZE-1:0]           TokenShift;    // Token payload shift register
+    logic [$clog2(CHUNK_SIZE+1)-1:0] TokenBitCount; // # of bits of the current token shifted in
+    logic                            TokenIsRun;
+    logic                            TokenDone;     // Decoded token waiting for the expander
+    logic                            TokenComplete;
+    logic                            TokenAccept;
+    logic                            ExpandLoad;
+    logic [CHUNK_SIZE-1:0]           ExpandChunk;   // Chunk being expanded
+    logic [RUN_BITS:0]               ExpandCount;   // # of chunks left to emit after the current one
+
+    assign LeadDone      = (LeadCount == LEAD_BITS);
+    assign ExpandLoad    = TokenDone & (ExpandCount == 0);
+    assign StreamReady   = Bypass | ~LeadDone | ~TokenDone | ExpandLoad;
+    assign TokenAccept   = ~Bypass & LeadDone & StreamValid & StreamReady;
+    assign TokenComplete = TokenAccept & (TokenBitCount != 0) &
+                           (TokenBitCount == (TokenIsRun ? RUN_BITS : CHUNK_SIZE));
+
+    // Raw bits - bypass and lead bits
+    assign SerialOut     = SerialIn;
+    assign SerialValid   = StreamValid & (Bypass | ~LeadDone);
+
+    // Chunk expander - a loaded token is emitted in the same clk
+    assign ChunkValid    = ~Bypass & ((ExpandCount != 0) | ExpandLoad);
+    assign ChunkOut      = (ExpandCount != 0) ? ExpandChunk : (TokenIsRun ? DECRYPT_KEY : TokenShift);
+
+    always_ff @(posedge clk) begin
+        if (rst) begin
+            LeadCount     <= '0;
+            TokenBitCount <= '0;
+            TokenIsRun    <= 1'b0;
+            TokenDone     <= 1'b0;
+            ExpandCount   <= '0;
+        end else begin
+            if (~Bypass & ~LeadDone & StreamValid) begin
+                LeadCount <= LeadCount + 1'b1;
+            end
+
+            // Token decoder
+            if (TokenAccept) begin
+                if (TokenBitCount == 0) begin
+                    TokenIsRun <= ~SerialIn;
+                end else begin
+                    TokenShift <= { TokenShift[CHUNK_SIZE-2:0], SerialIn };
+                end
+                TokenBitCount <= TokenComplete ? '0 : TokenBitCount + 1'b1;
+            end
+
+            // Expander
+            if (ExpandCount != 0) begin
+                ExpandCount <= ExpandCount - 1'b1;
+            end else if (ExpandLoad) begin
+                ExpandChunk <= TokenIsRun ? DECRYPT_KEY : TokenShift;
+                ExpandCount <= TokenIsRun ? TokenShift[RUN_BITS-1:0] : '0;
+            end
+            TokenDone <= TokenComplete | (TokenDone & ~ExpandLoad);
+        end
+    end
+
+endmodule
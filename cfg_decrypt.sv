@@ -6,7 +6,15 @@ module cfg_decrypt # (
     output [CFG_SIZE-1: 0]     DecryptedCfg,
     output                     DecryptionDone
 );
-    assign DecryptedCfg   = EncryptedCfg ^ {$bits(DECRYPT_KEY){DECRYPT_KEY}}
+    // DECRYPT_KEY is replicated from the LSB over the whole configuration (the last copy is truncated)
+    // ASAPBitstream.SmuConfigLayout.keyMask is the reference model
+    localparam KEY_SIZE    = $bits(DECRYPT_KEY);
+    localparam KEY_REPEATS = (CFG_SIZE + KEY_SIZE - 1)/KEY_SIZE;
+
+    logic [KEY_REPEATS*KEY_SIZE-1:0] KeyMask;
+
+    assign KeyMask        = {KEY_REPEATS{DECRYPT_KEY}};
+    assign DecryptedCfg   = EncryptedCfg ^ KeyMask[CFG_SIZE-1:0];
     assign DecryptionDone = 1'b1;
 
 endmodule
\ No newline at end of file
@@ -7,6 +7,7 @@ module fru #(
     parameter  S                  =    20,               // Maximum # of Non-FSM signal bits under control
     parameter  SEGMENT_SIZE       =    3,
     parameter  DECRYPT_KEY        =    32'hDEAD_BEEF,    // Decryption key for bit-stream
+    parameter  FRAME_SIZE         =    32,               // Frame size of the bit-stream frame write (delta) mode
 
     localparam CONTROL_WIDTH      =    (2*F) + C + S     // Width of controllable signal set
 ) (
@@ -16,6 +17,7 @@ module fru #(
     input                        rst,
     input  logic                 BitStreamSerialIn,          // Bit-Stream input
     input  logic                 BitStreamValid,             // Bit-stream valid
+    input  logic                 BitStreamFrameMode,         // 0 - Full bit-stream, 1 - {Address, Frame} records (delta bit-stream)
     input  logic                 GlobalFruEn                 // Lets you enable/disable FRU
     // Controllable signal set
     input  logic [CONTROL_WIDTH-1:0]  Qin,                   // Controllable signal set input (In the order) -
@@ -108,10 +110,14 @@ module fru #(
 
     // Bitstream deserializer
     bitstream_deserializer #(
-        .CFG_SIZE           (CFG_WIDTH)
+        .CFG_SIZE           ( CFG_WIDTH ),
+        .FRAME_SIZE         ( FRAME_SIZE )
     ) fru_bitstream_deserializer_inst (
         .SerialIn           ( SerialIn ),
         .StreamValid        ( StreamValid ),
+        .ChunkIn            ( '0 ),                  // FRU bit-streams are not compressed
+        .ChunkValid         ( 1'b0 ),
+        .FrameMode          ( BitStreamFrameMode ),
         .clk                ( clk_cfg ),
         .rst                ( rst ),
         .ParallelOut        ( CfgRegFruEncrypted ),
@@ -3,6 +3,8 @@ module smu # (
     parameter  K                  =    4,             // Maximum # of observable signal bits
     parameter  M                  =    6              // Maximum # of triggers (parallel SMU units)    
     parameter  DECRYPT_KEY        =    32'hDEAD_BEEF, // Decryption key for bit-stream
+    parameter  FRAME_SIZE         =    32,            // Frame size of the bit-stream frame write (delta) mode
+    parameter  RUN_BITS           =    6,             // Zero-run length field of the compressed bit-stream
     parameter  SMU_SEGMENT_SIZE   =    64             // Describes the size of smu_unit. For instance
                                                       // hardware complexity-wise this deploys a 64
                                                       // bit comperator
@@ -13,6 +15,9 @@ module smu # (
     input  logic [K-1:0]     p,                       // K-bit observable input set 
     input  logic             BitStreamSerialIn,       // Bit-Stream input
     input  logic             BitStreamValid,
+    input  logic             BitStreamFrameMode,      // 0 - Full bit-stream, 1 - {Address, Frame} records (delta bit-stream)
+    input  logic             BitStreamCompressed,     // Full bit-stream is zero-run compressed (bitstream_decompressor)
+    output logic             BitStreamReady,          // Bit-stream is accepted - hold BitStreamSerialIn while low
     input  logic             cfg_clk,
     input  logic             GlobalSmuEn,             // Lets you enable/disable SMU.
                                                       // Note that this doesn't affect bitsream programming/decryption
@@ -27,20 +32,22 @@ module smu # (
     // Generated local params
     localparam SMU_NUM_SEGMENTS   = (K + SMU_SEGMENT_SIZE - 1)/SMU_SEGMENT_SIZE;  // # of segments
     localparam BITS_NUM_SEGMENTS  = $clog2(SMU_NUM_SEGMENTS);
-    localparam CFG_SMU_UNIT_SIZE  = ( BITS_NUM_SEGMENTS )                         // RegInpSel
+    localparam CFG_SMU_UNIT_SIZE  = ( BITS_NUM_SEGMENTS )   +                     // RegInpSel
                                     ( 2*SMU_SEGMENT_SIZE ) +                      // RegCmp + RegCmpMask
-                                    ( 1 )   +                                     // RegCmpSel
+                                    ( 2 )   +                                     // RegCmpSel (00/11 ==, 01 <, 10 >)
                                     ( $clog2(N) );                                // RegFsmCmp
+    // Fields of a unit configuration from the MSB (ASAPBitstream.SmuConfigLayout packs the same layout) -
+    //   RegInpSel | RegCmp | RegCmpMask | RegFsmCmp | RegCmpSel
     localparam REG_SEL_START      = REG_SEL_END        + BITS_NUM_SEGMENTS - 1;
     localparam REG_SEL_END        = REG_CMP_BEGIN      + 1;
-    localparam REG_CMP_BEGIN      = REG_CMP_END        + SMU_NUM_SEGMENTS - 1;
+    localparam REG_CMP_BEGIN      = REG_CMP_END        + SMU_SEGMENT_SIZE - 1;
     localparam REG_CMP_END        = REG_CMP_MASK_BEGIN + 1;
-    localparam REG_CMP_MASK_BEGIN = REG_CMP_MASK_END   + SMU_NUM_SEGMENTS - 1;               
-    localparam REG_CMP_MASK_END   = REG_CMP_SEL_BEGIN  + 1;
+    localparam REG_CMP_MASK_BEGIN = REG_CMP_MASK_END   + SMU_SEGMENT_SIZE - 1;
+    localparam REG_CMP_MASK_END   = REG_FSM_CMP_BEGIN  + 1;
     localparam REG_FSM_CMP_BEGIN  = REG_FSM_CMP_END    + $clog2(N) - 1;
     localparam REG_FSM_CMP_END    = REG_CMP_SEL_BEGIN  + 1;
-    localparam REG_CMP_SEL_BEGIN  = REG_CMP_SEL_END                          
-    localparam REG_CMP_SEL_END    = 0
+    localparam REG_CMP_SEL_BEGIN  = REG_CMP_SEL_END    + 1;
+    localparam REG_CMP_SEL_END    = 0;
 
 
     // Configuration register per state for M X smu_unit 
@@ -91,15 +98,44 @@ module smu # (
     endgenerate
 
 
+    // Streaming decompressor for compressed full bit-streams (bypassed for uncompressed streams and frame writes)
+    logic                                           CfgSerial, CfgSerialValid, CfgChunkValid;
+    logic [$bits(DECRYPT_KEY)-1:0]                  CfgChunk;
+
+    bitstream_decompressor # (
+        .CFG_SIZE            ( $bits(CfgRegSmu) ),
+        .CHUNK_SIZE          ( $bits(DECRYPT_KEY) ),
+        .RUN_BITS            ( RUN_BITS ),
+        .DECRYPT_KEY         ( DECRYPT_KEY )
+    ) decompressor_inst (
+        .clk                 ( cfg_clk ),
+        .rst                 ( rst ),
+
+        .SerialIn            ( BitStreamSerialIn ),
+        .StreamValid         ( BitStreamValid ),
+        .Bypass              ( ~BitStreamCompressed | BitStreamFrameMode ),
+        .StreamReady         ( BitStreamReady ),
+
+        .SerialOut           ( CfgSerial ),
+        .SerialValid         ( CfgSerialValid ),
+        .ChunkOut            ( CfgChunk ),
+        .ChunkValid          ( CfgChunkValid )
+    );
+
     // Module to interface a sequential cfg bitstream
     bitstream_deserializer # (
-        .CFG_SIZE            ( $bits(CfgRegSmu) )
+        .CFG_SIZE            ( $bits(CfgRegSmu) ),
+        .FRAME_SIZE          ( FRAME_SIZE ),
+        .CHUNK_SIZE          ( $bits(DECRYPT_KEY) )
     ) deserializer_inst (
         .clk                 ( cfg_clk ),
         .rst                 ( rst ),
 
-        .SerialIn            ( BitStreamSerialIn ),
-        .StreamValid         ( BitStreamValid ),
+        .SerialIn            ( CfgSerial ),
+        .StreamValid         ( CfgSerialValid ),
+        .ChunkIn             ( CfgChunk ),
+        .ChunkValid          ( CfgChunkValid ),
+        .FrameMode           ( BitStreamFrameMode ),
         .ParallelOut         ( CfgRegSmuEncrypted ),
 
         
@@ -12,9 +12,9 @@ module smu_unit # (
     // Observable input set and registers
     input  logic [K-1:0]                  i,                 // Observable signal input
     input  logic [BITS_NUM_SEGMENTS-1:0]  RegInpSel,         // Register to select relevant segment
-    input  logic [K-1:0]                  RegCmpMask,        // Comparator Mask Register
-    input  logic [K-1:0]                  RegCmp             // Register used for comparison
-    input  logic                          RegCmpSelect,      // Register used to select type of comparison
+    input  logic [SMU_SEGMENT_SIZE-1:0]   RegCmpMask,        // Comparator Mask Register
+    input  logic [SMU_SEGMENT_SIZE-1:0]   RegCmp             // Register used for comparison
+    input  logic [1:0]                    RegCmpSelect,      // Register used to select type of comparison
     input  logic [$clog2(N)-1:0]          RegFsmCmp,         // Register used for FSM state comparison 
     input  logic 
     input  logic                          SmuEn              // Signal used to enable SMU -
@@ -26,7 +26,7 @@ module smu_unit # (
     output logic                          trigger            // Output trigger signal
 );
 
-    logic [K-1:0]            MaskedCmpInp;
+    logic [SMU_SEGMENT_SIZE-1:0] MaskedCmpInp;
     logic                    CmpEq;   
     logic                    CmpGt;
     logic                    CmpLt;
@@ -58,7 +58,7 @@ module smu_unit # (
         end else begin
             unique case (RegCmpSelect)
                 2'b00,
-                1'b11  : CmpSel <= CmpEq;       // Both 00 and 11 selects == op
+                2'b11  : CmpSel <= CmpEq;       // Both 00 and 11 selects == op
                 2'b01  : CmpSel <= CmpLt;       // 01 selects < op
                 2'b10  : CmpSel <= CmpGt;       // 10 selects > op
             endcase
@@ -0,0 +1,23 @@
+import os
+import sys
+import tempfile
+
+# The tools live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The tools open their log files (asap_compiler.log, verilog_parse.log) in the working directory when they
+# are imported. Tests run in a scratch directory, so the logs of the checked-in sample run are left alone
+scratchDir = None
+startDir   = None
+
+
+def pytest_sessionstart(session):
+    global scratchDir, startDir
+    scratchDir = tempfile.TemporaryDirectory(prefix = "asap_tests_")
+    startDir   = os.getcwd()
+    os.chdir(scratchDir.name)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    os.chdir(startDir)
+    scratchDir.cleanup()
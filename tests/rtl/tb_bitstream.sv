@@ -0,0 +1,93 @@
+// Drives bitstream_decompressor + bitstream_deserializer (wired as in smu.sv) with a stimulus file and prints
+// the loaded configuration. Used by tests/test_bitstream_rtl.py
+//
+// Stimulus (+stimulus=<FILE>) - one "<MODE> <BIT>" record per line, in stream order
+//   MODE 0 : Full load, uncompressed (Bypass)
+//   MODE 1 : Full load, zero-run compressed
+//   MODE 2 : Frame write record bit (delta load)
+// Output - "CFG <HEX>" once the stream is drained
+module tb_bitstream #(
+    parameter CFG_SIZE    = 100,
+    parameter FRAME_SIZE  = 32,
+    parameter RUN_BITS    = 6,
+    parameter DECRYPT_KEY = 32'hDEAD_BEEF
+);
+    logic                           clk = 1'b0;
+    logic                           rst = 1'b1;
+    logic                           SerialIn = 1'b0, StreamValid = 1'b0, Compressed = 1'b0, FrameMode = 1'b0;
+    logic                           StreamReady, CfgSerial, CfgSerialValid, CfgChunkValid, CfgDone;
+    logic [$bits(DECRYPT_KEY)-1:0]  CfgChunk;
+    logic [CFG_SIZE-1:0]            ParallelOut;
+
+    bitstream_decompressor # (
+        .CFG_SIZE    ( CFG_SIZE ),
+        .CHUNK_SIZE  ( $bits(DECRYPT_KEY) ),
+        .RUN_BITS    ( RUN_BITS ),
+        .DECRYPT_KEY ( DECRYPT_KEY )
+    ) decompressor_inst (
+        .clk         ( clk ),
+        .rst         ( rst ),
+        .SerialIn    ( SerialIn ),
+        .StreamValid ( StreamValid ),
+        .Bypass      ( ~Compressed | FrameMode ),
+        .StreamReady ( StreamReady ),
+        .SerialOut   ( CfgSerial ),
+        .SerialValid ( CfgSerialValid ),
+        .ChunkOut    ( CfgChunk ),
+        .ChunkValid  ( CfgChunkValid )
+    );
+
+    bitstream_deserializer # (
+        .CFG_SIZE    ( CFG_SIZE ),
+        .FRAME_SIZE  ( FRAME_SIZE ),
+        .CHUNK_SIZE  ( $bits(DECRYPT_KEY) )
+    ) deserializer_inst (
+        .clk         ( clk ),
+        .rst         ( rst ),
+        .SerialIn    ( CfgSerial ),
+        .StreamValid ( CfgSerialValid ),
+        .ChunkIn     ( CfgChunk ),
+        .ChunkValid  ( CfgChunkValid ),
+        .FrameMode   ( FrameMode ),
+        .ParallelOut ( ParallelOut ),
+        .CfgDone     ( CfgDone )
+    );
+
+    always #5 clk = ~clk;
+
+    string  stimulus;
+    integer fd, mode, bit_, count;
+    logic   ready;
+
+    initial begin
+        if (!$value$plusargs("stimulus=%s", stimulus)) begin
+            $fatal(1, "+stimulus=<FILE> is required");
+        end
+        fd = $fopen(stimulus, "r");
+        repeat (2) @(posedge clk);
+        #1 rst = 1'b0;
+        while ($fscanf(fd, "%d %d\n", mode, bit_) == 2) begin
+            Compressed  = (mode == 1);
+            FrameMode   = (mode == 2);
+            SerialIn    = bit_[0];
+            StreamValid = 1'b1;
+            // The bit is taken on the first edge with StreamReady high (sampled before the edge)
+            do begin
+                @(negedge clk);
+                ready = StreamReady;
+                @(posedge clk);
+            end while (!ready);
+            #1;
+        end
+        $fclose(fd);
+        // Drain the chunk expander
+        StreamValid = 1'b0;
+        count = 0;
+        while (count < (1 << RUN_BITS) + 4) begin
+            @(posedge clk);
+            count = count + 1;
+        end
+        #1 $display("CFG %h", ParallelOut);
+        $finish;
+    end
+endmodule
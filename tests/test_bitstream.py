@@ -0,0 +1,67 @@
+import random
+
+import pytest
+
+from ASAPBitstream import SmuConfigLayout, compressedBitstream, deltaFrames, verifyCompressed, verifyDelta
+
+# (N, K, M, SMU_SEGMENT_SIZE) - image sizes below one chunk, below and above one key replication (32 x 32 bits),
+# with and without a partial chunk above the last whole chunk
+LAYOUTS = [(1, 8, 1, 8), (4, 14, 1, 14), (2, 16, 2, 16), (2, 128, 4, 32), (2, 64, 6, 64), (4, 200, 6, 64)]
+
+
+# Plain image with runs of zero chunks (the compressible case) and random chunks
+def randomPlainImage(rng, size, keyWidth = 32):
+    image = 0
+    for offset in range(0, size, keyWidth):
+        if rng.random() < 0.5:
+            image |= rng.getrandbits(keyWidth) << offset
+    return image & ((1 << size) - 1)
+
+
+def test_keyMaskCoversWholeImage():
+    layout = SmuConfigLayout(2, 64, 6, 64)
+    assert layout.size > 32 * 32
+    keyMask = layout.keyMask()
+    for offset in range(0, layout.size - 32 + 1, 32):
+        assert (keyMask >> offset) & 0xFFFFFFFF == 0xDEADBEEF
+    top = layout.size % 32
+    assert keyMask >> (layout.size - top) == 0xDEADBEEF & ((1 << top) - 1)
+
+
+@pytest.mark.parametrize("N, K, M, segmentSize", LAYOUTS)
+@pytest.mark.parametrize("seed", range(10))
+def test_verifyCompressed(N, K, M, segmentSize, seed):
+    rng = random.Random(seed)
+    layout = SmuConfigLayout(N, K, M, segmentSize)
+    for runBits in (2, 6):
+        image = layout.encrypt(randomPlainImage(rng, layout.size))
+        matches, fullCycles, _ = verifyCompressed(image, layout, runBits)
+        assert matches
+        assert fullCycles == layout.size
+
+
+# An all zero plain image is a single run of key chunks
+def test_compressedZeroImage():
+    layout = SmuConfigLayout(4, 200, 6, 64)
+    bits = compressedBitstream(layout.encrypt(0), layout)
+    assert verifyCompressed(layout.encrypt(0), layout)[0]
+    assert len(bits) < layout.size // 10
+
+
+@pytest.mark.parametrize("N, K, M, segmentSize", LAYOUTS)
+@pytest.mark.parametrize("frameSize", [8, 32, 64])
+@pytest.mark.parametrize("seed", range(5))
+def test_verifyDelta(N, K, M, segmentSize, frameSize, seed):
+    rng = random.Random(seed)
+    layout = SmuConfigLayout(N, K, M, segmentSize)
+    deployed = layout.encrypt(rng.getrandbits(layout.size))
+    # A few flipped bits, then an unrelated image
+    changed = deployed
+    for _ in range(rng.randrange(1, 4)):
+        changed ^= 1 << rng.randrange(layout.size)
+    for image in (deployed, changed, layout.encrypt(rng.getrandbits(layout.size))):
+        matches, fullCycles, deltaCycles = verifyDelta(deployed, image, layout.size, frameSize)
+        assert matches
+        assert fullCycles == layout.size
+        if image == deployed:
+            assert deltaCycles == 0 and deltaFrames(deployed, image, layout.size, frameSize) == []
@@ -0,0 +1,89 @@
+import os
+import random
+import shutil
+import subprocess
+
+import pytest
+
+from ASAPBitstream import SmuConfigLayout, compressedBitstream, deltaBitstream, deltaFrames, fullBitstream
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The decompressor and deserializer RTL, driven by tests/rtl/tb_bitstream.sv
+SOURCES = [os.path.join(ROOT, "tests", "rtl", "tb_bitstream.sv"), os.path.join(ROOT, "bitstream_decompressor.sv"),
+           os.path.join(ROOT, "bitsream_deserializer.sv")]
+
+# (N, K, M, SMU_SEGMENT_SIZE) - above one key replication with a partial chunk, whole chunks only, below one
+# chunk and exactly one chunk
+LAYOUTS     = [(2, 64, 6, 64), (4, 14, 1, 14), (1, 8, 1, 8), (1, 15, 1, 15)]
+FRAME_SIZE  = 8
+RUN_BITS    = 6
+
+pytestmark = pytest.mark.skipif(shutil.which("verilator") is None, reason = "verilator is not installed")
+
+
+# Builds the testbench once per configuration size
+@pytest.fixture(scope = "module")
+def simulator(tmp_path_factory):
+    binaries = {}
+
+    def build(size):
+        if size not in binaries:
+            buildDir = tmp_path_factory.mktemp("tb_bitstream_%d"%(size))
+            subprocess.run(["verilator", "--binary", "-Wno-fatal", "-Wno-lint", "-Wno-style", "--timing",
+                            "-GCFG_SIZE=%d"%(size), "-GFRAME_SIZE=%d"%(FRAME_SIZE), "-GRUN_BITS=%d"%(RUN_BITS),
+                            "--top-module", "tb_bitstream", "-Mdir", str(buildDir)] + SOURCES,
+                           check = True, capture_output = True)
+            binaries[size] = (buildDir, str(buildDir / "Vtb_bitstream"))
+        return binaries[size]
+
+    # Streams the (MODE, BIT) records and returns the loaded configuration
+    def run(size, records):
+        buildDir, binary = build(size)
+        stimulus = buildDir / "stimulus.txt"
+        stimulus.write_text("".join("%d %d\n"%(mode, bit) for mode, bit in records))
+        output = subprocess.run([binary, "+stimulus=%s"%(stimulus)], check = True, capture_output = True,
+                                text = True).stdout
+        return int([line for line in output.splitlines() if line.startswith("CFG ")][-1].split()[1], 16)
+
+    return run
+
+
+# Plain image with runs of zero chunks (the compressible case) and random chunks
+def randomPlainImage(rng, size, keyWidth = 32):
+    image = 0
+    for offset in range(0, size, keyWidth):
+        if rng.random() < 0.5:
+            image |= rng.getrandbits(keyWidth) << offset
+    return image & ((1 << size) - 1)
+
+
+@pytest.mark.parametrize("N, K, M, segmentSize", LAYOUTS)
+def test_rtlFullLoad(simulator, N, K, M, segmentSize):
+    layout = SmuConfigLayout(N, K, M, segmentSize)
+    image = layout.encrypt(randomPlainImage(random.Random(0), layout.size))
+    assert simulator(layout.size, [(0, bit) for bit in fullBitstream(image, layout.size)]) == image
+
+
+@pytest.mark.parametrize("N, K, M, segmentSize", LAYOUTS)
+@pytest.mark.parametrize("seed", range(2))
+def test_rtlCompressedLoad(simulator, N, K, M, segmentSize, seed):
+    layout = SmuConfigLayout(N, K, M, segmentSize)
+    for image in (layout.encrypt(0), layout.encrypt(randomPlainImage(random.Random(seed), layout.size))):
+        bits = compressedBitstream(image, layout, RUN_BITS)
+        assert simulator(layout.size, [(1, bit) for bit in bits]) == image
+
+
+# Full load of the deployed image, then the frame writes of a few flipped bits
+@pytest.mark.parametrize("N, K, M, segmentSize", LAYOUTS)
+def test_rtlDeltaLoad(simulator, N, K, M, segmentSize):
+    rng = random.Random(1)
+    layout = SmuConfigLayout(N, K, M, segmentSize)
+    deployed = layout.encrypt(randomPlainImage(rng, layout.size))
+    image = deployed
+    for _ in range(3):
+        image ^= 1 << rng.randrange(layout.size)
+    frames = deltaFrames(deployed, image, layout.size, FRAME_SIZE)
+    records = [(0, bit) for bit in fullBitstream(deployed, layout.size)] + \
+              [(2, bit) for bit in deltaBitstream(frames, layout.size, FRAME_SIZE)]
+    assert simulator(layout.size, records) == image
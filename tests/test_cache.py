@@ -0,0 +1,72 @@
+import os
+
+from ASAPCache import CompileCache
+
+
+def result(index):
+    return {"image": 0x1000 + index, "compressed": "01" * 500, "report": {"imageBits": 1572, "sequences": []}}
+
+
+def key(index):
+    return CompileCache.key(b"design", b"patch%d"%(index), {"N": 2, "K": 64, "M": 6}, "1")
+
+
+def diskBytes(cacheDir):
+    return sum(entry.stat().st_size for entryDir in os.scandir(cacheDir) for entry in os.scandir(entryDir.path))
+
+
+# Puts with increasing, distinct mtimes (the LRU order doesn't depend on the file system timestamp resolution)
+def putAll(cache, indexes, start = 0):
+    for age, index in enumerate(indexes, start):
+        cache.put(key(index), result(index))
+        os.utime(cache.entryFile(key(index)), ns = (age * 10 ** 9, age * 10 ** 9))
+
+
+def test_keyDependsOnEveryField():
+    keys = {CompileCache.key(b"design", b"patch", {"N": 2}, "1"), CompileCache.key(b"design2", b"patch", {"N": 2}, "1"),
+            CompileCache.key(b"design", b"patch2", {"N": 2}, "1"), CompileCache.key(b"design", b"patch", {"N": 3}, "1"),
+            CompileCache.key(b"design", b"patch", {"N": 2}, "2")}
+    assert len(keys) == 5
+
+
+def test_memoryLru():
+    cache = CompileCache(maxEntries = 2)
+    for index in range(3):
+        cache.put(key(index), result(index))
+    assert cache.get(key(1)) == result(1)
+    cache.put(key(3), result(3))
+    assert cache.get(key(0)) is None and cache.get(key(2)) is None
+    assert cache.get(key(1)) == result(1) and cache.get(key(3)) == result(3)
+    assert (cache.hits, cache.misses) == (3, 2)
+
+
+def test_diskRoundTrip(tmp_path):
+    putAll(CompileCache(str(tmp_path)), range(2))
+    cache = CompileCache(str(tmp_path))
+    assert cache.get(key(0)) == result(0) and cache.get(key(1)) == result(1)
+    assert cache.get(key(2)) is None
+
+
+# The running total of put() follows the directory, including rewrites of an entry with another size
+def test_runningDiskBytes(tmp_path):
+    cache = CompileCache(str(tmp_path))
+    putAll(cache, range(4))
+    assert cache.diskBytes == diskBytes(tmp_path)
+    cache.put(key(2), dict(result(2), compressed = "1"))
+    cache.put(key(3), dict(result(3), compressed = "01" * 800))
+    assert cache.diskBytes == diskBytes(tmp_path)
+
+
+# Over maxBytes, the least recently used entries are removed down to 90% of maxBytes. A disk hit refreshes the entry
+def test_diskEviction(tmp_path):
+    cache = CompileCache(str(tmp_path))
+    putAll(cache, [0])
+    entryBytes = diskBytes(tmp_path)
+    cache = CompileCache(str(tmp_path), maxEntries = 1, maxBytes = 4 * entryBytes + entryBytes // 2)
+    putAll(cache, range(1, 4), start = 1)
+    assert CompileCache(str(tmp_path)).get(key(0)) == result(0)
+    putAll(cache, [4], start = 4)
+    assert diskBytes(tmp_path) == cache.diskBytes == 4 * entryBytes
+    assert not os.path.exists(cache.entryFile(key(1)))
+    fresh = CompileCache(str(tmp_path))
+    assert [fresh.get(key(index)) is not None for index in range(5)] == [True, False, True, True, True]
@@ -0,0 +1,63 @@
+import pytest
+
+from ASAPCompiler import ASAPSmuLexer, ASAPSmuScanner, DECIMAL_CHUNK, constValue, decimalValue
+
+
+# Sized literal decoding (constValue) - (WIDTH, RADIX, DIGITS) --> (VALUE, DONT_CARE)
+@pytest.mark.parametrize("width, radix, digits, expected", [
+    (4,  'b', '1010',    (0b1010, 0)),
+    (4,  'B', '10_10',   (0b1010, 0)),
+    (4,  'b', '1x0?',    (0b1000, 0b0101)),
+    (9,  'o', '7x1',     (0o701, 0o070)),
+    (8,  'h', 'a5',      (0xa5, 0)),
+    (8,  'H', 'A_5',     (0xa5, 0)),
+    (8,  'h', '3x',      (0x30, 0x0f)),
+    (10, 'd', '513',     (513, 0)),
+    (10, 'D', '1_000',   (1000, 0)),
+    (8,  'd', 'x',       (0, 0xff)),
+    (8,  'd', '?',       (0, 0xff)),
+])
+def test_constValue(width, radix, digits, expected):
+    assert constValue(width, radix, digits) == expected
+
+
+# A leading x/? digit extends the don't-care bits up to the literal width (Verilog x extension)
+@pytest.mark.parametrize("width, radix, digits, expected", [
+    (6,  'b', '?1',      (0b000001, 0b111110)),
+    (6,  'b', 'x',       (0, 0b111111)),
+    (12, 'h', 'x3',      (0x003, 0xff0)),
+    (12, 'o', '?5',      (0o0005, 0o7770)),
+    (8,  'h', 'x3',      (0x03, 0xf0)),     # Digits already cover the width
+])
+def test_leadingDontCareExtends(width, radix, digits, expected):
+    assert constValue(width, radix, digits) == expected
+
+
+# Decimal literals above DECIMAL_CHUNK digits are converted in halves (int_max_str_digits of Python 3.11+)
+def test_decimalChunking():
+    digits = 2 * DECIMAL_CHUNK + 1
+    assert decimalValue('7' * digits) == 7 * (10 ** digits - 1) // 9
+    assert decimalValue('1' + '0' * digits) == 10 ** digits
+    assert constValue(4 * digits, 'd', '1_' + '0' * digits) == (10 ** digits, 0)
+    assert decimalValue('0' * (DECIMAL_CHUNK + 5) + '42') == 42
+
+
+def scan(lexer, text):
+    lexer.lexer.input(text)
+    tokens = []
+    while True:
+        token = lexer.lexer.token()
+        if token is None:
+            return tokens, lexer.diagnostics
+        tokens.append((token.type, token.value, token.lexpos))
+
+
+# A digit outside the radix is not a CONST - both lexers reject the whole literal
+@pytest.mark.parametrize("literal", ["4'b102", "4'o78", "4'hxg", "4'd1a"])
+def test_invalidDigitIsNotAConst(literal):
+    text = "(TOP.A[3:0] == %s)"%(literal)
+    position = text.index(literal)
+    for lexer in (ASAPSmuScanner(), ASAPSmuLexer()):
+        tokens, diagnostics = scan(lexer, text)
+        assert "CONST" not in [tokenType for tokenType, _, _ in tokens]
+        assert diagnostics == [(position, "Unexpected input '%s'"%(literal))]
@@ -0,0 +1,81 @@
+import pytest
+
+from InsertionTool import DECLARATION_TYPES, DeclarationLineIndex, ModuleDef, PragmaExtractor, PyVerilogParser, VerilogParser
+
+# ANSI and non-ANSI ports, several declarations on one line, a pragma on a line without a declaration, a
+# declaration spanning lines (bound by the line of its node, like the full walk) and a module without pragmas
+# between two with pragmas
+SOURCE = """\
+// #pragma observe 0:0 (before the first module)
+module top(
+    input wire  [3:0] a,     // #pragma observe 3:0
+    input wire        clk,
+    output reg  [1:0] q      // #pragma control signal 1:0
+);
+    wire [1:0] w0, w1;       // #pragma observe 1:0
+    wire [7:0]               // #pragma observe 7:0
+        spanned;
+    reg  [2:0] r;            // #pragma observe 2:0 control signal 2:0
+    assign w0 = a[1:0];      // #pragma observe 1:0
+    leaf u_leaf (.x(w0), .y(w1));
+endmodule
+
+module quiet(input wire i, output wire o);
+    wire t;
+    assign t = i;
+    assign o = t;
+endmodule
+
+module leaf(x, y);
+    input  [1:0] x;          // #pragma observe 1:0
+    output [1:0] y;
+    wire   [1:0] z;          // #pragma control signal 0:0
+    assign y = x ^ z;
+endmodule
+"""
+
+
+@pytest.fixture(scope = "module")
+def parsed(tmp_path_factory):
+    sourceFile = tmp_path_factory.mktemp("declarations") / "design.v"
+    sourceFile.write_text(SOURCE)
+    if VerilogParser.codeParser is None:
+        VerilogParser.codeParser = PyVerilogParser(outputdir = str(sourceFile.parent), debug = False)
+    VerilogParser.codeParser.lexer.lexer.lineno = 1
+    return VerilogParser.codeParser.parse(SOURCE), PragmaExtractor([str(sourceFile)]).fileParser(str(sourceFile))
+
+
+# Reference binding - every declaration node of the AST on a pragma line
+def walkAll(ast, lineToPragma):
+    moduleToDeclarations = {}
+    for moduleDef in ast.description.definitions:
+        stack = [moduleDef]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, DECLARATION_TYPES) and int(node.lineno) in lineToPragma:
+                moduleToDeclarations.setdefault(moduleDef.name, []).append((node.name, int(node.lineno)))
+            stack.extend(child for child in node.children() if child is not None)
+    return {module: sorted(declarations) for module, declarations in moduleToDeclarations.items()}
+
+
+def test_joinMatchesFullWalk(parsed):
+    ast, lineToPragma = parsed
+    moduleToDeclarations = DeclarationLineIndex(ast).join(lineToPragma)
+    assert {module: sorted((node.name, int(node.lineno)) for node, _ in declarations) \
+            for module, declarations in moduleToDeclarations.items()} == walkAll(ast, lineToPragma)
+    names = {module: [node.name for node, _ in declarations] for module, declarations in moduleToDeclarations.items()}
+    assert set(names) == {"top", "leaf"}
+    assert set(names["top"]) == {"a", "q", "w0", "w1", "r"} and names["leaf"] == ["x", "z"]
+    for declarations in moduleToDeclarations.values():
+        for node, pragma in declarations:
+            assert pragma == lineToPragma[int(node.lineno)]
+
+
+# Only the modules with pragma lines are indexed and walked
+def test_pragmaFreeModuleSkipped(parsed):
+    ast, lineToPragma = parsed
+    index = DeclarationLineIndex(ast)
+    index.join(lineToPragma)
+    modules = [definition.name for definition in ast.description.definitions if isinstance(definition, ModuleDef)]
+    assert sorted(index.moduleDefs[moduleIndex].name for moduleIndex in index.moduleItems) == ["leaf", "top"]
+    assert "quiet" in modules
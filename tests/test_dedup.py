@@ -0,0 +1,48 @@
+from ASAPBitstream import SmuConfigLayout, SmuImageCompiler
+from ASAPCompiler import ASAPSmuParser
+from SignalIndex import SignalIndex
+
+# s1 is s0 with other literal radixes, s2 reads the same observe_port bits through TOP.W, s4 spells the
+# don't-care digit differently from s3. s5 is a prefix of s0 and keeps its own trigger
+PATCH = """
+s0 { (TOP.A[1:0] == 2'b01) (TOP.B[3:0] > 4'h3) }
+s1 { (TOP.A[1:0] == 2'd1) (TOP.B[3:0] > 4'b0011) }
+s2 { (TOP.W[1:0] == 2'b01) (TOP.B[3:0] > 4'd3) }
+s3 { (TOP.B[3:0] == 4'b1x0?) }
+s4 { (TOP.B[3:0] == 4'b1?0x) }
+s5 { (TOP.A[1:0] == 2'b01) }
+s6 { }
+s7 { (TOP.B[3:0] > 4'h3) (TOP.A[1:0] == 2'b01) }
+"""
+
+
+def observeIndex():
+    index = SignalIndex()
+    index.addSignal("TOP.A", 0, 1, 0)
+    index.addSignal("TOP.W", 0, 3, 0)
+    index.addSignal("TOP.B", 2, 3, 0)
+    return index
+
+
+def compilePatch(tmp_path, text):
+    smuFile = tmp_path / "patch.asap.smu"
+    smuFile.write_text(text)
+    parser = ASAPSmuParser(str(smuFile))
+    parser.resolveSignals(observeIndex())
+    saved = parser.deduplicateSequences()
+    return parser, saved
+
+
+def test_sharedTriggers(tmp_path):
+    parser, saved = compilePatch(tmp_path, PATCH)
+    triggers = {sequence.name: sequence.trigger for sequence in parser.sequenceList.sequences}
+    assert triggers == {"s0": 0, "s1": 0, "s2": 0, "s3": 1, "s4": 1, "s5": 2, "s6": None, "s7": 3}
+    assert saved == 3
+
+
+# Sequences sharing a trigger share an SMU unit - the image is that of the patch without the duplicates
+def test_sharedUnits(tmp_path):
+    layout = SmuConfigLayout(2, 6, 4, 6)
+    parser, _ = compilePatch(tmp_path, PATCH)
+    unique, _ = compilePatch(tmp_path, "\n".join(line for line in PATCH.splitlines() if line[:2] in ("s0", "s3", "s5", "s7")))
+    assert SmuImageCompiler(layout).compile(parser.sequenceList) == SmuImageCompiler(layout).compile(unique.sequenceList)
@@ -0,0 +1,78 @@
+import struct
+
+import pytest
+
+from DesignDatabase import DB_VERSION, HEADER, DesignDatabase, DesignDatabaseError, fileDigest
+from SignalIndex import SignalIndex
+
+# Instantiation tree of a small design - TOP instantiates mid twice, mid instantiates leaf
+INSTANCE_TREE = {("TOP", "top"): {("u_mid0", "mid"): {("u_leaf", "leaf"): None},
+                                  ("u_mid1", "mid"): {("u_leaf", "leaf"): None},
+                                  ("u_leaf", "leaf"): None}}
+
+
+def signalIndex(signals):
+    index = SignalIndex()
+    for path, offset, msb, lsb, latency in signals:
+        index.addSignal(path, offset, msb, lsb, latency)
+    return index
+
+
+@pytest.fixture
+def design(tmp_path):
+    files = [tmp_path / "top.v", tmp_path / "leaf.v"]
+    for file in files:
+        file.write_text("module %s; endmodule\n"%(file.stem))
+    observe = signalIndex([("TOP.A", 5, 0, 0, 0), ("TOP.u_mid0.u_leaf.x", 0, 3, 1, 2), ("TOP.u_mid1.u_leaf.x", 3, 3, 2, 1)])
+    control = signalIndex([("TOP.en", 0, 0, 0, 0), ("TOP.u_mid0.mode", 1, 7, 0, 0)])
+    dbFile = str(tmp_path / "top.asap.db")
+    DesignDatabase.write(dbFile, "top", "observe_port", "control_port_in", "control_port_out", INSTANCE_TREE,
+                         {"top": 6, "mid": 3, "leaf": 3}, {"top": 9, "mid": 8}, observe, control,
+                         [str(file) for file in files])
+    return dbFile, files, observe, control
+
+
+def entries(index):
+    return {path: (entry.offset, entry.width, entry.msb, entry.lsb, entry.latency) for path, entry in index.signals.items()}
+
+
+def test_roundTrip(design):
+    dbFile, files, observe, control = design
+    with DesignDatabase(dbFile) as db:
+        assert db.version == DB_VERSION
+        assert (db.topModule, db.observePort, db.controlPortIn, db.controlPortOut) == \
+               ("top", "observe_port", "control_port_in", "control_port_out")
+        assert db.portWidths() == {"top": (6, 9), "mid": (3, 8), "leaf": (3, 0)}
+        dag = db.instanceDag()
+        assert sorted(dag["top"]) == [("u_leaf", "leaf"), ("u_mid0", "mid"), ("u_mid1", "mid")]
+        assert dag["mid"] == [("u_leaf", "leaf")] and dag["leaf"] == []
+        # Signal offsets, ranges and pipeline latencies
+        assert entries(db.signalIndex("observe")) == entries(observe)
+        assert entries(db.signalIndex("control")) == entries(control)
+        assert db.fileHashes() == {str(file): fileDigest(str(file)) for file in files}
+        assert db.staleFiles() == []
+
+
+def test_staleFiles(design):
+    dbFile, files, _, _ = design
+    files[1].write_text("module leaf(input a); endmodule\n")
+    with DesignDatabase(dbFile) as db:
+        assert db.staleFiles() == [str(files[1])]
+
+
+def test_versionMismatch(design):
+    dbFile = design[0]
+    with open(dbFile, "r+b") as f:
+        magic, _, sectionCount = HEADER.unpack(f.read(HEADER.size))
+        f.seek(0)
+        f.write(HEADER.pack(magic, DB_VERSION - 1, sectionCount))
+    with pytest.raises(DesignDatabaseError, match = "version %d, expected %d"%(DB_VERSION - 1, DB_VERSION)):
+        DesignDatabase(dbFile)
+
+
+@pytest.mark.parametrize("content", [b"ASAP", b"NOTADB\x00\x00" + struct.pack("<HH", DB_VERSION, 0)])
+def test_notADatabase(tmp_path, content):
+    dbFile = tmp_path / "bad.asap.db"
+    dbFile.write_bytes(content)
+    with pytest.raises(DesignDatabaseError):
+        DesignDatabase(str(dbFile))
@@ -0,0 +1,48 @@
+import pickle
+
+from ASAPProfiler import StageProfiler
+
+
+def tree(node):
+    return (node["name"], node["calls"], [tree(child) for child in node.get("children", [])])
+
+
+def work(profiler, module):
+    with profiler.stage("module:%s"%(module)):
+        profiler.count("astNodesVisited", 3)
+        with profiler.stage("observeHooks"):
+            profiler.count("assignsEmitted")
+
+
+# A worker profile (collect, pickled like a pool result) merged under the parent stage matches an in-process run
+def test_collectMerge():
+    serial = StageProfiler()
+    serial.enable()
+    with serial.stage("stageOne"):
+        for module in ("a", "b", "a"):
+            work(serial, module)
+    serial.disable()
+
+    parent = StageProfiler()
+    parent.enable()
+    with parent.stage("stageOne"):
+        for module in ("a", "b", "a"):
+            worker = pickle.loads(pickle.dumps(parent))
+            with worker.collect(parent.enabled) as profile:
+                work(worker, module)
+            parent.merge(pickle.loads(pickle.dumps(profile)))
+    parent.disable()
+
+    assert parent.report()["counters"] == serial.report()["counters"] == {"astNodesVisited": 9, "assignsEmitted": 3}
+    assert tree(parent.report()["stages"]) == tree(serial.report()["stages"])
+
+
+# The worker profiler is restored after collect, and a disabled parent collects nothing
+def test_collectRestores():
+    profiler = StageProfiler()
+    with profiler.collect(False) as profile:
+        profiler.count("astNodesVisited")
+    assert profile == {} and not profiler.enabled
+    with profiler.collect(True) as profile:
+        profiler.count("astNodesVisited")
+    assert profile["counters"] == {"astNodesVisited": 1} and not profiler.enabled and profiler.counters == {}
@@ -0,0 +1,78 @@
+import os
+import random
+
+import pytest
+
+from ASAPCompiler import ASAPSmuLexer, ASAPSmuParser, ASAPSmuScanner, SmuParseError, constValue
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PATCHES = [
+    open(os.path.join(ROOT, "patch.asap.smu")).read(),
+    "s0{(TOP.A[1:0]==2'b0x)(TOP.u_0.B[7:4]<4'hF)}\ns_1 {\n\t(a[0:0] >= 1'd1)\n}\n",
+    "seq {\n  (TOP.x[11:0] == 12'hx3) (TOP.y[8:0] > 9'o7?1) (TOP.z[9:0] <= 10'd513)\n}",
+    # Lexical errors - both lexers skip the same text
+    "s0 { (TOP.A[1:0] # 2'b00) @@ (TOP.B[3:0] == 4'b102) }",
+    "s0 { (TOP.A[1:0] == 2'b00) ",
+    "",
+]
+
+VOCABULARY = ["s0 {", "seq_1{", "}", "(", ")", "TOP.A[1:0]", "TOP.i_0.sig[31:16]", "x[0:0]", "==", "<", ">", "<=",
+              "=", "2'b0x", "8'hA?", "9'o17", "10'd513", "4'dx", "3'b1_0_1", "4'b102", "#", "@", "TOP."]
+
+
+def tokens(lexer, text):
+    lexer.lexer.input(text)
+    result = []
+    while True:
+        token = lexer.lexer.token()
+        if token is None:
+            return result, lexer.diagnostics
+        result.append(token)
+
+
+def randomPatch(rng):
+    return "".join(rng.choice(VOCABULARY) + rng.choice(["", " ", "\n", "\t ", "  \n"]) for _ in range(rng.randrange(1, 40)))
+
+
+# The master regex scanner produces the token stream (type, text, position) and diagnostics of the PLY lexer
+@pytest.mark.parametrize("text", PATCHES + [randomPatch(random.Random(seed)) for seed in range(200)])
+def test_scannerMatchesPly(text):
+    scannerTokens, scannerDiagnostics = tokens(ASAPSmuScanner(), text)
+    plyTokens, plyDiagnostics = tokens(ASAPSmuLexer(), text)
+    assert [(token.type, token.value, token.lexpos) for token in scannerTokens] == \
+           [(token.type, token.value, token.lexpos) for token in plyTokens]
+    assert scannerDiagnostics == plyDiagnostics
+
+
+# Pre-decoded payloads match decoding the token text
+@pytest.mark.parametrize("text", PATCHES)
+def test_scannerPayloads(text):
+    scannerTokens, _ = tokens(ASAPSmuScanner(), text)
+    for token in scannerTokens:
+        if token.type == "SEQUENCE_START":
+            assert token.payload == token.value.rstrip("{").rstrip()
+        elif token.type == "VARIABLE":
+            name, _, partSelect = token.value.partition("[")
+            msb, lsb = partSelect.rstrip("]").split(":")
+            assert token.payload == (name, int(msb), int(lsb))
+        elif token.type == "CONST":
+            width, _, literal = token.value.partition("'")
+            assert token.payload == (int(width),) + constValue(int(width), literal[0], literal[1:])
+        else:
+            assert token.payload is None
+
+
+def parse(file, scanner):
+    try:
+        return repr(ASAPSmuParser(file, scanner = scanner).sequenceList), []
+    except SmuParseError as e:
+        return None, [str(diagnostic) for diagnostic in e.diagnostics]
+
+
+# Both lexers yield the same AST, or the same diagnostics
+@pytest.mark.parametrize("index", range(len(PATCHES)))
+def test_parserScannerEquivalence(tmp_path, index):
+    smuFile = tmp_path / "patch.asap.smu"
+    smuFile.write_text(PATCHES[index])
+    assert parse(str(smuFile), "regex") == parse(str(smuFile), "ply")